@@ -0,0 +1,138 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import os
+import sys
+import logging
+import traceback
+import multiprocessing
+from pdfminify.PDFMinifier import PDFMinifier, MinifyResult
+from pdfminify.PhaseProfiler import PhaseProfiler
+
+_worker_minifier = None
+
+def _worker_init(args):
+	global _worker_minifier
+	_worker_minifier = PDFMinifier(args)
+
+def _worker_minify(job):
+	(infile, outfile) = job
+	try:
+		return _worker_minifier.minify(infile, outfile)
+	except Exception as e:
+		logging.getLogger("llpdf").debug("Minification of %s failed: %s", infile, traceback.format_exc())
+		return MinifyResult(infile = infile, outfile = outfile, old_size = None, new_size = None, error = "%s: %s" % (e.__class__.__name__, str(e)), profile = None, estimate = None)
+
+class BatchMinifier(object):
+	_log = logging.getLogger("llpdf")
+
+	def __init__(self, args, processes = None):
+		self._args = args
+		if processes is None:
+			processes = self.available_cores()
+		self._processes = processes
+		self._jobs = [ ]
+
+	@staticmethod
+	def available_cores():
+		if hasattr(os, "sched_getaffinity"):
+			return len(os.sched_getaffinity(0))
+		return os.cpu_count() or 1
+
+	@property
+	def jobs(self):
+		return iter(self._jobs)
+
+	def add_job(self, infile, outfile):
+		self._jobs.append((infile, outfile))
+
+	def add_output_dir_jobs(self, infiles, output_dir):
+		for infile in infiles:
+			self.add_job(infile, os.path.join(output_dir, os.path.basename(infile)))
+
+	def add_manifest_jobs(self, manifest_filename, output_dir = None, dry_run = False):
+		"""Each line of the manifest file names one input PDF. Optionally, a
+		tab character followed by the output filename may follow; otherwise
+		the output file is placed inside the output directory. For a dry run,
+		output filenames are ignored."""
+		with open(manifest_filename) as f:
+			for (lineno, line) in enumerate(f, 1):
+				line = line.rstrip("\r\n")
+				if (line.strip() == "") or line.startswith("#"):
+					continue
+				if dry_run:
+					self.add_job(line.split("\t", maxsplit = 1)[0], None)
+				elif "\t" in line:
+					(infile, outfile) = line.split("\t", maxsplit = 1)
+					self.add_job(infile, outfile)
+				elif output_dir is not None:
+					self.add_output_dir_jobs([ line ], output_dir)
+				else:
+					raise ValueError("%s:%d: no output filename given and no output directory specified." % (manifest_filename, lineno))
+
+	def check_jobs(self):
+		outfiles = set()
+		for (infile, outfile) in self._jobs:
+			if outfile is None:
+				# Dry run
+				continue
+			if outfile in outfiles:
+				raise ValueError("Output file %s would be written by more than one job." % (outfile))
+			outfiles.add(outfile)
+
+	def _run_jobs(self):
+		processes = min(self._processes, len(self._jobs))
+		if processes <= 1:
+			_worker_init(self._args)
+			yield from map(_worker_minify, self._jobs)
+		else:
+			with multiprocessing.Pool(processes = processes, initializer = _worker_init, initargs = (self._args, )) as pool:
+				yield from pool.imap_unordered(_worker_minify, self._jobs)
+
+	def run(self):
+		self._log.debug("%s %d PDF files using %d processes.", "Estimating" if self._args.dry_run else "Minifying", len(self._jobs), min(self._processes, len(self._jobs)))
+		minifier = PDFMinifier(self._args)
+		results = [ ]
+		for result in self._run_jobs():
+			if result.error is None:
+				if result.estimate is not None:
+					print("%s: estimated %s" % (result.infile, minifier.format_size_change(result.old_size, result.new_size)))
+				else:
+					print("%s: %s" % (result.infile, minifier.format_size_change(result.old_size, result.new_size)))
+				if (result.profile is not None) and self._args.profile:
+					print(PhaseProfiler.format_table(result.profile))
+			else:
+				print("%s: failed with %s" % (result.infile, result.error), file = sys.stderr)
+			results.append(result)
+
+		successful = [ result for result in results if result.error is None ]
+		failed_count = len(results) - len(successful)
+		if len(successful) > 0:
+			total_old_size = sum(result.old_size for result in successful)
+			total_new_size = sum(result.new_size for result in successful)
+			if self._args.dry_run:
+				print("%d of %d files analyzed successfully, estimated total %s" % (len(successful), len(results), minifier.format_size_change(total_old_size, total_new_size)))
+			else:
+				print("%d of %d files minified successfully, total %s" % (len(successful), len(results), minifier.format_size_change(total_old_size, total_new_size)))
+		if failed_count > 0:
+			print("%d of %d files failed." % (failed_count, len(results)), file = sys.stderr)
+		return results
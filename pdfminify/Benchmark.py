@@ -0,0 +1,229 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import subprocess
+import collections
+import statistics
+import llpdf
+import pdfminify
+from pdfminify.FriendlyArgumentParser import FriendlyArgumentParser
+from pdfminify.FilesizeFormatter import FilesizeFormatter
+from pdfminify.BenchmarkCorpus import BenchmarkCorpus
+
+class Benchmark(object):
+	"""Runs pdfminify with a number of standard option presets over the
+	documents of a benchmark corpus. Every run is a separate process so that
+	its peak RSS can be measured exactly. Timed runs are not instrumented;
+	when the time spent in the individual phases is requested, every case is
+	run once more with profiling enabled. Results can be saved as a baseline
+	and later runs compared against it to flag regressions."""
+
+	PRESETS = collections.OrderedDict([
+		("no-filters",	[ "--no-filters" ]),
+		("default",		[ ]),
+		("jpeg",		[ "--jpeg-images" ]),
+		("low-dpi",		[ "--jpeg-images", "--target-dpi", "72" ]),
+		("lazy-read",	[ "--lazy-read" ]),
+	])
+
+	def __init__(self, corpus, presets = None, repeats = 1, extra_args = None, phases = False):
+		self._corpus = corpus
+		self._presets = presets if (presets is not None) else list(self.PRESETS)
+		self._repeats = repeats
+		self._extra_args = extra_args if (extra_args is not None) else [ ]
+		self._phases = phases
+
+	@staticmethod
+	def _environment():
+		env = dict(os.environ)
+		package_dir = os.path.dirname(os.path.dirname(os.path.abspath(pdfminify.__file__)))
+		env["PYTHONPATH"] = package_dir + ((os.pathsep + env["PYTHONPATH"]) if ("PYTHONPATH" in env) else "")
+		return env
+
+	def _run_once(self, infile, preset_args, tmpdir, profile = False):
+		outfile = os.path.join(tmpdir, "output.pdf")
+		profile_json = os.path.join(tmpdir, "profile.json")
+		cmd = [ sys.executable, "-m", "pdfminify" ]
+		if profile:
+			cmd += [ "--profile-json", profile_json ]
+		cmd += preset_args + self._extra_args + [ infile, outfile ]
+		with open(os.path.join(tmpdir, "stderr.txt"), "w+") as stderr:
+			t0 = time.perf_counter()
+			proc = subprocess.Popen(cmd, stdout = subprocess.DEVNULL, stderr = stderr, env = self._environment())
+			(pid, status, rusage) = os.wait4(proc.pid, 0)
+			wall_time = time.perf_counter() - t0
+			proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+			if proc.returncode != 0:
+				stderr.seek(0)
+				raise Exception("Benchmark run failed with exit code %d: %s\n%s" % (proc.returncode, " ".join(cmd), stderr.read()))
+
+		if profile:
+			with open(profile_json) as f:
+				phases = collections.OrderedDict((record["phase"], record["wall_time_secs"]) for record in json.load(f)[0]["profile"]["phases"])
+		else:
+			phases = collections.OrderedDict()
+		return {
+			"wall_time_secs":	wall_time,
+			"max_rss_bytes":	rusage.ru_maxrss * (1 if (sys.platform == "darwin") else 1024),
+			"output_size":		os.stat(outfile).st_size,
+			"phases":			phases,
+		}
+
+	def _run_case(self, preset, document):
+		infile = self._corpus.filename(document)
+		input_size = os.stat(infile).st_size
+		with tempfile.TemporaryDirectory(prefix = "pdfminify_benchmark_") as tmpdir:
+			runs = [ self._run_once(infile, self.PRESETS[preset], tmpdir) for _ in range(self._repeats) ]
+			if self._phases:
+				# Profiling influences time and memory consumption, so the
+				# phases come from a separate run that is not measured
+				phases = self._run_once(infile, self.PRESETS[preset], tmpdir, profile = True)["phases"]
+			else:
+				phases = collections.OrderedDict()
+
+		# Take the fastest run, it is the one least disturbed by other load on
+		# the machine
+		best = min(runs, key = lambda run: run["wall_time_secs"])
+		return {
+			"preset":				preset,
+			"document":				document,
+			"input_size":			input_size,
+			"output_size":			best["output_size"],
+			"wall_time_secs":		best["wall_time_secs"],
+			"median_wall_time_secs":	statistics.median(run["wall_time_secs"] for run in runs),
+			"throughput_bytes_per_sec":	input_size / best["wall_time_secs"],
+			"max_rss_bytes":		max(run["max_rss_bytes"] for run in runs),
+			"phases":				phases,
+		}
+
+	def run(self, progress = None):
+		cases = [ ]
+		for preset in self._presets:
+			for document in self._corpus.documents:
+				if progress is not None:
+					progress("%s / %s" % (preset, document))
+				cases.append(self._run_case(preset, document))
+		return {
+			"corpus":		self._corpus.parameters,
+			"repeats":		self._repeats,
+			"extra_args":	self._extra_args,
+			"system": {
+				"python":		platform.python_version(),
+				"platform":		platform.platform(),
+				"pdfminify":	pdfminify.VERSION,
+				"llpdf":		llpdf.VERSION,
+			},
+			"cases":		cases,
+		}
+
+	@staticmethod
+	def format_table(results):
+		fsf = FilesizeFormatter()
+		rows = [ ("Preset", "Document", "Input", "Output", "Ratio", "Wall", "Throughput", "Max RSS", "Slowest phase") ]
+		for case in results["cases"]:
+			if len(case["phases"]) > 0:
+				slowest_phase = max(case["phases"].items(), key = lambda item: item[1])
+				slowest_phase = "%s %.2fs" % slowest_phase
+			else:
+				slowest_phase = "-"
+			rows.append((case["preset"], case["document"], fsf(case["input_size"]), fsf(case["output_size"]), "%.1f%%" % (100 * case["output_size"] / case["input_size"]), "%.2fs" % (case["wall_time_secs"]), "%s/s" % (fsf(round(case["throughput_bytes_per_sec"]))), fsf(case["max_rss_bytes"]), slowest_phase))
+		widths = [ max(len(row[i]) for row in rows) for i in range(len(rows[0])) ]
+		lines = [ ]
+		for (rowno, row) in enumerate(rows):
+			lines.append("  ".join(value.ljust(width) for (value, width) in zip(row, widths)).rstrip())
+			if rowno == 0:
+				lines.append("  ".join("-" * width for width in widths))
+		return "\n".join(lines)
+
+	@staticmethod
+	def compare(baseline, results, time_tolerance = 0.1, size_tolerance = 0.01, rss_tolerance = 0.2):
+		"""Compares results against a baseline and returns a list of textual
+		descriptions of all regressions, i.e., cases in which time, output
+		size or peak RSS grew by more than the given relative tolerance."""
+		if baseline["corpus"] != results["corpus"]:
+			return [ "baseline was recorded with a different corpus (%s vs. %s), results are not comparable" % (baseline["corpus"], results["corpus"]) ]
+
+		baseline_cases = { (case["preset"], case["document"]): case for case in baseline["cases"] }
+		regressions = [ ]
+		for case in results["cases"]:
+			baseline_case = baseline_cases.get((case["preset"], case["document"]))
+			if baseline_case is None:
+				continue
+			for (key, tolerance, fmt) in (("wall_time_secs", time_tolerance, "%.2fs"), ("output_size", size_tolerance, "%d bytes"), ("max_rss_bytes", rss_tolerance, "%d bytes")):
+				(old, new) = (baseline_case[key], case[key])
+				if new > old * (1 + tolerance):
+					regressions.append("%s / %s: %s regressed from %s to %s (%+.1f%%)" % (case["preset"], case["document"], key, fmt % (old), fmt % (new), 100 * (new - old) / old))
+		return regressions
+
+def main():
+	def _percent(text):
+		return float(text.rstrip("%")) / 100
+
+	parser = FriendlyArgumentParser(prog = "pdfminify.Benchmark", description = "Benchmark pdfminify on a reproducible synthetic corpus of PDF documents and compare against a saved baseline.")
+	parser.add_argument("--corpus-dir", metavar = "path", type = str, default = "benchmark_corpus", help = "Directory in which the benchmark corpus is generated. Documents are only regenerated when the corpus parameters change. Defaults to %(default)s.")
+	parser.add_argument("--seed", metavar = "seed", type = int, default = 1, help = "Seed from which the corpus is generated. Defaults to %(default)d.")
+	parser.add_argument("--scale", metavar = "factor", type = float, default = 1, help = "Scales the number of pages and images of all corpus documents. Defaults to %(default)s.")
+	parser.add_argument("-p", "--preset", metavar = "name", choices = list(Benchmark.PRESETS), action = "append", help = "Run only this option preset. Can be given multiple times. Can be any of %(choices)s, by default all are run.")
+	parser.add_argument("-r", "--repeat", metavar = "count", type = int, default = 3, help = "Number of times every case is run; the fastest run is reported. Defaults to %(default)d.")
+	parser.add_argument("--phases", action = "store_true", help = "Additionally run every case once more with profiling enabled to determine the time spent in every phase of the minification. This run is not included in the measured time and peak RSS.")
+	parser.add_argument("-a", "--args", metavar = "args", type = str, default = "", help = "Additional command line arguments that are passed to pdfminify for all runs, separated by whitespace (e.g., \"--jobs 4\").")
+	parser.add_argument("-s", "--save", metavar = "filename", type = str, help = "Save the results as JSON into the given file, e.g., to use them as a baseline later on.")
+	parser.add_argument("-c", "--compare", metavar = "filename", type = str, help = "Compare the results against the given baseline JSON file. Exits with a non-zero status code if any regressions are found.")
+	parser.add_argument("--time-tolerance", metavar = "percent", type = _percent, default = "10%", help = "Relative wall time increase that is tolerated before it is flagged as a regression. Defaults to %(default)s.")
+	parser.add_argument("--size-tolerance", metavar = "percent", type = _percent, default = "1%", help = "Relative output size increase that is tolerated before it is flagged as a regression. Defaults to %(default)s.")
+	parser.add_argument("--rss-tolerance", metavar = "percent", type = _percent, default = "20%", help = "Relative peak RSS increase that is tolerated before it is flagged as a regression. Defaults to %(default)s.")
+	parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Show verbose messages. Can be specified multiple times to increase log level.")
+	args = parser.parse_args(sys.argv[1:])
+	llpdf.configure_logging(args.verbose)
+
+	corpus = BenchmarkCorpus(args.corpus_dir, seed = args.seed, scale = args.scale)
+	corpus.generate()
+
+	benchmark = Benchmark(corpus, presets = args.preset, repeats = args.repeat, extra_args = args.args.split(), phases = args.phases)
+	results = benchmark.run(progress = (lambda text: print("Running %s" % (text), file = sys.stderr)) if (args.verbose > 0) else None)
+	print(Benchmark.format_table(results))
+
+	if args.save is not None:
+		with open(args.save, "w") as f:
+			json.dump(results, f, indent = 4)
+			f.write("\n")
+
+	if args.compare is not None:
+		with open(args.compare) as f:
+			baseline = json.load(f)
+		regressions = Benchmark.compare(baseline, results, time_tolerance = args.time_tolerance, size_tolerance = args.size_tolerance, rss_tolerance = args.rss_tolerance)
+		if len(regressions) > 0:
+			print(file = sys.stderr)
+			for regression in regressions:
+				print("Regression: %s" % (regression), file = sys.stderr)
+			sys.exit(1)
+		else:
+			print("No regressions compared to %s." % (args.compare))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,251 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import os
+import sys
+import json
+import hashlib
+import random
+import logging
+import llpdf
+from llpdf.types.PDFObject import PDFObject
+from llpdf.types.PDFName import PDFName
+from llpdf.types.PDFXRef import PDFXRef
+from llpdf.EncodeDecode import EncodedObject
+from pdfminify.StreamingPDFWriter import StreamingPDFWriter
+
+class _DocumentBuilder(object):
+	def __init__(self):
+		self._pdf = llpdf.PDFDocument()
+		self._next_objid = 1
+		self._pages_xref = self._reserve()
+		self._pages = [ ]
+
+	def _reserve(self):
+		xref = PDFXRef(self._next_objid, 0)
+		self._next_objid += 1
+		return xref
+
+	def add(self, content, stream = None, xref = None):
+		if xref is None:
+			xref = self._reserve()
+		if stream is not None:
+			stream = EncodedObject.create(stream)
+		self._pdf.add(PDFObject.create(objid = xref.objid, gennum = 0, content = content, stream = stream))
+		return xref
+
+	def add_image(self, width, height, data, gray = False, smask = None):
+		content = {
+			PDFName("/Type"):				PDFName("/XObject"),
+			PDFName("/Subtype"):			PDFName("/Image"),
+			PDFName("/Width"):				width,
+			PDFName("/Height"):				height,
+			PDFName("/BitsPerComponent"):	8,
+			PDFName("/ColorSpace"):			PDFName("/DeviceGray") if gray else PDFName("/DeviceRGB"),
+		}
+		if smask is not None:
+			content[PDFName("/SMask")] = smask
+		return self.add(content, stream = data)
+
+	def add_page(self, contents, xobjects = None, annotations = None):
+		resources = { }
+		if xobjects is not None:
+			resources[PDFName("/XObject")] = { PDFName("/" + name): xref for (name, xref) in xobjects.items() }
+		page_xref = self._reserve()
+		page = {
+			PDFName("/Type"):		PDFName("/Page"),
+			PDFName("/Parent"):		self._pages_xref,
+			PDFName("/MediaBox"):	[ 0, 0, 612, 792 ],
+			PDFName("/Contents"):	self.add({ }, stream = contents),
+			PDFName("/Resources"):	resources,
+		}
+		if annotations is not None:
+			page[PDFName("/Annots")] = annotations
+		self.add(page, xref = page_xref)
+		self._pages.append(page_xref)
+		return page_xref
+
+	def write(self, filename):
+		self.add({
+			PDFName("/Type"):		PDFName("/Pages"),
+			PDFName("/Kids"):		self._pages,
+			PDFName("/Count"):		len(self._pages),
+		}, xref = self._pages_xref)
+		catalog_xref = self.add({
+			PDFName("/Type"):		PDFName("/Catalog"),
+			PDFName("/Pages"):		self._pages_xref,
+		})
+		info_xref = self.add({
+			PDFName("/Producer"):	b"pdfminify benchmark corpus",
+		})
+		self._pdf.trailer = {
+			PDFName("/Root"):		catalog_xref,
+			PDFName("/Info"):		info_xref,
+		}
+		writer = StreamingPDFWriter()
+		try:
+			writer.write(self._pdf, filename)
+		finally:
+			writer.close()
+
+class BenchmarkCorpus(object):
+	"""Generates a reproducible set of synthetic PDF documents that exercise
+	the different parts of pdfminify: many pages with vector graphics, many
+	duplicated images, large photos, images with alpha channels and
+	documents that consist of many small objects which end up in object
+	streams. The same seed and scale always produce the same documents;
+	files are only regenerated when these parameters or the code that
+	generates the documents change."""
+	_log = logging.getLogger("llpdf.BenchmarkCorpus")
+	_VERSION = 1
+	_DOCUMENTS = [ "many_pages", "duplicate_images", "large_photos", "alpha_images", "objstm_heavy" ]
+
+	def __init__(self, directory, seed = 1, scale = 1):
+		self._directory = directory
+		self._seed = seed
+		self._scale = scale
+		self._generator = self._generator_digest()
+		self._translation_tables = [ bytes((value + offset) & 0xff for value in range(256)) for offset in range(256) ]
+
+	@property
+	def directory(self):
+		return self._directory
+
+	@property
+	def parameters(self):
+		return {
+			"version":	self._VERSION,
+			"seed":		self._seed,
+			"scale":	self._scale,
+			"generator":	self._generator,
+		}
+
+	@staticmethod
+	def _generator_digest():
+		# Everything that determines the bytes of the generated documents:
+		# this module, the writer and llpdf, which serializes all objects
+		digest = hashlib.sha256(llpdf.VERSION.encode("ascii"))
+		for module in (__name__, StreamingPDFWriter.__module__):
+			with open(sys.modules[module].__file__, "rb") as f:
+				digest.update(f.read())
+		return digest.hexdigest()
+
+	@property
+	def documents(self):
+		return list(self._DOCUMENTS)
+
+	def filename(self, name):
+		return os.path.join(self._directory, name + ".pdf")
+
+	def _count(self, count):
+		return max(1, round(count * self._scale))
+
+	def _image_data(self, rnd, width, height, channels):
+		# Smooth gradients with a bit of noise, so that images neither
+		# compress trivially nor look like white noise to the JPEG encoder.
+		# Rows are derived from a few base rows by byte translation, which is
+		# much faster than computing every pixel in Python.
+		row_length = width * channels
+		base_rows = [ bytes(((x * 256 // row_length) + rnd.randrange(24)) & 0xff for x in range(row_length)) for _ in range(8) ]
+		phase = rnd.randrange(256)
+		data = bytearray()
+		for y in range(height):
+			data += base_rows[y % len(base_rows)].translate(self._translation_tables[((y * 256 // height) + phase) & 0xff])
+		return bytes(data)
+
+	@staticmethod
+	def _image_placement(name, x, y, width, height):
+		return ("q %.4f 0 0 %.4f %.4f %.4f cm /%s Do Q\n" % (width, height, x, y, name)).encode("ascii")
+
+	def _generate_many_pages(self, rnd, builder):
+		for pageno in range(self._count(300)):
+			contents = bytearray()
+			for i in range(60):
+				(x1, y1, x2, y2) = (rnd.uniform(0, 612), rnd.uniform(0, 792), rnd.uniform(0, 612), rnd.uniform(0, 792))
+				contents += ("q 1 0 0 1 0 0 cm %.6f %.6f %.6f rg %.6f w %.6f %.6f m %.6f %.6f l S Q\n" % (rnd.random(), rnd.random(), rnd.random(), rnd.uniform(0.1, 3), x1, y1, x2, y2)).encode("ascii")
+				contents += ("%.6f %.6f %.6f %.6f re f\n" % (x1, y1, rnd.uniform(1, 50), rnd.uniform(1, 50))).encode("ascii")
+			builder.add_page(contents)
+
+	def _generate_duplicate_images(self, rnd, builder):
+		images = [ self._image_data(rnd, 320, 240, 3) for _ in range(5) ]
+		for pageno in range(self._count(40)):
+			xobjects = { }
+			contents = bytearray()
+			for i in range(4):
+				# Every page carries its own copy of the image objects
+				name = "Im%d" % (i)
+				xobjects[name] = builder.add_image(320, 240, images[rnd.randrange(len(images))])
+				contents += self._image_placement(name, 72 + 240 * (i % 2), 72 + 300 * (i // 2), 216, 162)
+			builder.add_page(bytes(contents), xobjects = xobjects)
+
+	def _generate_large_photos(self, rnd, builder):
+		for pageno in range(self._count(8)):
+			image = builder.add_image(1600, 1200, self._image_data(rnd, 1600, 1200, 3))
+			builder.add_page(self._image_placement("Im0", 72, 72, 288, 216), xobjects = { "Im0": image })
+
+	def _generate_alpha_images(self, rnd, builder):
+		for pageno in range(self._count(20)):
+			smask = builder.add_image(400, 400, self._image_data(rnd, 400, 400, 1), gray = True)
+			image = builder.add_image(400, 400, self._image_data(rnd, 400, 400, 3), smask = smask)
+			builder.add_page(self._image_placement("Im0", 72, 72, 216, 216), xobjects = { "Im0": image })
+
+	def _generate_objstm_heavy(self, rnd, builder):
+		for pageno in range(self._count(50)):
+			annotations = [ ]
+			for i in range(100):
+				(x, y) = (rnd.uniform(0, 560), rnd.uniform(0, 740))
+				annotations.append(builder.add({
+					PDFName("/Type"):		PDFName("/Annot"),
+					PDFName("/Subtype"):	PDFName("/Link"),
+					PDFName("/Rect"):		[ x, y, x + 50, y + 50 ],
+					PDFName("/Border"):		[ 0, 0, 0 ],
+					PDFName("/A"): {
+						PDFName("/S"):		PDFName("/URI"),
+						PDFName("/URI"):	("https://example.com/%d/%d" % (pageno, i)).encode("ascii"),
+					},
+				}))
+			builder.add_page(b"0 0 1 rg 72 72 100 100 re f\n", annotations = annotations)
+
+	def _manifest_filename(self):
+		return os.path.join(self._directory, "corpus.json")
+
+	def _up_to_date(self):
+		try:
+			with open(self._manifest_filename()) as f:
+				manifest = json.load(f)
+		except (FileNotFoundError, json.JSONDecodeError):
+			return False
+		return (manifest == self.parameters) and all(os.path.isfile(self.filename(name)) for name in self._DOCUMENTS)
+
+	def generate(self, force = False):
+		if (not force) and self._up_to_date():
+			self._log.debug("Benchmark corpus in %s is up to date.", self._directory)
+			return
+		os.makedirs(self._directory, exist_ok = True)
+		for name in self._DOCUMENTS:
+			self._log.info("Generating benchmark document %s", self.filename(name))
+			rnd = random.Random("%d/%s" % (self._seed, name))
+			builder = _DocumentBuilder()
+			getattr(self, "_generate_" + name)(rnd, builder)
+			builder.write(self.filename(name))
+		with open(self._manifest_filename(), "w") as f:
+			json.dump(self.parameters, f)
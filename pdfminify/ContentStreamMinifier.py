@@ -0,0 +1,316 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import math
+import decimal
+from llpdf.types.PDFName import PDFName
+
+class ContentStreamMinifier(object):
+	"""Rewrites the operations of a content stream in their shortest form:
+	superfluous whitespace is removed, numbers are written without redundant
+	digits and state changes that have no effect are dropped (e.g., setting a
+	line width that is already set, an identity "cm" or an empty "q Q" pair).
+	Coordinates are rounded to the given number of decimal places relative
+	to the coordinate system in which the content stream starts, i.e.,
+	scaling by "cm", "Tm" and the font size is taken into account. Colors
+	always keep at least three decimal places.
+
+	The operations are consumed one by one and the result is yielded in
+	chunks, so only a few operations are held in memory at any time. The
+	graphics state at the beginning of the stream is considered unknown."""
+	_CHUNK_SIZE = 64 * 1024
+	_MAX_PENDING = 16
+	_MAX_DECIMALS = 10
+	_DELIMITERS = frozenset(b"()<>[]{}/%\x00\t\n\x0c\r ")
+	_ANGLE_BRACKETS = frozenset(b"<>")
+	_IDENTITY = (1, 0, 0, 1)
+	_IDENTITY_MATRIX = [ 1, 0, 0, 1, 0, 0 ]
+	_STATE_KEYS = {
+		"w": "w", "J": "J", "j": "j", "M": "M", "d": "d", "ri": "ri", "i": "i",
+		"Tc": "Tc", "Tw": "Tw", "Tz": "Tz", "TL": "TL", "Tf": "Tf", "Tr": "Tr", "Ts": "Ts",
+		"g": "fill", "rg": "fill", "k": "fill", "cs": "fill", "sc": "fill", "scn": "fill",
+		"G": "stroke", "RG": "stroke", "K": "stroke", "CS": "stroke", "SC": "stroke", "SCN": "stroke",
+	}
+	_COLOR_KEYS = set([ "fill", "stroke" ])
+	_PARTIAL_COLOR_OPERATORS = set([ "sc", "scn", "SC", "SCN" ])
+	_COLOR_SPACE_OPERATORS = set([ "cs", "CS" ])
+	_PATH_OPERATORS = set([ "m", "l", "c", "v", "y", "re", "w", "d" ])
+	_TEXT_SPACE_OPERATORS = set([ "Td", "TD", "TL", "Tc", "Tw", "Ts" ])
+	_NEUTRAL_OPERATORS = set([
+		"h", "S", "s", "f", "F", "f*", "B", "B*", "b", "b*", "n", "W", "W*",
+		"ET", "Td", "T*", "Tj", "TJ", "'", "Do", "sh", "BI", "d0", "d1",
+		"MP", "DP", "BMC", "BDC", "EMC", "BX", "EX",
+	])
+
+	def __init__(self, precision = 3, matrix = None):
+		self._precision = precision
+		self._color_decimals = max(precision, 3)
+		self._initial_ctm = self._linear(matrix) if (matrix is not None) else self._IDENTITY
+		self._decimals_cache = { }
+
+	@staticmethod
+	def _is_number(value):
+		return isinstance(value, (int, float)) and (not isinstance(value, bool))
+
+	@classmethod
+	def _linear(cls, matrix):
+		"""Returns the linear part (a, b, c, d) of a transformation matrix or
+		None if it is malformed."""
+		if (not isinstance(matrix, list)) or (len(matrix) != 6) or (not all(cls._is_number(value) for value in matrix)):
+			return None
+		return tuple(matrix[ : 4])
+
+	@staticmethod
+	def _multiply(m, n):
+		if (m is None) or (n is None):
+			return None
+		return (m[0] * n[0] + m[1] * n[2], m[0] * n[1] + m[1] * n[3], m[2] * n[0] + m[3] * n[2], m[2] * n[1] + m[3] * n[3])
+
+	def _decimals(self, matrix, factor = 1):
+		"""Returns the number of decimal places that are needed so that a
+		distance in the coordinate system given by the matrix keeps the
+		precision in the initial coordinate system, or None if numbers need
+		to be kept exactly."""
+		if matrix is None:
+			return None
+		key = (matrix, factor)
+		if key not in self._decimals_cache:
+			scale = max(math.hypot(matrix[0], matrix[1]), math.hypot(matrix[2], matrix[3])) * factor
+			if (scale <= 0) or (not math.isfinite(scale)):
+				decimals = None
+			else:
+				decimals = min(max(self._precision + math.ceil(math.log10(scale)), 0), self._MAX_DECIMALS)
+			if len(self._decimals_cache) > 1024:
+				self._decimals_cache.clear()
+			self._decimals_cache[key] = decimals
+		return self._decimals_cache[key]
+
+	@staticmethod
+	def _format_number(value, decimals):
+		if isinstance(value, int):
+			return b"%d" % (value)
+		if not math.isfinite(value):
+			raise ValueError("Number %s in content stream cannot be represented." % (value))
+		if decimals is None:
+			text = repr(value)
+			if ("e" in text) or ("E" in text):
+				text = format(decimal.Decimal(text), "f")
+		else:
+			text = "%.*f" % (decimals, value)
+		if "." in text:
+			text = text.rstrip("0").rstrip(".")
+		if text.startswith("0."):
+			text = text[1 : ]
+		elif text.startswith("-0."):
+			text = "-" + text[2 : ]
+		if text in ("-0", "", "-"):
+			text = "0"
+		return text.encode("ascii")
+
+	@staticmethod
+	def _format_string(value):
+		literal = value.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)").replace(b"\r", b"\\r")
+		if len(literal) <= 2 * len(value):
+			return b"(" + literal + b")"
+		else:
+			return b"<" + value.hex().encode("ascii") + b">"
+
+	@classmethod
+	def _join(cls, parts):
+		"""Concatenates serialized tokens, separating them by a space only
+		where required."""
+		result = bytearray()
+		for part in parts:
+			if (len(result) > 0) and cls._needs_separator(result[-1], part[0]):
+				result += b" "
+			result += part
+		return bytes(result)
+
+	@classmethod
+	def _needs_separator(cls, last_char, next_char):
+		if (last_char in cls._ANGLE_BRACKETS) and (next_char in cls._ANGLE_BRACKETS):
+			return True
+		return (last_char not in cls._DELIMITERS) and (next_char not in cls._DELIMITERS)
+
+	def _format(self, value, decimals = None):
+		if isinstance(value, bool):
+			return b"true" if value else b"false"
+		elif value is None:
+			return b"null"
+		elif isinstance(value, (int, float)):
+			return self._format_number(value, decimals)
+		elif isinstance(value, PDFName):
+			return value.value.encode("ascii")
+		elif isinstance(value, (bytes, bytearray)):
+			return self._format_string(value)
+		elif isinstance(value, list):
+			return b"[" + self._join([ self._format(item, decimals) for item in value ]) + b"]"
+		elif isinstance(value, dict):
+			return b"<<" + self._join([ part for (key, item) in value.items() for part in (self._format(key), self._format(item, decimals)) ]) + b">>"
+		else:
+			raise ValueError("Unsupported operand %s in content stream." % (str(value)))
+
+	def _format_operands(self, operands, operator):
+		if operator in self._PATH_OPERATORS:
+			decimals = self._decimals(self._ctm)
+			return [ self._format(operand, decimals) for operand in operands ]
+		elif operator in self._TEXT_SPACE_OPERATORS:
+			decimals = self._decimals(self._multiply(self._tm, self._ctm))
+			return [ self._format(operand, decimals) for operand in operands ]
+		elif operator == "TJ":
+			# Offsets are in thousandths of the font size; if it is unknown,
+			# so is the precision they need
+			if self._font_size is None:
+				decimals = None
+			else:
+				decimals = self._decimals(self._multiply(self._tm, self._ctm), abs(self._font_size) / 1000)
+			return [ self._format(operand, decimals) for operand in operands ]
+		elif operator == "\"":
+			decimals = self._decimals(self._multiply(self._tm, self._ctm))
+			return [ self._format(operand, decimals if (index < 2) else None) for (index, operand) in enumerate(operands) ]
+		elif operator in ("cm", "Tm"):
+			# Only the translation is a distance in the enclosing system
+			decimals = self._decimals(self._ctm)
+			return [ self._format(operand, decimals if (index >= 4) else None) for (index, operand) in enumerate(operands) ]
+		elif self._STATE_KEYS.get(operator) in self._COLOR_KEYS:
+			return [ self._format(operand, self._color_decimals) for operand in operands ]
+		else:
+			return [ self._format(operand) for operand in operands ]
+
+	def _reset(self):
+		self._ctm = self._initial_ctm
+		self._tm = self._IDENTITY
+		self._font_size = None
+		self._state = { }
+
+	def _save(self):
+		self._stack.append((self._ctm, self._font_size, dict(self._state)))
+
+	def _restore(self):
+		if len(self._stack) > 0:
+			(self._ctm, self._font_size, self._state) = self._stack.pop()
+		else:
+			# Restores a state that was saved before this stream started
+			self._reset()
+
+	def _update_state(self, operands, operator):
+		"""Tracks the effect of an operation on the graphics state. Returns
+		False if the operation has no effect at all and can be dropped."""
+		if operator == "q":
+			self._save()
+		elif operator == "Q":
+			self._restore()
+		elif operator == "cm":
+			# A pure translation leaves the linear part unchanged, but is not
+			# a no-op
+			if (len(operands) == 6) and all(self._is_number(value) for value in operands) and (operands == self._IDENTITY_MATRIX):
+				return False
+			self._ctm = self._multiply(self._linear(operands), self._ctm)
+		elif operator == "BT":
+			self._tm = self._IDENTITY
+		elif operator == "Tm":
+			self._tm = self._linear(operands)
+		elif operator == "TD":
+			self._state.pop("TL", None)
+		elif operator == "\"":
+			self._state.pop("Tw", None)
+			self._state.pop("Tc", None)
+		elif operator == "gs":
+			# Any parameter but the color can be changed by a graphics state
+			# parameter dictionary
+			self._state = { key: value for (key, value) in self._state.items() if key in self._COLOR_KEYS }
+			self._font_size = None
+		elif (operator not in self._NEUTRAL_OPERATORS) and (operator not in self._STATE_KEYS) and (operator not in self._PATH_OPERATORS):
+			# Unknown operator, anything might have changed
+			self._state = { }
+			self._font_size = None
+		return True
+
+	def _serialize(self, operands, operator):
+		if operator == "BI":
+			return b"BI" + operands[0]
+		return self._join(self._format_operands(operands, operator) + [ operator.encode("latin1") ])
+
+	def _add(self, operands, operator):
+		"""Appends an operation to the pending operations, combining it with
+		the ones that directly precede it where possible."""
+		serialized = self._serialize(operands, operator)
+		key = self._STATE_KEYS.get(operator)
+		if key is not None:
+			if self._state.get(key) == serialized:
+				return
+			self._state[key] = serialized
+			if operator == "Tf":
+				self._font_size = operands[1] if ((len(operands) == 2) and self._is_number(operands[1])) else None
+			while (len(self._pending) > 0) and (self._pending[-1][1] == key):
+				(prev_operator, prev_key, prev_serialized) = self._pending[-1]
+				if prev_operator in self._COLOR_SPACE_OPERATORS:
+					# Following color components depend on the color space
+					if operator in self._PARTIAL_COLOR_OPERATORS:
+						break
+				elif (prev_operator != operator) and (operator in self._PARTIAL_COLOR_OPERATORS):
+					break
+				self._pending.pop()
+		elif not self._update_state(operands, operator):
+			return
+		elif operator == "Q":
+			# Changes right before a restore have no effect
+			while (len(self._pending) > 0) and ((self._pending[-1][1] is not None) or (self._pending[-1][0] in ("cm", "gs"))):
+				self._pending.pop()
+			if (len(self._pending) > 0) and (self._pending[-1][0] == "q"):
+				self._pending.pop()
+				return
+		elif (operator == "ET") and (len(self._pending) > 0) and (self._pending[-1][0] == "BT"):
+			self._pending.pop()
+			return
+		self._pending.append((operator, key, serialized))
+
+	def _flush(self, keep):
+		while len(self._pending) > keep:
+			serialized = self._pending.pop(0)[2]
+			if (self._last_char is not None) and self._needs_separator(self._last_char, serialized[0]):
+				self._output += b"\n"
+			self._output += serialized
+			self._last_char = serialized[-1]
+		if len(self._output) >= self._CHUNK_SIZE:
+			chunk = bytes(self._output)
+			self._output = bytearray()
+			return chunk
+		return None
+
+	def minify(self, operations):
+		"""Yields the minified content stream in chunks for the given
+		iterable of (operands, operator) tuples."""
+		self._reset()
+		self._stack = [ ]
+		self._pending = [ ]
+		self._output = bytearray()
+		self._last_char = None
+		for (operands, operator) in operations:
+			self._add(operands, operator)
+			if len(self._pending) > self._MAX_PENDING:
+				chunk = self._flush(self._MAX_PENDING // 2)
+				if chunk is not None:
+					yield chunk
+		self._flush(0)
+		if len(self._output) > 0:
+			yield bytes(self._output)
@@ -0,0 +1,236 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import re
+from llpdf.types.PDFName import PDFName
+
+class ContentStreamTokenizer(object):
+	"""Splits the decoded data of a content stream into operations, i.e.,
+	(operands, operator) tuples. Numbers become int or float, names become
+	PDFName, literal and hexadecimal strings become bytes and arrays and
+	dictionaries become lists and dicts. Inline images are returned as a
+	single operation with operator "BI" and the raw data that follows "BI"
+	up to and including "EI" as its only operand.
+
+	The data can also be given as an iterable of chunks, e.g., from an
+	incremental decompressor. Only as much data as is needed to complete the
+	current token is then kept in memory."""
+	_WHITESPACE = b"\x00\t\n\x0c\r "
+	_TOKEN_RE = re.compile(rb"""
+		(?P<whitespace>[\x00\t\n\x0c\r ]+|%[^\r\n]*)
+		|(?P<number>[+-]?(?:\d+\.?\d*|\.\d+)(?![^\x00\t\n\x0c\r ()<>\[\]{}/%]))
+		|(?P<name>/[^\x00\t\n\x0c\r ()<>\[\]{}/%]*)
+		|(?P<hexstring><[0-9A-Fa-f\x00\t\n\x0c\r ]*>)
+		|(?P<dict_open><<)
+		|(?P<dict_close>>>)
+		|(?P<array_open>\[)
+		|(?P<array_close>\])
+		|(?P<string_open>\()
+		|(?P<keyword>[^\x00\t\n\x0c\r ()<>\[\]{}/%]+|[{}])
+	""", re.VERBOSE)
+	_INLINE_IMAGE_END_RE = re.compile(rb"[\x00\t\n\x0c\r ]EI(?=[\x00\t\n\x0c\r ]|$)")
+	_CONSTANTS = {
+		b"true":		True,
+		b"false":		False,
+		b"null":		None,
+	}
+	_ESCAPES = {
+		ord("n"):		b"\n",
+		ord("r"):		b"\r",
+		ord("t"):		b"\t",
+		ord("b"):		b"\b",
+		ord("f"):		b"\f",
+		ord("("):		b"(",
+		ord(")"):		b")",
+		ord("\\"):		b"\\",
+	}
+
+	def __init__(self, data):
+		if isinstance(data, (bytes, bytearray)):
+			self._data = data
+			self._chunks = None
+		else:
+			self._data = b""
+			self._chunks = iter(data)
+
+	def _refill(self, pos):
+		"""Discards all data before pos and appends the next chunk. Returns
+		False if there is no more data."""
+		if self._chunks is None:
+			return False
+		chunk = next(self._chunks, None)
+		while (chunk is not None) and (len(chunk) == 0):
+			chunk = next(self._chunks, None)
+		if chunk is None:
+			self._chunks = None
+			return False
+		self._data = self._data[pos : ] + chunk
+		return True
+
+	def _literal_string(self, pos):
+		"""Parses a literal string whose opening parenthesis is right before
+		pos. Returns the string and the offset after its closing parenthesis
+		or None if the string is not terminated within the data."""
+		data = self._data
+		result = bytearray()
+		depth = 1
+		length = len(data)
+		while pos < length:
+			char = data[pos]
+			if char == 0x5c:
+				pos += 1
+				if pos + 1 >= length:
+					# Escape sequences are at most two characters long
+					# (\r\n), except for octal ones which stop anywhere
+					break
+				char = data[pos]
+				if char in self._ESCAPES:
+					result += self._ESCAPES[char]
+					pos += 1
+				elif 0x30 <= char <= 0x37:
+					octal = data[pos : pos + 3]
+					digits = 0
+					while (digits < len(octal)) and (0x30 <= octal[digits] <= 0x37):
+						digits += 1
+					result.append(int(octal[ : digits], 8) & 0xff)
+					pos += digits
+				elif char == 0x0d:
+					# Line continuation, \r\n counts as one end of line
+					pos += 2 if data[pos + 1 : pos + 2] == b"\n" else 1
+				elif char == 0x0a:
+					pos += 1
+				else:
+					# Unknown escapes are ignored, i.e., only the backslash
+					result.append(char)
+					pos += 1
+			else:
+				if char == 0x28:
+					depth += 1
+				elif char == 0x29:
+					depth -= 1
+					if depth == 0:
+						return (bytes(result), pos + 1)
+				result.append(char)
+				pos += 1
+		return None
+
+	def _inline_image(self, pos):
+		"""Returns the raw data from pos up to and including the "EI" that
+		terminates the inline image and the offset right after it or None if
+		the inline image is not terminated within the data."""
+		image_data = self._data.find(b"ID", pos)
+		if image_data == -1:
+			return None
+		end = self._INLINE_IMAGE_END_RE.search(self._data, image_data + 3)
+		if (end is None) or ((end.end() == len(self._data)) and (self._chunks is not None)):
+			return None
+		return (self._data[pos : end.end()], end.end())
+
+	def tokens(self):
+		"""Yields (token type, value) tuples of all tokens except whitespace
+		and comments; the token type is any of "number", "name", "string",
+		"dict_open", "dict_close", "array_open", "array_close" or "keyword".
+		The keyword "BI" is immediately followed by an "inline_image" token
+		that holds the raw inline image data."""
+		data = self._data
+		pos = 0
+		match = self._TOKEN_RE.match
+		while True:
+			if pos >= len(data):
+				if not self._refill(pos):
+					break
+				(data, pos) = (self._data, 0)
+			token = match(data, pos)
+			if ((token is None) or (token.end() == len(data))) and self._refill(pos):
+				# Token might continue in the next chunk
+				(data, pos) = (self._data, 0)
+				continue
+			if token is None:
+				raise ValueError("Invalid token in content stream: %s" % (data[pos : pos + 16]))
+			start = pos
+			pos = token.end()
+			kind = token.lastgroup
+			if kind == "whitespace":
+				continue
+			value = token.group()
+			if kind == "number":
+				if (b"." in value):
+					yield ("number", float(value))
+				else:
+					yield ("number", int(value))
+			elif kind == "name":
+				yield ("name", PDFName(value.decode("latin1")))
+			elif kind == "hexstring":
+				hexdata = bytes(char for char in value[1 : -1] if char not in self._WHITESPACE)
+				if len(hexdata) % 2 == 1:
+					hexdata += b"0"
+				yield ("string", bytes.fromhex(hexdata.decode("ascii")))
+			elif kind == "string_open":
+				string = self._literal_string(pos)
+				if string is None:
+					if not self._refill(start):
+						raise ValueError("Unterminated literal string in content stream.")
+					(data, pos) = (self._data, 0)
+					continue
+				(string, pos) = string
+				yield ("string", string)
+			elif (kind == "keyword") and (value == b"BI"):
+				image = self._inline_image(pos)
+				if image is None:
+					if not self._refill(start):
+						raise ValueError("Unterminated inline image in content stream.")
+					(data, pos) = (self._data, 0)
+					continue
+				(image, pos) = image
+				yield (kind, value)
+				yield ("inline_image", image)
+			else:
+				yield (kind, value)
+
+	def operations(self):
+		operands = [ ]
+		containers = [ ]
+		for (kind, value) in self.tokens():
+			if kind in ("array_open", "dict_open"):
+				containers.append((kind, [ ]))
+			elif kind in ("array_close", "dict_close"):
+				if (len(containers) == 0) or (containers[-1][0] != kind.replace("close", "open")):
+					raise ValueError("Unbalanced %s in content stream." % (value.decode("latin1")))
+				(container_kind, items) = containers.pop()
+				if container_kind == "dict_open":
+					items = dict(zip(items[0::2], items[1::2]))
+				(containers[-1][1] if (len(containers) > 0) else operands).append(items)
+			elif kind == "inline_image":
+				yield ([ value ], "BI")
+				operands = [ ]
+			elif (kind == "keyword") and (value not in self._CONSTANTS) and (len(containers) == 0):
+				if value != b"BI":
+					yield (operands, value.decode("latin1"))
+					operands = [ ]
+			else:
+				if kind == "keyword":
+					value = self._CONSTANTS.get(value, value)
+				(containers[-1][1] if (len(containers) > 0) else operands).append(value)
+		if len(containers) > 0:
+			raise ValueError("Unterminated array or dictionary in content stream.")
+		if len(operands) > 0:
+			raise ValueError("Operands without operator at end of content stream.")
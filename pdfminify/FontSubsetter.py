@@ -0,0 +1,274 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import re
+import hashlib
+import logging
+import collections
+from llpdf.types.PDFName import PDFName
+from llpdf.types.PDFXRef import PDFXRef
+from llpdf.types.PDFObject import PDFObject
+from llpdf.EncodeDecode import EncodedObject
+from llpdf.font.PostScriptEnums import PostScriptStandardCharacterName, character_names
+from pdfminify.Type1FontSubsetter import Type1FontSubsetter
+from pdfminify.TrueTypeFontSubsetter import TrueTypeFontSubsetter
+
+class FontSubsetter(object):
+	"""Reduces the embedded Type1 (/FontFile) and TrueType (/FontFile2) font
+	programs of a document to the glyphs that are shown according to a
+	FontUsage. A font program that is shared by multiple fonts keeps the
+	glyphs that any of them needs; it is left alone entirely if any of these
+	fonts is excluded by the usage or cannot be handled. Reduced fonts are
+	renamed with a subset tag as the PDF specification requires."""
+	_log = logging.getLogger("llpdf.FontSubsetter")
+	_SUBSET_TAG_RE = re.compile(r"^/[A-Z]{6}\+")
+	_STANDARD_ENCODING = { int(code): code.name for code in PostScriptStandardCharacterName }
+	_Program = collections.namedtuple("Program", [ "kind", "descriptors", "fonts", "codes", "glyph_ids" ])
+
+	def __init__(self, pdf, usage):
+		self._pdf = pdf
+		self._usage = usage
+
+	@classmethod
+	def _codec_encoding(cls, codec):
+		encoding = { }
+		for code in range(256):
+			name = character_names.get(bytes([ code ]).decode(codec, errors = "ignore"))
+			if name is not None:
+				encoding[code] = name
+		return encoding
+
+	def _resolve(self, value):
+		if isinstance(value, PDFXRef):
+			obj = self._pdf.lookup(value)
+			return None if (obj is None) else obj.content
+		return value
+
+	def _named_encoding(self, name):
+		if name == PDFName("/StandardEncoding"):
+			return self._STANDARD_ENCODING
+		elif name == PDFName("/WinAnsiEncoding"):
+			return self._codec_encoding("cp1252")
+		elif name == PDFName("/MacRomanEncoding"):
+			return self._codec_encoding("mac_roman")
+		else:
+			return None
+
+	def _glyph_names(self, font, codes, builtin_encoding = None):
+		"""Maps all used character codes of a simple font to the sets of glyph
+		names they can refer to. When the PDF does not specify a base
+		encoding, both the standard and the built-in encoding of the font
+		program are considered. Returns None if the encoding is not
+		understood or any used code cannot be mapped."""
+		encoding = self._resolve(font.get(PDFName("/Encoding")))
+		differences = [ ]
+		if isinstance(encoding, dict):
+			differences = self._resolve(encoding.get(PDFName("/Differences"))) or [ ]
+			encoding = encoding.get(PDFName("/BaseEncoding"))
+		if encoding is None:
+			base_encodings = [ self._STANDARD_ENCODING ]
+			if builtin_encoding is not None:
+				base_encodings.append(builtin_encoding)
+		else:
+			base_encodings = [ self._named_encoding(encoding) ]
+			if base_encodings[0] is None:
+				return None
+
+		names = collections.defaultdict(set)
+		for base_encoding in base_encodings:
+			for code in codes:
+				if code in base_encoding:
+					names[code].add(base_encoding[code])
+		code = None
+		for item in differences:
+			if isinstance(item, int):
+				code = item
+			elif isinstance(item, PDFName) and (code is not None):
+				if code in codes:
+					names[code] = set([ item.value[1:] ])
+				code += 1
+			else:
+				return None
+		if not all(code in names for code in codes):
+			return None
+		return names
+
+	def _cid_glyph_ids(self, cidfont, codes):
+		cid_to_gid = self._resolve(cidfont.get(PDFName("/CIDToGIDMap")))
+		if cid_to_gid in (None, PDFName("/Identity")):
+			return set(codes)
+		cid_to_gid_obj = self._pdf.lookup(cidfont[PDFName("/CIDToGIDMap")])
+		if (cid_to_gid_obj is None) or (not cid_to_gid_obj.has_stream):
+			return None
+		mapping = cid_to_gid_obj.stream.decode()
+		return set(int.from_bytes(mapping[2 * code : 2 * code + 2], byteorder = "big") for code in codes if (2 * code + 2) <= len(mapping))
+
+	def _program_of(self, font_xref):
+		"""Returns (kind, program xref, descriptor xref, font xref whose
+		/BaseFont names the program) of a font or None if it is not
+		supported."""
+		font = self._resolve(font_xref)
+		if not isinstance(font, dict):
+			return None
+		subtype = font.get(PDFName("/Subtype"))
+		if subtype == PDFName("/Type0"):
+			descendants = self._resolve(font.get(PDFName("/DescendantFonts")))
+			if (not isinstance(descendants, list)) or (len(descendants) != 1) or (not isinstance(descendants[0], PDFXRef)):
+				return None
+			font_xref = descendants[0]
+			font = self._resolve(font_xref)
+			if (not isinstance(font, dict)) or (font.get(PDFName("/Subtype")) != PDFName("/CIDFontType2")):
+				return None
+			(kind, program_key) = ("cid", PDFName("/FontFile2"))
+		elif subtype == PDFName("/Type1"):
+			(kind, program_key) = ("type1", PDFName("/FontFile"))
+		elif subtype == PDFName("/TrueType"):
+			(kind, program_key) = ("truetype", PDFName("/FontFile2"))
+		else:
+			return None
+		descriptor_xref = font.get(PDFName("/FontDescriptor"))
+		descriptor = self._resolve(descriptor_xref)
+		if (not isinstance(descriptor_xref, PDFXRef)) or (not isinstance(descriptor, dict)):
+			return None
+		program_xref = descriptor.get(program_key)
+		if not isinstance(program_xref, PDFXRef):
+			return None
+		return (kind, program_xref, descriptor_xref, font_xref)
+
+	def _collect_programs(self, font_xrefs):
+		programs = { }
+		unsupported = set()
+		for font_xref in font_xrefs:
+			program = self._program_of(font_xref)
+			if program is None:
+				continue
+			(kind, program_xref, descriptor_xref, named_font_xref) = program
+			if font_xref in self._usage.excluded:
+				unsupported.add(program_xref)
+				continue
+			# Simple and CID-keyed TrueType fonts may share the same program
+			program_kind = "type1" if (kind == "type1") else "truetype"
+			if program_xref not in programs:
+				programs[program_xref] = self._Program(kind = program_kind, descriptors = set(), fonts = set(), codes = { }, glyph_ids = set())
+			elif programs[program_xref].kind != program_kind:
+				unsupported.add(program_xref)
+			programs[program_xref].descriptors.add(descriptor_xref)
+			# Both a Type0 font and its descendant CIDFont name the program
+			programs[program_xref].fonts.update([ font_xref, named_font_xref ])
+			codes = self._usage.fonts.get(font_xref, set())
+			if kind == "cid":
+				glyph_ids = self._cid_glyph_ids(self._resolve(named_font_xref), codes)
+				if glyph_ids is None:
+					unsupported.add(program_xref)
+				else:
+					programs[program_xref].glyph_ids.update(glyph_ids)
+			else:
+				programs[program_xref].codes[font_xref] = codes
+		for program_xref in unsupported:
+			programs.pop(program_xref, None)
+		return programs
+
+	def _subset_type1(self, program_obj, program):
+		content = program_obj.content
+		subsetter = Type1FontSubsetter.from_fontfile(program_obj.stream.decode(), self._resolve(content[PDFName("/Length1")]), self._resolve(content[PDFName("/Length2")]))
+		glyph_names = set()
+		for (font_xref, codes) in program.codes.items():
+			names = self._glyph_names(self._resolve(font_xref), codes, builtin_encoding = subsetter.builtin_encoding)
+			if names is None:
+				self._log.debug("Not subsetting Type1 font program %s, encoding of %s is not supported.", program_obj.xref, font_xref)
+				return None
+			glyph_names |= set(name for name_set in names.values() for name in name_set)
+		subset = subsetter.subset(glyph_names)
+		if subset is None:
+			return None
+		(cleardata, cipherdata, trailerdata) = subset
+		new_content = dict(content)
+		new_content[PDFName("/Length1")] = len(cleardata)
+		new_content[PDFName("/Length2")] = len(cipherdata)
+		new_content[PDFName("/Length3")] = len(trailerdata)
+		return (new_content, cleardata + cipherdata + trailerdata, len(glyph_names))
+
+	def _subset_truetype(self, program_obj, program):
+		subsetter = TrueTypeFontSubsetter(program_obj.stream.decode())
+		glyph_ids = set(program.glyph_ids)
+		for (font_xref, codes) in program.codes.items():
+			names = self._glyph_names(self._resolve(font_xref), codes)
+			glyph_ids |= subsetter.glyphs_for_codes(codes, names or { })
+		data = subsetter.subset(glyph_ids)
+		if data is None:
+			return None
+		new_content = dict(program_obj.content)
+		new_content[PDFName("/Length1")] = len(data)
+		return (new_content, data, len(glyph_ids))
+
+	def _subset_tag(self, data):
+		digest = hashlib.md5(data).digest()
+		return "".join(chr(ord("A") + (value % 26)) for value in digest[:6])
+
+	def _rename(self, xrefs, key, tag):
+		for xref in xrefs:
+			obj = self._pdf.lookup(xref)
+			name = obj.content.get(key)
+			if isinstance(name, PDFName) and (not self._SUBSET_TAG_RE.match(name.value)):
+				obj.content[key] = PDFName("/" + tag + "+" + name.value[1:])
+
+	def run(self, font_xrefs = None):
+		"""Subsets the font programs of the given fonts, or of all fonts that
+		are used, and returns a list of (program xref, old size, new size)
+		tuples of all reduced font programs. Font programs of the given fonts
+		must not be shared with any other font."""
+		if not self._usage.complete:
+			self._log.debug("Not subsetting any font, usage of fonts is incomplete.")
+			return [ ]
+		if font_xrefs is None:
+			font_xrefs = set(self._usage.fonts) | self._usage.excluded
+		results = [ ]
+		for (program_xref, program) in sorted(self._collect_programs(font_xrefs).items()):
+			program_obj = self._pdf.lookup(program_xref)
+			if (program_obj is None) or (not program_obj.has_stream):
+				continue
+			if (program.kind != "type1") and (not TrueTypeFontSubsetter.available()):
+				self._log.debug("Not subsetting TrueType font program %s, fontTools is not installed.", program_xref)
+				continue
+			try:
+				if program.kind == "type1":
+					subset = self._subset_type1(program_obj, program)
+				else:
+					subset = self._subset_truetype(program_obj, program)
+			except Exception as e:
+				# Font programs come in all shapes; if one cannot be parsed or
+				# subset, it is simply kept as it is
+				self._log.warning("Cannot subset font program %s, keeping it: %s", program_xref, e)
+				continue
+			if subset is None:
+				continue
+			(new_content, data, glyph_count) = subset
+			new_obj = PDFObject.create(program_xref.objid, program_xref.gennum, new_content, stream = EncodedObject.create(data))
+			if len(new_obj) >= len(program_obj):
+				continue
+			self._log.debug("Subset %s font program %s to %d glyphs: %d -> %d bytes", program.kind, program_xref, glyph_count, len(program_obj), len(new_obj))
+			results.append((program_xref, len(program_obj), len(new_obj)))
+			self._pdf.replace_object(new_obj)
+			tag = self._subset_tag(data)
+			self._rename(program.descriptors, PDFName("/FontName"), tag)
+			self._rename(program.fonts, PDFName("/BaseFont"), tag)
+		return results
@@ -0,0 +1,213 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import logging
+import collections
+from llpdf.types.PDFName import PDFName
+from llpdf.types.PDFXRef import PDFXRef
+from pdfminify.ContentStreamTokenizer import ContentStreamTokenizer
+
+class FontUsage(object):
+	"""Determines which character codes of which fonts are shown by the
+	content streams of a document: page contents, form XObjects (which
+	includes annotation appearances), tiling patterns and the glyph
+	procedures of Type3 fonts. Fonts are selected by the Tf operator or by
+	graphics state parameter dictionaries with a /Font entry that are set by
+	the gs operator. If any text cannot be attributed to a font,
+	the usage is incomplete and no font must be reduced based on it. Fonts
+	of the interactive form's default resources can be used for text that is
+	entered by the user later on; they are excluded."""
+	_log = logging.getLogger("llpdf.FontUsage")
+	_IDENTITY_ENCODINGS = set([ PDFName("/Identity-H"), PDFName("/Identity-V") ])
+
+	def __init__(self, pdf):
+		self._pdf = pdf
+		self._codes = collections.defaultdict(set)
+		self._excluded = set()
+		self._complete = True
+		self._code_lengths = { }
+
+	@property
+	def complete(self):
+		return self._complete
+
+	@property
+	def excluded(self):
+		return self._excluded
+
+	@property
+	def fonts(self):
+		"""Returns a dictionary of font xref to the set of character codes
+		that are shown with that font."""
+		return self._codes
+
+	def _resolve(self, value):
+		if isinstance(value, PDFXRef):
+			obj = self._pdf.lookup(value)
+			return None if (obj is None) else obj.content
+		return value
+
+	def _incomplete(self, reason, *args):
+		if self._complete:
+			self._log.debug("Font usage of document is incomplete: " + reason, *args)
+		self._complete = False
+
+	def _named_resources(self, resources, category):
+		resources = self._resolve(resources)
+		if not isinstance(resources, dict):
+			return None
+		named_resources = self._resolve(resources.get(category))
+		if not isinstance(named_resources, dict):
+			return { }
+		return named_resources
+
+	def _font_resources(self, resources):
+		return self._named_resources(resources, PDFName("/Font"))
+
+	def _code_length(self, font_xref):
+		"""Returns the number of bytes per character code of a font or None if
+		its encoding is not understood."""
+		if font_xref not in self._code_lengths:
+			font = self._resolve(font_xref)
+			if not isinstance(font, dict):
+				code_length = None
+			elif font.get(PDFName("/Subtype")) == PDFName("/Type0"):
+				code_length = 2 if (font.get(PDFName("/Encoding")) in self._IDENTITY_ENCODINGS) else None
+			else:
+				code_length = 1
+			self._code_lengths[font_xref] = code_length
+		return self._code_lengths[font_xref]
+
+	def _shown(self, font_xref, string):
+		if not isinstance(font_xref, PDFXRef):
+			# Fonts that are not indirect objects are never reduced
+			return
+		code_length = self._code_length(font_xref)
+		if code_length is None:
+			self._excluded.add(font_xref)
+		elif code_length == 1:
+			self._codes[font_xref].update(string)
+		else:
+			self._codes[font_xref].update(int.from_bytes(string[i : i + 2], byteorder = "big") for i in range(0, len(string) - 1, 2))
+
+	def scan_stream(self, data, resources):
+		if not any(operator in data for operator in (b"Tj", b"TJ", b"'", b"\"")):
+			# No text is shown at all, no need to tokenize the stream
+			return
+		fonts = self._font_resources(resources)
+		extgstates = self._named_resources(resources, PDFName("/ExtGState"))
+		font = None
+		saved_fonts = [ ]
+		try:
+			for (operands, operator) in ContentStreamTokenizer(data).operations():
+				if operator == "q":
+					saved_fonts.append(font)
+				elif operator == "Q":
+					if len(saved_fonts) > 0:
+						font = saved_fonts.pop()
+				elif operator == "Tf":
+					if (fonts is None) or (len(operands) < 1) or (operands[0] not in fonts):
+						self._incomplete("font %s selected in content stream is not found in its resources", operands[0] if (len(operands) > 0) else None)
+						font = None
+					else:
+						font = fonts[operands[0]]
+				elif operator == "gs":
+					extgstate = extgstates.get(operands[0]) if ((extgstates is not None) and (len(operands) > 0)) else None
+					extgstate = self._resolve(extgstate)
+					if not isinstance(extgstate, dict):
+						self._incomplete("graphics state %s set in content stream is not found in its resources", operands[0] if (len(operands) > 0) else None)
+						font = None
+					elif PDFName("/Font") in extgstate:
+						# The entry is an array of the font and its size
+						font_entry = self._resolve(extgstate[PDFName("/Font")])
+						if (not isinstance(font_entry, list)) or (len(font_entry) < 1):
+							self._incomplete("graphics state %s selects an invalid font", operands[0])
+							font = None
+						else:
+							font = font_entry[0]
+				elif operator in ("Tj", "'", "\"", "TJ"):
+					strings = [ operand for operand in operands if isinstance(operand, bytes) ]
+					if operator == "TJ":
+						strings += [ item for operand in operands if isinstance(operand, list) for item in operand if isinstance(item, bytes) ]
+					if font is None:
+						if any(len(string) > 0 for string in strings):
+							self._incomplete("text is shown without selecting a font first")
+					else:
+						for string in strings:
+							self._shown(font, string)
+		except ValueError as e:
+			self._incomplete("cannot tokenize content stream: %s", e)
+
+	def _page_resources(self, page):
+		seen = set()
+		while isinstance(page, dict):
+			if PDFName("/Resources") in page:
+				return page[PDFName("/Resources")]
+			parent = page.get(PDFName("/Parent"))
+			if (not isinstance(parent, PDFXRef)) or (parent in seen):
+				break
+			seen.add(parent)
+			page = self._resolve(parent)
+		return None
+
+	def _stream_data(self, xref):
+		obj = self._pdf.lookup(xref) if isinstance(xref, PDFXRef) else None
+		if (obj is None) or (not obj.has_stream):
+			return b""
+		return obj.stream.decode()
+
+	def _scan_streams(self, xrefs, resources):
+		try:
+			data = b"\n".join(self._stream_data(xref) for xref in xrefs)
+		except Exception as e:
+			# Whatever the reason, the text of this stream remains unknown
+			self._incomplete("cannot decode content stream %s: %s", xrefs, e)
+			return
+		self.scan_stream(data, resources)
+
+	def scan_object(self, obj):
+		content = obj.content
+		if not isinstance(content, dict):
+			return
+		objtype = content.get(PDFName("/Type"))
+		if objtype == PDFName("/Page"):
+			contents = content.get(PDFName("/Contents"))
+			contents = contents if isinstance(contents, list) else [ contents ]
+			self._scan_streams(contents, self._page_resources(content))
+		elif obj.has_stream and ((content.get(PDFName("/Subtype")) == PDFName("/Form")) or (content.get(PDFName("/PatternType")) == 1)):
+			self._scan_streams([ obj.xref ], content.get(PDFName("/Resources")))
+		elif (objtype == PDFName("/Font")) and (content.get(PDFName("/Subtype")) == PDFName("/Type3")):
+			charprocs = self._resolve(content.get(PDFName("/CharProcs")))
+			if isinstance(charprocs, dict):
+				for charproc in charprocs.values():
+					self._scan_streams([ charproc ], content.get(PDFName("/Resources")))
+		elif objtype == PDFName("/Catalog"):
+			acroform = self._resolve(content.get(PDFName("/AcroForm")))
+			if isinstance(acroform, dict):
+				fonts = self._font_resources(acroform.get(PDFName("/DR")))
+				if fonts is not None:
+					self._excluded |= set(font for font in fonts.values() if isinstance(font, PDFXRef))
+
+	def scan(self, objects):
+		for obj in objects:
+			self.scan_object(obj)
+		return self
@@ -0,0 +1,58 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import logging
+from pdfminify.ReferenceGraph import ReferenceGraph
+
+class FusedTraversal(object):
+	"""Runs multiple visitor filters within a single traversal of all objects
+	of the document. Every object is handed to all filters in pipeline order
+	before the traversal moves on to the next object; once all objects were
+	visited, the filters are finished, again in pipeline order. If any of the
+	filters requires a reference graph, it is built during the same traversal
+	and shared by all filters; filters that change references must keep it
+	up to date for the filters that are finished after them."""
+	_log = logging.getLogger("llpdf.FusedTraversal")
+
+	def __init__(self, pdf, visitors):
+		self._pdf = pdf
+		self._visitors = visitors
+		self._reference_graph = None
+
+	def run(self):
+		build_graph = any(visitor.needs_reference_graph for visitor in self._visitors)
+		if build_graph:
+			self._reference_graph = ReferenceGraph()
+		for visitor in self._visitors:
+			visitor.set_reference_graph(self._reference_graph)
+
+		objcnt = 0
+		for obj in list(self._pdf):
+			for visitor in self._visitors:
+				visitor.visit(obj)
+			if build_graph:
+				self._reference_graph.update(obj)
+			objcnt += 1
+		self._log.debug("Visited %d objects with %s%s.", objcnt, ", ".join(visitor.__class__.__name__ for visitor in self._visitors), ", building reference graph" if build_graph else "")
+
+		for visitor in self._visitors:
+			visitor.finish()
@@ -0,0 +1,52 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import enum
+from llpdf.img.ImageReformatter import ImageReformatter
+from pdfminify.PillowImageReformatter import PillowImageReformatter
+
+class ImageBackend(enum.Enum):
+	ImageMagick = "imagemagick"
+	Pillow = "pillow"
+
+	@classmethod
+	def default(cls):
+		return cls.Pillow if PillowImageReformatter.available() else cls.ImageMagick
+
+	@classmethod
+	def names(cls):
+		return [ backend.value for backend in cls ]
+
+	@property
+	def jpeg_images_for_jpeg_output(self):
+		"""Value of --jpeg-images with which the backend re-encodes images as
+		JPEG. The ImageMagick backend keeps the decision of llpdf's
+		reformatter that earlier versions of pdfminify used, which converts
+		lossless images to JPEG exactly when --jpeg-images is not given."""
+		return self == ImageBackend.Pillow
+
+	def create_reformatter(self, *args, **kwargs):
+		if self == ImageBackend.Pillow:
+			assert(PillowImageReformatter.available())
+			return PillowImageReformatter(*args, **kwargs)
+		else:
+			return ImageReformatter(*args, **kwargs)
@@ -0,0 +1,223 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from llpdf.img.PDFImage import PDFImage, PDFImageColorSpace
+from llpdf.EncodeDecode import EncodedObject, Filter, Predictor
+
+class ImageCache(object):
+	"""Persistent, content-addressed on-disk cache of processed images. Every
+	entry is keyed by a hash over the source image (including its alpha
+	channel) and all parameters that influence the result of the processing
+	step. The cache directory is kept below a maximum size by evicting the
+	least recently used entries; a cache hit refreshes the modification time
+	of its entry."""
+	_log = logging.getLogger("llpdf.ImageCache")
+	_instances = { }
+	_instances_lock = threading.Lock()
+	_SUFFIX = ".img"
+	# Incremented whenever the result of an operation changes for the same
+	# parameters, so that outdated entries are not used anymore
+	_KEY_VERSION = 3
+
+	def __init__(self, cache_dir, max_size):
+		self._cache_dir = cache_dir
+		self._max_size = max_size
+		self._lock = threading.Lock()
+		os.makedirs(self._cache_dir, exist_ok = True)
+		self._total_size = sum(size for (filename, mtime, size) in self._entries())
+		if self._total_size > self._max_size:
+			self._evict()
+		self._hits = 0
+		self._misses = 0
+
+	@classmethod
+	def open(cls, cache_dir, max_size):
+		"""Returns the cache instance for the given directory, so that
+		subsequent documents processed by the same process do not need to
+		re-scan the cache directory."""
+		key = os.path.realpath(cache_dir)
+		with cls._instances_lock:
+			if key not in cls._instances:
+				cls._instances[key] = cls(cache_dir, max_size)
+			return cls._instances[key]
+
+	@classmethod
+	def from_args(cls, args):
+		if args.image_cache is None:
+			return None
+		return cls.open(args.image_cache, args.image_cache_size)
+
+	@property
+	def hits(self):
+		return self._hits
+
+	@property
+	def misses(self):
+		return self._misses
+
+	def _entries(self):
+		for direntry in os.scandir(self._cache_dir):
+			if direntry.name.endswith(self._SUFFIX) and direntry.is_file():
+				stat = direntry.stat()
+				yield (direntry.path, stat.st_mtime, stat.st_size)
+
+	@staticmethod
+	def _hash_image(hashfnc, image):
+		meta = [ image.width, image.height, image.colorspace.name, image.bits_per_component, image.inverted, image.imgdata.filtering.name, int(image.imgdata.predictor), image.imgdata.columns, len(image.imgdata) ]
+		hashfnc.update(json.dumps(meta).encode("ascii"))
+		hashfnc.update(image.imgdata.encoded_data)
+
+	@classmethod
+	def key(cls, operation, image, **parameters):
+		hashfnc = hashlib.sha256()
+		hashfnc.update(json.dumps([ cls._KEY_VERSION, operation, sorted(parameters.items()) ]).encode("utf-8"))
+		cls._hash_image(hashfnc, image)
+		if image.alpha is not None:
+			hashfnc.update(b"alpha")
+			cls._hash_image(hashfnc, image.alpha)
+		return hashfnc.hexdigest()
+
+	def _filename(self, key):
+		return os.path.join(self._cache_dir, key + self._SUFFIX)
+
+	@staticmethod
+	def _image_header(image):
+		return {
+			"width":				image.width,
+			"height":				image.height,
+			"colorspace":			image.colorspace.name,
+			"bits_per_component":	image.bits_per_component,
+			"inverted":				image.inverted,
+			"filtering":			image.imgdata.filtering.name,
+			"predictor":			int(image.imgdata.predictor),
+			"columns":				image.imgdata.columns,
+			"length":				len(image.imgdata),
+		}
+
+	@staticmethod
+	def _image_from_header(header, data):
+		imgdata = EncodedObject(encoded_data = data, filtering = getattr(Filter, header["filtering"]), columns = header["columns"], predictor = Predictor(header["predictor"]))
+		return PDFImage(width = header["width"], height = header["height"], colorspace = getattr(PDFImageColorSpace, header["colorspace"]), bits_per_component = header["bits_per_component"], imgdata = imgdata, inverted = header["inverted"])
+
+	def _serialize(self, image):
+		headers = [ self._image_header(image) ]
+		if image.alpha is not None:
+			headers.append(self._image_header(image.alpha))
+		result = bytearray(json.dumps(headers).encode("ascii"))
+		result += b"\n"
+		result += image.imgdata.encoded_data
+		if image.alpha is not None:
+			result += image.alpha.imgdata.encoded_data
+		return result
+
+	def _deserialize(self, data):
+		header_end = data.index(b"\n")
+		headers = json.loads(data[ : header_end].decode("ascii"))
+		offset = header_end + 1
+		images = [ ]
+		for header in headers:
+			images.append(self._image_from_header(header, data[offset : offset + header["length"]]))
+			offset += header["length"]
+		if offset != len(data):
+			raise ValueError("Cache entry has %d trailing bytes." % (len(data) - offset))
+		image = images[0]
+		if len(images) > 1:
+			image.set_alpha(images[1])
+		return image
+
+	def get(self, key):
+		filename = self._filename(key)
+		try:
+			with open(filename, "rb") as f:
+				data = f.read()
+			image = self._deserialize(data)
+			os.utime(filename)
+		except FileNotFoundError:
+			with self._lock:
+				self._misses += 1
+			return None
+		except (OSError, ValueError, KeyError) as e:
+			self._log.warning("Ignoring corrupt image cache entry %s: %s", filename, e)
+			with self._lock:
+				self._misses += 1
+			return None
+		with self._lock:
+			self._hits += 1
+		return image
+
+	def put(self, key, image):
+		data = self._serialize(image)
+		if len(data) > self._max_size:
+			return
+		(fd, tmpname) = tempfile.mkstemp(prefix = ".tmp_", dir = self._cache_dir)
+		with os.fdopen(fd, "wb") as f:
+			f.write(data)
+		filename = self._filename(key)
+		with self._lock:
+			# An entry that is written again replaces the previous one
+			try:
+				old_size = os.stat(filename).st_size
+			except FileNotFoundError:
+				old_size = 0
+			os.replace(tmpname, filename)
+			self._total_size += len(data) - old_size
+			if self._total_size > self._max_size:
+				self._evict()
+
+	def _evict(self):
+		# Evict down to 90% of the maximum size so that we don't need to scan
+		# the directory again on the next insertion.
+		entries = sorted(self._entries(), key = lambda entry: entry[1])
+		total_size = sum(size for (filename, mtime, size) in entries)
+		target_size = self._max_size * 9 // 10
+		evicted = 0
+		for (filename, mtime, size) in entries:
+			if total_size <= target_size:
+				break
+			try:
+				os.unlink(filename)
+			except FileNotFoundError:
+				pass
+			total_size -= size
+			evicted += 1
+		self._log.debug("Evicted %d image cache entries, cache now contains %d bytes.", evicted, total_size)
+		self._total_size = total_size
+
+	def cached(self, operation, image, function, **parameters):
+		"""Returns the result of function(image), either from the cache or by
+		calling the function and storing its result. Results that are
+		identical to the source image are not stored."""
+		key = self.key(operation, image, **parameters)
+		result = self.get(key)
+		if result is not None:
+			self._log.debug("Image cache hit for %s %s", operation, image)
+			return result
+		result = function(image)
+		if result is not image:
+			self.put(key, result)
+		return result
@@ -0,0 +1,45 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+from llpdf.img.ImageReformatter import ImageReformatter
+
+class ImageMagickImageReformatter(ImageReformatter):
+	"""llpdf's ImageMagick-based ImageReformatter with the same choice of
+	output encoding as the Pillow backend, which uses it as a fallback for
+	images that Pillow cannot handle: llpdf re-encodes lossless images as
+	JPEG exactly when lossless output was requested and keeps them lossless
+	with --jpeg-images. Here, images are re-encoded losslessly only if
+	lossless output was requested and the source image is lossless itself.
+	The ImageMagick backend itself keeps using llpdf's reformatter."""
+
+	def _lossless_output(self, image):
+		return self._lossless and image.imgdata.lossless
+
+	def reformat(self, image):
+		if (image.imgdata.lossless == self._lossless) and (self._scale_factor == 1):
+			return image
+
+		reformatted_image = self._reformat_channel(image, self._lossless_output(image))
+		if image.alpha:
+			reformatted_alpha = self._reformat_channel(image.alpha, lossless = True, grayscale = True)
+			reformatted_image.set_alpha(reformatted_alpha)
+		return reformatted_image
@@ -0,0 +1,155 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import os
+import shutil
+import logging
+import subprocess
+import pdfminify.filters
+from llpdf.types.PDFName import PDFName
+from llpdf.repr.PDFSerializer import PDFSerializer
+from pdfminify.LazyPDFReader import LazyPDFReader, LazyPDFDocument, LazyPDFObject
+from pdfminify.StreamingPDFWriter import StreamingPDFWriter
+from pdfminify.PhaseProfiler import PhaseProfiler
+
+class IncrementalSigner(object):
+	"""Signs a PDF document without rewriting it. The signature field, its
+	appearance and the signature dictionary are appended to the unmodified
+	input file as an incremental update, together with the few existing
+	objects that the signature filter modifies (the annotated page and the
+	document catalog). The signed byte ranges are then streamed into
+	OpenSSL, so memory usage does not depend on the document size."""
+	_log = logging.getLogger("llpdf.IncrementalSigner")
+	_CHUNK_SIZE = 1024 * 1024
+
+	def __init__(self, args):
+		self._args = args
+		self._serializer = PDFSerializer()
+		self._original_content = { }
+
+	def _snapshot(self, obj):
+		self._original_content[(obj.objid, obj.gennum)] = self._serializer.serialize(obj.content)
+
+	def _modified_objects(self, pdf):
+		for obj in sorted(pdf.objects.parsed_objects):
+			original_content = self._original_content.get((obj.objid, obj.gennum))
+			if original_content is None:
+				# Newly created object
+				yield obj
+			elif self._serializer.serialize(obj.content) != original_content:
+				yield obj
+			elif isinstance(obj, LazyPDFObject) and obj.has_stream and (not obj.is_mapped):
+				# Stream data was replaced
+				yield obj
+
+	def _read_placeholder_end(self, f, offset):
+		f.seek(offset)
+		while True:
+			chunk = f.read(self._CHUNK_SIZE)
+			if len(chunk) == 0:
+				raise Exception("Could not find end of signature placeholder.")
+			index = chunk.find(b">")
+			if index != -1:
+				return offset + index
+			offset += len(chunk)
+
+	def _sign_byte_ranges(self, f, byteranges):
+		cmd = [ "openssl", "cms", "-sign", "-binary" ]
+		cmd += [ "-signer", self._args.sign_cert ]
+		cmd += [ "-inkey", self._args.sign_key ]
+		if self._args.sign_chain:
+			cmd += [ "-certfile", self._args.sign_chain ]
+		cmd += [ "-outform", "der" ]
+		proc = subprocess.Popen(cmd, stdin = subprocess.PIPE, stdout = subprocess.PIPE)
+		try:
+			for (offset, length) in byteranges:
+				f.seek(offset)
+				while length > 0:
+					chunk = f.read(min(length, self._CHUNK_SIZE))
+					if len(chunk) == 0:
+						raise Exception("Output file ended prematurely while signing.")
+					proc.stdin.write(chunk)
+					length -= len(chunk)
+			proc.stdin.close()
+			signature = proc.stdout.read()
+		finally:
+			proc.stdout.close()
+			returncode = proc.wait()
+		if returncode != 0:
+			raise Exception("Signing with OpenSSL failed with exit code %d." % (returncode))
+		return signature
+
+	def _sign(self, writer):
+		f = writer.outfile
+		filesize = f.filesize()
+		contents_start = writer.serializer.get_mark("sig_contents") + 1
+		contents_end = self._read_placeholder_end(f, contents_start)
+		byteranges = [
+			[ 0, contents_start - 1 ],
+			[ contents_end + 1, filesize - contents_end - 1 ],
+		]
+		byterange_str = "[ " + " ".join(str(item) for sublist in byteranges for item in sublist) + " ]"
+		self._log.debug("Signature byte range: %s", byterange_str)
+		f.seek(writer.serializer.get_mark("sig_byterange"))
+		f.write(byterange_str.encode("ascii"))
+
+		hex_signature = self._sign_byte_ranges(f, byteranges).hex().encode("ascii")
+		placeholder_length = contents_end - contents_start
+		if len(hex_signature) > placeholder_length:
+			raise Exception("Signature of %d bytes does not fit into placeholder of %d bytes." % (len(hex_signature) // 2, placeholder_length // 2))
+		f.seek(contents_start)
+		f.write(hex_signature.ljust(placeholder_length, b"0"))
+		f.flush()
+
+	def sign(self, infile, outfile, profiler = None):
+		if profiler is None:
+			profiler = PhaseProfiler(enabled = False)
+		with profiler.phase("read"):
+			pdf = LazyPDFReader().read(infile)
+		if not isinstance(pdf, LazyPDFDocument):
+			raise Exception("Cannot append an incremental update to %s, its XRef table is broken." % (infile))
+		try:
+			if PDFName("/Encrypt") in pdf.trailer:
+				raise Exception("Cannot sign encrypted document %s." % (infile))
+
+			with profiler.phase("SignFilter", pdf = pdf):
+				pdf.allocate_objids_above_xref()
+				pdf.objects.watch_parsed(self._snapshot)
+				pdfminify.filters.SignFilter(pdf, self._args).run()
+				objects = list(self._modified_objects(pdf))
+			self._log.debug("Appending %d objects as incremental update to %s.", len(objects), outfile)
+
+			writer = StreamingPDFWriter(pretty = self._args.pretty_pdf, use_xref_stream = pdf.xref_is_stream, use_object_streams = False)
+			try:
+				with profiler.phase("write"):
+					if not (os.path.exists(outfile) and os.path.samefile(infile, outfile)):
+						shutil.copyfile(infile, outfile)
+					writer.begin_update(outfile, used_objids = (objid for (objid, gennum) in pdf.objects), previous_xref_offset = pdf.startxref, xref_size = pdf.xref_size)
+					for obj in objects:
+						writer.write_object(obj)
+					writer.finish(pdf.trailer)
+				with profiler.phase("sign"):
+					self._sign(writer)
+			finally:
+				writer.close()
+		finally:
+			pdf.close()
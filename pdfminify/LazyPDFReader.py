@@ -0,0 +1,488 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import re
+import mmap
+import logging
+import threading
+import collections
+import collections.abc
+import llpdf
+from llpdf.repr import PDFParser
+from llpdf.types.PDFObject import PDFObject
+from llpdf.types.PDFName import PDFName
+from llpdf.types.PDFXRef import PDFXRef
+from llpdf.types.XRefTable import XRefTable, UncompressedXRefEntry, CompressedXRefEntry
+from llpdf.FileRepr import StreamRepr
+
+class LazyPDFObject(PDFObject):
+	"""PDF object whose dictionary has been parsed, but whose stream data is
+	only sliced out of the memory-mapped input file when it is accessed. The
+	stream data is not retained unless it is explicitly replaced."""
+	_FAULT_AROUND_SLACK = 2 * 1024 * 1024
+
+	def __init__(self, objid, gennum, content, mapped = None, stream_offset = None, stream_length = None):
+		PDFObject.__init__(self, objid, gennum, rawdata = None)
+		self._content = content
+		self._mapped = mapped
+		self._stream_offset = stream_offset
+		self._stream_length = stream_length
+
+	@property
+	def is_mapped(self):
+		return self._stream_offset is not None
+
+	@property
+	def raw_stream(self):
+		if self._stream_offset is None:
+			return self._stream
+		data = self._mapped[self._stream_offset : self._stream_offset + self._stream_length]
+		self._drop_pages(self._stream_offset, self._stream_length)
+		return data
+
+	def _drop_pages(self, offset, length):
+		if hasattr(self._mapped, "madvise"):
+			# The data has been copied, so the pages of the mapping can be
+			# dropped right away instead of accumulating in our RSS. The kernel
+			# maps whole (possibly large) folios around a fault, so a bit of
+			# slack is dropped around the range as well.
+			start_offset = max(offset - self._FAULT_AROUND_SLACK, 0)
+			page_offset = start_offset - (start_offset % mmap.PAGESIZE)
+			end_offset = min(offset + length + self._FAULT_AROUND_SLACK, len(self._mapped))
+			self._mapped.madvise(mmap.MADV_DONTNEED, page_offset, end_offset - page_offset)
+
+	def write_raw_stream(self, f, chunksize = 1024 * 1024):
+		"""Writes the raw stream data to the given file chunk by chunk instead
+		of copying all of it into memory first."""
+		if self._stream_offset is None:
+			f.write(self._stream)
+			return
+		end_offset = self._stream_offset + self._stream_length
+		for offset in range(self._stream_offset, end_offset, chunksize):
+			length = min(chunksize, end_offset - offset)
+			f.write(self._mapped[offset : offset + length])
+			self._drop_pages(offset, length)
+
+	def set_raw_stream(self, raw_stream):
+		PDFObject.set_raw_stream(self, raw_stream)
+		self._stream_offset = None
+
+	def truncate(self, stream_length):
+		if self._stream_offset is None:
+			PDFObject.truncate(self, stream_length)
+		else:
+			self._stream_length = min(self._stream_length, stream_length)
+
+	@property
+	def has_stream(self):
+		return (self._stream_offset is not None) or (self._stream is not None)
+
+	def __len__(self):
+		if self._stream_offset is not None:
+			return self._stream_length
+		return PDFObject.__len__(self)
+
+class LazyObjectTable(collections.abc.MutableMapping):
+	"""Object table of a PDF document that parses objects only when they are
+	first accessed, using the locations recorded in the XRef table. A
+	location is either the offset of an uncompressed object or the object
+	stream and index of a compressed one. Objects may be accessed from
+	several threads concurrently."""
+
+	def __init__(self, parse_callback):
+		self._parse_callback = parse_callback
+		self._parsed_callback = None
+		self._locations = { }
+		self._objects = { }
+		self._keys = { }
+		# Parsing an object can require looking up another one (e.g., an
+		# indirect /Length), so the lock must be reentrant
+		self._lock = threading.RLock()
+
+	def add_location(self, key, location):
+		self._locations[key] = location
+		self._keys[key] = None
+
+	def pop_location(self, key):
+		"""Removes an object that has not been parsed yet from the table and
+		returns its location."""
+		location = self._locations.pop(key, None)
+		if location is not None:
+			del self._keys[key]
+		return location
+
+	def location(self, key):
+		"""Returns the location of an object that has not been parsed yet or
+		None if it has been parsed already."""
+		return self._locations.get(key)
+
+	@property
+	def parsed_count(self):
+		return len(self._objects)
+
+	@property
+	def parsed_objects(self):
+		return self._objects.values()
+
+	def watch_parsed(self, callback):
+		"""Calls 'callback' for every object that has already been parsed and
+		from then on for every object right after it has been parsed, i.e.,
+		before anyone had the chance to modify it."""
+		self._parsed_callback = callback
+		for obj in list(self._objects.values()):
+			callback(obj)
+
+	def __getitem__(self, key):
+		obj = self._objects.get(key)
+		if obj is None:
+			with self._lock:
+				obj = self._objects.get(key)
+				if obj is None:
+					location = self._locations.get(key)
+					if location is None:
+						raise KeyError(key)
+					obj = self._parse_callback(key, location)
+					self._objects[key] = obj
+					self._locations.pop(key, None)
+					if self._parsed_callback is not None:
+						self._parsed_callback(obj)
+		return obj
+
+	def __setitem__(self, key, obj):
+		with self._lock:
+			self._locations.pop(key, None)
+			self._objects[key] = obj
+			self._keys[key] = None
+
+	def __delitem__(self, key):
+		with self._lock:
+			if key not in self._keys:
+				raise KeyError(key)
+			self._locations.pop(key, None)
+			self._objects.pop(key, None)
+			del self._keys[key]
+
+	def __contains__(self, key):
+		return key in self._keys
+
+	def __iter__(self):
+		return iter(list(self._keys))
+
+	def __len__(self):
+		return len(self._keys)
+
+class LazyPDFDocument(llpdf.PDFDocument):
+	_log = logging.getLogger("llpdf.LazyPDFDocument")
+	_OBJ_HEADER_RE = re.compile(rb"\s*(?P<objid>\d+)\s+(?P<gennum>\d+)\s+obj\b")
+	_CONTENT_END_RE = re.compile(rb"endobj|stream(\r\n|\n|\r)")
+	_ENDSTREAM_RE = re.compile(rb"(\r\n|\n|\r)?endstream")
+
+	def __init__(self, f, mapped):
+		llpdf.PDFDocument.__init__(self)
+		self._file = f
+		self._mapped = mapped
+		self._objs = LazyObjectTable(self._parse_object)
+		self._objstrm_offsets = { }
+		self._objstrm_cache = { }
+		self._objstrm_pending = { }
+		self._startxref = None
+		self._xref_is_stream = None
+		self._xref_size = 0
+		self._min_free_objid = 1
+
+	@property
+	def mapped(self):
+		return self._mapped
+
+	@property
+	def objects(self):
+		return self._objs
+
+	@property
+	def startxref(self):
+		"""Offset of the most recent XRef section of the file."""
+		return self._startxref
+
+	@property
+	def xref_is_stream(self):
+		"""True if the most recent XRef section of the file is an XRef stream."""
+		return self._xref_is_stream
+
+	@property
+	def xref_size(self):
+		"""Number of object IDs that are in use by the file (i.e., its /Size)."""
+		return self._xref_size
+
+	def set_xref_info(self, startxref, xref_is_stream, xref_size):
+		self._startxref = startxref
+		self._xref_is_stream = xref_is_stream
+		self._xref_size = xref_size
+
+	def allocate_objids_above_xref(self):
+		"""Makes newly created objects use only object IDs that have never been
+		used by the file, as required when the document is saved as an
+		incremental update."""
+		self._min_free_objid = self._xref_size
+
+	def get_free_objids(self, count = 1):
+		assert(count >= 1)
+		objid = max(self._min_free_objid, 1)
+		while count > 0:
+			if (objid, 0) not in self._objs:
+				yield objid
+				count -= 1
+			objid += 1
+
+	def add_compressed_entry(self, entry):
+		self._objs.add_location((entry.objid, entry.gennum), (entry.inside_objid, entry.index))
+
+	def object_at(self, offset):
+		header = self._OBJ_HEADER_RE.match(self._mapped, offset)
+		if header is None:
+			return None
+		return (int(header.group("objid")), int(header.group("gennum")))
+
+	def raw_content_at(self, offset):
+		"""Returns the unparsed content of the uncompressed object at the given
+		offset up to, but excluding, its stream data. This is much cheaper
+		than parsing the object when only a glance at its dictionary is
+		needed."""
+		header = self._OBJ_HEADER_RE.match(self._mapped, offset)
+		if header is None:
+			raise ValueError("No object header found at offset 0x%x." % (offset))
+		content_end = self._CONTENT_END_RE.search(self._mapped, header.end())
+		if content_end is None:
+			raise ValueError("Unterminated object at offset 0x%x." % (offset))
+		return self._mapped[header.end() : content_end.start()]
+
+	def parse_object_at(self, offset, expect_key = None):
+		header = self._OBJ_HEADER_RE.match(self._mapped, offset)
+		if header is None:
+			raise ValueError("No object header found at offset 0x%x." % (offset))
+		key = (int(header.group("objid")), int(header.group("gennum")))
+		if (expect_key is not None) and (key != expect_key):
+			raise ValueError("Expected object %s at offset 0x%x, but found %s." % (expect_key, offset, key))
+
+		content_end = self._CONTENT_END_RE.search(self._mapped, header.end())
+		if content_end is None:
+			raise ValueError("Unterminated object %s at offset 0x%x." % (key, offset))
+		content = self._mapped[header.end() : content_end.start()].decode("latin1")
+		content = content.replace("\\\r\n", "").replace("\\\n", "").replace("\\\r", "")
+		content = PDFParser.parse(content)
+
+		if content_end.group(0) == b"endobj":
+			return LazyPDFObject(key[0], key[1], content)
+
+		stream_offset = content_end.end()
+		stream_length = content.get(PDFName("/Length")) if isinstance(content, dict) else None
+		if isinstance(stream_length, PDFXRef):
+			length_obj = self.lookup(stream_length)
+			stream_length = length_obj.content if (length_obj is not None) else None
+		if (not isinstance(stream_length, int)) or (stream_offset + stream_length > len(self._mapped)):
+			endstream = self._ENDSTREAM_RE.search(self._mapped, stream_offset)
+			if endstream is None:
+				raise ValueError("Stream of object %s at offset 0x%x has no end." % (key, offset))
+			stream_length = endstream.start() - stream_offset
+		return LazyPDFObject(key[0], key[1], content, mapped = self._mapped, stream_offset = stream_offset, stream_length = stream_length)
+
+	def _objstrm(self, objid):
+		"""Returns the decoded header and data of an object stream, decoding
+		it on first use."""
+		if objid not in self._objstrm_cache:
+			objstrm_obj = self.parse_object_at(self._objstrm_offsets[objid], expect_key = (objid, 0))
+			data = objstrm_obj.stream.decode()
+			first = objstrm_obj.content[PDFName("/First")]
+			header = [ int(value) for value in data[ : first].decode("ascii").split() ]
+			self._objstrm_cache[objid] = (header, data[first : ])
+		return self._objstrm_cache[objid]
+
+	def _parse_compressed_object(self, key, objstrm_objid, index):
+		(header, data) = self._objstrm(objstrm_objid)
+		idx = 2 * index
+		if (idx + 1 >= len(header)) or (header[idx] != key[0]):
+			# Index does not match, look the object up by its ID instead
+			idx = header[0 : : 2].index(key[0]) * 2
+		sub_offset = header[idx + 1]
+		next_sub_offset = header[idx + 3] if (idx + 3 < len(header)) else len(data)
+		obj = PDFObject(key[0], key[1], data[sub_offset : next_sub_offset])
+
+		# The decoded data is only needed until all objects of the stream
+		# have been parsed
+		self._objstrm_pending[objstrm_objid] -= 1
+		if self._objstrm_pending[objstrm_objid] == 0:
+			self._objstrm_cache.pop(objstrm_objid, None)
+		return obj
+
+	def _parse_object(self, key, location):
+		if isinstance(location, tuple):
+			obj = self._parse_compressed_object(key, *location)
+			self._log.trace("Lazily parsed %s from object stream %d", obj, location[0])
+		else:
+			obj = self.parse_object_at(location, expect_key = key)
+			self._log.trace("Lazily parsed %s at offset 0x%x", obj, location)
+		return obj
+
+	def unpack_objstrms(self):
+		# Unlike llpdf's implementation, objects are not taken out of their
+		# object streams right away, but only when they are first accessed.
+		# Only objects that the XRef table actually refers to are considered,
+		# so that objects superseded by an incremental update are not
+		# resurrected. The object streams themselves are removed from the
+		# document, as the writer creates its own.
+		objstrm_objids = collections.Counter(xref_entry.inside_objid for (key, xref_entry) in self.xref_table if isinstance(xref_entry, CompressedXRefEntry) and (key in self._objs))
+		for (objid, count) in objstrm_objids.items():
+			offset = self._objs.pop_location((objid, 0))
+			if offset is None:
+				raise ValueError("Object stream %d referenced by the XRef table is not found." % (objid))
+			self._objstrm_offsets[objid] = offset
+			self._objstrm_pending[objid] = count
+
+	def close(self):
+		self._mapped.close()
+		self._file.close()
+
+class LazyPDFReader(object):
+	"""Reads a PDF file by memory-mapping it and resolving objects through the
+	XRef table(s) instead of reading the whole file and all stream data into
+	memory. Only object dictionaries of accessed objects are kept in memory,
+	stream data is sliced out of the mapping when it is actually used. Files
+	whose XRef structure cannot be interpreted are read with llpdf's regular
+	PDFReader instead."""
+	_log = logging.getLogger("llpdf.LazyPDFReader")
+	_TRAILER_KEYS = [ PDFName("/Root"), PDFName("/Info"), PDFName("/ID"), PDFName("/Encrypt") ]
+
+	def _find_startxref(self, mapped):
+		tail_offset = max(0, len(mapped) - 2048)
+		index = mapped.rfind(b"startxref", tail_offset)
+		if index == -1:
+			raise ValueError("No startxref found at end of file.")
+		f = StreamRepr(mapped)
+		f.seek(index + len(b"startxref"))
+		return int(f.read_next_token())
+
+	def _read_classic_section(self, pdf, offset):
+		f = StreamRepr(pdf.mapped)
+		f.seek(offset)
+		if f.read_next_token() != b"xref":
+			raise ValueError("Expected XRef table at offset 0x%x." % (offset))
+		xref_table = XRefTable.read_xref_table_from_file(f)
+		if f.read_next_token() != b"trailer":
+			raise ValueError("Expected trailer after XRef table at offset 0x%x." % (offset))
+		trailer = PDFParser.parse(f.read_until_token(b"startxref", rewind = True).decode("latin1"))
+		return (xref_table, trailer)
+
+	def _read_stream_section(self, pdf, offset):
+		xref_obj = pdf.parse_object_at(offset)
+		trailer = xref_obj.content
+		if trailer.get(PDFName("/Type")) != PDFName("/XRef"):
+			raise ValueError("Object at offset 0x%x is not an XRef stream." % (offset))
+		data = xref_obj.stream.decode()
+		field_lengths = trailer[PDFName("/W")]
+		entry_width = sum(field_lengths)
+		index = trailer.get(PDFName("/Index"), [ 0, trailer[PDFName("/Size")] ])
+		xref_table = XRefTable()
+		data_offset = 0
+		for subsection in range(0, len(index), 2):
+			(first_objid, count) = (index[subsection], index[subsection + 1])
+			subsection_data = data[data_offset : data_offset + (count * entry_width)]
+			xref_table.parse_xref_object(subsection_data, [ first_objid, count ], field_lengths)
+			data_offset += count * entry_width
+		return (xref_table, trailer, xref_obj.xref)
+
+	def _read_xref(self, pdf):
+		offset = self._find_startxref(pdf.mapped)
+		startxref = offset
+		xref_is_stream = pdf.mapped[offset : offset + 4] != b"xref"
+		xref_size = 0
+		visited = set()
+		pending = [ offset ]
+		trailer = None
+		xref_objects = set()
+		seen_keys = set()
+		while len(pending) > 0:
+			offset = pending.pop(0)
+			if offset in visited:
+				continue
+			visited.add(offset)
+
+			if pdf.mapped[offset : offset + 4] == b"xref":
+				(xref_table, section_trailer) = self._read_classic_section(pdf, offset)
+			else:
+				(xref_table, section_trailer, xref_obj_xref) = self._read_stream_section(pdf, offset)
+				xref_objects.add((xref_obj_xref.objid, xref_obj_xref.gennum))
+			self._log.debug("Read XRef section at 0x%x with %d entries.", offset, len(xref_table))
+
+			# Entries of newer sections take precedence over older ones
+			for (key, entry) in xref_table:
+				if key in seen_keys:
+					continue
+				seen_keys.add(key)
+				if isinstance(entry, UncompressedXRefEntry):
+					pdf.objects.add_location(key, entry.offset)
+				elif isinstance(entry, CompressedXRefEntry):
+					pdf.add_compressed_entry(entry)
+				pdf.xref_table.add_entry(entry)
+			if trailer is None:
+				trailer = section_trailer
+			if isinstance(section_trailer.get(PDFName("/Size")), int):
+				xref_size = max(xref_size, section_trailer[PDFName("/Size")])
+
+			for follow_key in [ PDFName("/XRefStm"), PDFName("/Prev") ]:
+				if isinstance(section_trailer.get(follow_key), int):
+					pending.append(section_trailer[follow_key])
+
+		# XRef streams are superseded by whatever the writer creates
+		for key in xref_objects:
+			if key in pdf.objects:
+				del pdf.objects[key]
+		pdf.trailer = { key: value for (key, value) in trailer.items() if key in self._TRAILER_KEYS }
+		xref_size = max([ xref_size ] + [ objid + 1 for ((objid, gennum), entry) in pdf.xref_table ])
+		pdf.set_xref_info(startxref, xref_is_stream, xref_size)
+
+	def _validate_offsets(self, pdf):
+		for (key, entry) in pdf.xref_table:
+			if not isinstance(entry, UncompressedXRefEntry):
+				continue
+			if pdf.object_at(entry.offset) != key:
+				raise ValueError("XRef entry of object %s points to offset 0x%x which does not contain that object." % (key, entry.offset))
+
+	def read(self, filename):
+		f = open(filename, "rb")
+		try:
+			mapped = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		except ValueError:
+			# Empty file cannot be mapped
+			f.close()
+			return llpdf.PDFReader().read(filename)
+
+		pdf = LazyPDFDocument(f, mapped)
+		try:
+			self._read_xref(pdf)
+			self._validate_offsets(pdf)
+			pdf.unpack_objstrms()
+		except Exception as e:
+			self._log.warning("Cannot read %s lazily, falling back to reading it completely: %s", filename, e)
+			pdf.close()
+			return llpdf.PDFReader().read(filename)
+
+		self._log.debug("Found %d objects in XRef table(s) of %s, %d of which were parsed.", pdf.objcount, filename, pdf.objects.parsed_count)
+		return pdf
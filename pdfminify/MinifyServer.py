@@ -0,0 +1,348 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import os
+import json
+import shutil
+import socket
+import ipaddress
+import logging
+import tempfile
+import threading
+import traceback
+import socketserver
+import http.server
+import urllib.parse
+import concurrent.futures
+import llpdf
+from pdfminify.PDFMinifier import PDFMinifier, MinifyResult
+from pdfminify.PhaseProfiler import PhaseProfiler
+
+def _serve_minify(args, infile, outfile):
+	try:
+		llpdf.Measurements.set_default_unit(args.unit)
+		result = PDFMinifier(args).minify(infile, outfile)
+		if args.profile_json is not None:
+			PhaseProfiler.write_json(args.profile_json, [ result ])
+		return result
+	except Exception as e:
+		logging.getLogger("llpdf").debug("Minification of %s failed: %s", infile, traceback.format_exc())
+		return MinifyResult(infile = infile, outfile = outfile, old_size = None, new_size = None, error = "%s: %s" % (e.__class__.__name__, str(e)), profile = None, estimate = None)
+
+class MinifyRequestException(Exception):
+	def __init__(self, status, message):
+		Exception.__init__(self, message)
+		self.status = status
+
+class _MinifyRequestHandler(http.server.BaseHTTPRequestHandler):
+	_CHUNK_SIZE = 1024 * 1024
+
+	def address_string(self):
+		# Clients of a UNIX socket do not have an address
+		if isinstance(self.client_address, tuple):
+			return self.client_address[0]
+		return "unix"
+
+	def log_message(self, format, *args):
+		self.server.minify_server.log.info("%s - %s", self.address_string(), format % args)
+
+	def _send_json(self, status, data, headers = None):
+		body = (json.dumps(data, indent = 4, sort_keys = True) + "\n").encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		for (key, value) in (headers or { }).items():
+			self.send_header(key, value)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def _receive_body(self, filename):
+		if "Content-Length" not in self.headers:
+			raise MinifyRequestException(411, "Content-Length header is required.")
+		length = int(self.headers["Content-Length"])
+		if length > self.server.minify_server.max_request_size:
+			raise MinifyRequestException(413, "Request body of %d bytes exceeds the limit of %d bytes." % (length, self.server.minify_server.max_request_size))
+		with open(filename, "wb") as f:
+			while length > 0:
+				chunk = self.rfile.read(min(length, self._CHUNK_SIZE))
+				if len(chunk) == 0:
+					raise MinifyRequestException(400, "Request body ended prematurely.")
+				f.write(chunk)
+				length -= len(chunk)
+
+	def _send_file(self, filename, result):
+		self.send_response(200)
+		self.send_header("Content-Type", "application/pdf")
+		self.send_header("Content-Length", str(result.new_size))
+		self.send_header("X-Pdfminify-Original-Size", str(result.old_size))
+		self.end_headers()
+		with open(filename, "rb") as f:
+			shutil.copyfileobj(f, self.wfile, self._CHUNK_SIZE)
+
+	def do_GET(self):
+		url = urllib.parse.urlsplit(self.path)
+		if url.path == "/status":
+			self._send_json(200, self.server.minify_server.status)
+		else:
+			self._send_json(404, { "error": "Not found." })
+
+	def do_POST(self):
+		url = urllib.parse.urlsplit(self.path)
+		if url.path != "/minify":
+			self._send_json(404, { "error": "Not found." })
+			return
+
+		minify_server = self.server.minify_server
+		if isinstance(self.client_address, tuple) and (minify_server.REQUEST_HEADER not in self.headers):
+			# Browsers only send custom headers after a CORS preflight, which
+			# the server never grants, so web pages cannot submit jobs
+			self.close_connection = True
+			self._send_json(403, { "error": "Requests over TCP must carry the %s header." % (minify_server.REQUEST_HEADER) })
+			return
+
+		if not minify_server.acquire_slot():
+			# The request body is not read at all; the connection is closed
+			# and the client is told to retry later
+			self.close_connection = True
+			self._send_json(503, { "error": "Too many pending jobs, try again later." }, headers = { "Retry-After": "1" })
+			return
+		try:
+			query = urllib.parse.parse_qs(url.query, keep_blank_values = True)
+			with tempfile.TemporaryDirectory(prefix = "pdfminify_") as tmpdir:
+				infile = query.get("input", [ None ])[0]
+				if infile is None:
+					infile = os.path.join(tmpdir, "input.pdf")
+					self._receive_body(infile)
+				else:
+					infile = minify_server.server_path(infile)
+				outfile = query.get("output", [ None ])[0]
+				if outfile is None:
+					outfile = os.path.join(tmpdir, "output.pdf")
+					stream_result = True
+				else:
+					outfile = minify_server.server_path(outfile)
+					stream_result = False
+
+				args = minify_server.parse_options(query.get("option", [ ]), infile, outfile)
+				result = minify_server.minify(args, infile, outfile)
+				if result.error is not None:
+					raise MinifyRequestException(500, result.error)
+
+				if stream_result:
+					self._send_file(outfile, result)
+				else:
+					self._send_json(200, {
+						"input":		result.infile,
+						"output":		result.outfile,
+						"old_size":		result.old_size,
+						"new_size":		result.new_size,
+						"profile":		result.profile,
+					})
+		except MinifyRequestException as e:
+			self.close_connection = True
+			self._send_json(e.status, { "error": str(e) })
+		finally:
+			minify_server.release_slot()
+
+class _MinifyTCPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+	daemon_threads = True
+
+class _MinifyUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+class MinifyServer(object):
+	"""Long-running minification service. Jobs are accepted over HTTP, either
+	on a loopback TCP port or on a UNIX socket, and processed by a bounded
+	pool of worker processes which keep pdfminify and llpdf loaded. At most
+	'workers + queue_limit' jobs are accepted at the same time; further
+	requests are rejected with 503 so that clients can back off.
+
+	POST /minify takes the PDF as request body and returns the minified PDF.
+	When the server was started with a file root, 'input' and 'output' paths
+	relative to that directory can be given instead. Options are given as
+	repeated 'option' query parameters which are parsed exactly like the
+	command line, e.g. '/minify?option=-j&option=--target-dpi=72'. Options
+	that name files on the server can only be set as default options when
+	the server is started. Unless explicitly allowed, the server only listens
+	on loopback addresses, as there is no authentication whatsoever. On
+	TCP, POST requests must carry the
+	REQUEST_HEADER header so that web pages cannot submit jobs. GET /status
+	reports the load of the server."""
+	log = logging.getLogger("llpdf.MinifyServer")
+	REQUEST_HEADER = "X-Pdfminify-Request"
+	_FORBIDDEN_OPTIONS = ( "output_dir", "manifest", "processes" )
+	_PATH_OPTIONS = ( "image_cache", "saveimgdir", "color_profile", "sign_cert", "sign_key", "sign_chain", "sign_font", "embed_payload", "dry_run_json", "profile_json" )
+
+	def __init__(self, parser, default_options = None, workers = 1, queue_limit = None, max_request_size = 1024 * 1024 * 1024, file_root = None, allow_remote = False):
+		self._parser = parser
+		self._parser.setsilenterror(True)
+		self._default_options = default_options if (default_options is not None) else [ ]
+		self._workers = workers
+		self._queue_limit = queue_limit if (queue_limit is not None) else (2 * workers)
+		self._max_request_size = max_request_size
+		self._file_root = os.path.realpath(file_root) if (file_root is not None) else None
+		self._allow_remote = allow_remote
+		self._slots = threading.BoundedSemaphore(self._workers + self._queue_limit)
+		self._lock = threading.Lock()
+		self._pending = 0
+		self._completed = 0
+		self._failed = 0
+		self._rejected = 0
+		self._executor = None
+		self._server = None
+		self._socket_path = None
+		self._default_args = None
+
+		# Check the default options once so that mistakes are reported right
+		# at startup and not with the first request
+		self._default_args = self.parse_options([ ], "input.pdf", "output.pdf")
+
+	@property
+	def max_request_size(self):
+		return self._max_request_size
+
+	@property
+	def status(self):
+		with self._lock:
+			return {
+				"workers":		self._workers,
+				"queue_limit":	self._queue_limit,
+				"pending":		self._pending,
+				"completed":	self._completed,
+				"failed":		self._failed,
+				"rejected":		self._rejected,
+			}
+
+	def acquire_slot(self):
+		acquired = self._slots.acquire(blocking = False)
+		with self._lock:
+			if acquired:
+				self._pending += 1
+			else:
+				self._rejected += 1
+		return acquired
+
+	def release_slot(self):
+		with self._lock:
+			self._pending -= 1
+		self._slots.release()
+
+	def server_path(self, path):
+		"""Resolves a file name given by a client relative to the file root
+		and ensures that it does not point outside of it."""
+		if self._file_root is None:
+			raise MinifyRequestException(403, "Input and output files on the server are not permitted; start the server with --file-root to allow them.")
+		resolved = os.path.realpath(os.path.join(self._file_root, path))
+		if os.path.commonpath([ self._file_root, resolved ]) != self._file_root:
+			raise MinifyRequestException(403, "File %s is outside of the server's file root." % (path))
+		return resolved
+
+	def parse_options(self, options, infile, outfile):
+		if any(option in ("-h", "--help") for option in options):
+			raise MinifyRequestException(400, "Help is not available through the server.")
+		try:
+			args = self._parser.parse_args(self._default_options + options + [ infile, outfile ])
+		except (Exception, SystemExit) as e:
+			raise MinifyRequestException(400, "Invalid options: %s" % (str(e)))
+		if len(args.files) != 2:
+			raise MinifyRequestException(400, "Options must not contain file names.")
+		for forbidden in self._FORBIDDEN_OPTIONS:
+			if getattr(args, forbidden) is not None:
+				raise MinifyRequestException(400, "Batch mode options cannot be used with the server.")
+		if self._default_args is not None:
+			for option in self._PATH_OPTIONS:
+				if getattr(args, option) != getattr(self._default_args, option):
+					raise MinifyRequestException(403, "Option --%s names a file on the server and can only be given when starting the server." % (option.replace("_", "-")))
+		if (args.sign_cert is None) ^ (args.sign_key is None):
+			raise MinifyRequestException(400, "Specifying only a key or only a certificate does not make sense; you need to specify either both or none.")
+		if args.sign_only and (args.sign_cert is None):
+			raise MinifyRequestException(400, "Signing only requires a certificate and key to sign with.")
+		if args.dry_run or (args.dry_run_json is not None) or args.dry_run_exact_dpi:
+			raise MinifyRequestException(400, "Dry runs cannot be used with the server.")
+		return args
+
+	def minify(self, args, infile, outfile):
+		future = self._executor.submit(_serve_minify, args, infile, outfile)
+		try:
+			result = future.result()
+		except concurrent.futures.process.BrokenProcessPool:
+			self.log.error("Worker process died while minifying %s, restarting worker pool.", infile)
+			with self._lock:
+				self._executor = concurrent.futures.ProcessPoolExecutor(max_workers = self._workers)
+			result = MinifyResult(infile = infile, outfile = outfile, old_size = None, new_size = None, error = "Worker process died.", profile = None, estimate = None)
+		with self._lock:
+			if result.error is None:
+				self._completed += 1
+			else:
+				self._failed += 1
+		return result
+
+	@staticmethod
+	def _is_loopback(host):
+		if host == "":
+			# Listens on all interfaces
+			return False
+		try:
+			addresses = socket.getaddrinfo(host.strip("[]"), None)
+		except socket.gaierror as e:
+			raise ValueError("Cannot resolve listen address %s: %s" % (host, e))
+		return all(ipaddress.ip_address(address[4][0].split("%")[0]).is_loopback for address in addresses)
+
+	def _check_listen_address(self, listen):
+		if listen.startswith("unix:"):
+			return
+		host = listen.rsplit(":", maxsplit = 1)[0]
+		if self._is_loopback(host):
+			return
+		if not self._allow_remote:
+			raise ValueError("Refusing to listen on non-loopback address %s, the server does not authenticate clients." % (host))
+		self.log.warning("Listening on non-loopback address %s; any client that can reach it can submit jobs.", host)
+
+	def _create_server(self, listen):
+		if listen.startswith("unix:"):
+			self._socket_path = listen[5:]
+			if os.path.exists(self._socket_path):
+				os.unlink(self._socket_path)
+			server = _MinifyUnixServer(self._socket_path, _MinifyRequestHandler)
+		else:
+			(host, port) = listen.rsplit(":", maxsplit = 1)
+			server = _MinifyTCPServer((host, int(port)), _MinifyRequestHandler)
+		server.minify_server = self
+		return server
+
+	def serve_forever(self, listen):
+		"""'listen' is either 'unix:/path/to/socket' or 'host:port'."""
+		self._check_listen_address(listen)
+		self._executor = concurrent.futures.ProcessPoolExecutor(max_workers = self._workers)
+		self._server = self._create_server(listen)
+		self.log.info("Serving on %s with %d workers and a queue limit of %d.", listen, self._workers, self._queue_limit)
+		try:
+			self._server.serve_forever()
+		finally:
+			self._server.server_close()
+			self._executor.shutdown()
+			if self._socket_path is not None:
+				os.unlink(self._socket_path)
+
+	def shutdown(self):
+		if self._server is not None:
+			self._server.shutdown()
@@ -0,0 +1,239 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import os
+import logging
+import argparse
+import collections
+import llpdf
+import pdfminify.filters
+from pdfminify.FilesizeFormatter import FilesizeFormatter
+from pdfminify.LazyPDFReader import LazyPDFReader, LazyPDFDocument
+from pdfminify.StreamingPDFWriter import StreamingPDFWriter
+from pdfminify.PhaseProfiler import PhaseProfiler
+from pdfminify.IncrementalSigner import IncrementalSigner
+from pdfminify.FusedTraversal import FusedTraversal
+from pdfminify.SavingsEstimator import SavingsEstimator
+from pdfminify.ImageBackend import ImageBackend
+
+MinifyResult = collections.namedtuple("MinifyResult", [ "infile", "outfile", "old_size", "new_size", "error", "profile", "estimate" ])
+
+class PDFMinifier(object):
+	_log = logging.getLogger("llpdf")
+	_SIZE_BUDGET_JPEG_QUALITIES = [ 75, 60, 50 ]
+	_SIZE_BUDGET_DPI_FACTORS = [ 0.8, 0.64, 0.5, 0.4, 0.32, 0.25 ]
+	_SIZE_BUDGET_MIN_DPI = 36
+
+	def __init__(self, args):
+		self._args = args
+		self._fsf = FilesizeFormatter()
+		self._pdf_filter_classes = self._get_filter_classes()
+
+	@property
+	def pdf_filter_classes(self):
+		return self._pdf_filter_classes
+
+	def _get_filter_classes(self):
+		args = self._args
+		return [ filter_class for filter_class in [
+			llpdf.filters.AnalyzeFilter if args.analyze else None,
+			pdfminify.filters.RemoveDuplicateImageOptimization if (not args.no_filters) else None,
+			pdfminify.filters.NearDuplicateImageOptimization if (args.near_duplicate_images and (not args.no_filters)) else None,
+			pdfminify.filters.RemoveDuplicateFontOptimization if (not args.no_filters) else None,
+			pdfminify.filters.RemoveMetadataFilter if (args.strip_metadata and (not args.no_filters)) else None,
+			pdfminify.filters.SubsetFontOptimization if (args.subset_fonts and (not args.no_filters)) else None,
+			pdfminify.filters.FlattenImageOptimization if ((args.remove_alpha or args.pdfa_1b) and (not args.no_filters)) else None,
+			pdfminify.filters.DownscaleImageOptimization if ((args.saveimgdir is not None) or ((not args.no_downscaling) and (not args.no_filters))) else None,
+			llpdf.filters.AddCropBoxFilter if (args.cropbox and (not args.no_filters)) else None,
+			pdfminify.filters.MinifyContentOptimization if (args.minify_content and (not args.no_filters)) else None,
+			pdfminify.filters.ExplicitLengthFilter if (not args.no_filters) else None,
+			pdfminify.filters.DeleteOrphanedObjectsFilter if (not args.no_filters) else None,
+			llpdf.filters.TagFilter if (not (args.no_filters or args.no_pdf_tagging)) else None,
+			llpdf.filters.EmbedPayloadFilter if (args.embed_payload is not None) else None,
+			llpdf.filters.PDFAFilter if (args.pdfa_1b and (not args.no_filters)) else None,
+			llpdf.filters.DecompressFilter if args.decompress_data else None,
+			pdfminify.filters.SignFilter if args.sign_cert else None,
+		] if filter_class is not None ]
+
+	def _filter_groups(self):
+		"""Groups adjacent visitor filters so that they share a single
+		traversal of all objects. All other filters form a group of their
+		own."""
+		groups = [ ]
+		for pdf_filter_class in self._pdf_filter_classes:
+			is_visitor = issubclass(pdf_filter_class, pdfminify.filters.VisitorFilter)
+			if is_visitor and (len(groups) > 0) and issubclass(groups[-1][0], pdfminify.filters.VisitorFilter):
+				groups[-1].append(pdf_filter_class)
+			else:
+				groups.append([ pdf_filter_class ])
+		return groups
+
+	def _create_writer(self):
+		use_xref_stream = not (self._args.no_xref_stream or self._args.pdfa_1b)
+		use_object_streams = not (self._args.no_object_streams or self._args.pdfa_1b)
+		return StreamingPDFWriter(pretty = self._args.pretty_pdf, use_xref_stream = use_xref_stream, use_object_streams = use_object_streams, compression_level = self._args.compression_level, recompress_streams = self._args.recompress_streams, jobs = self._args.jobs)
+
+	def format_size_change(self, old_size, new_size):
+		percent = 100 * new_size / old_size
+		saved = old_size - new_size
+
+		details = [ ]
+		details.append("%.0f%% of original" % (percent))
+		if saved > 0:
+			details.append("%s saved" % (self._fsf(saved)))
+		else:
+			details.append("%s growth" % (self._fsf(-saved)))
+
+		if saved > 0:
+			details.append("ratio %.1f : 1" % (old_size / new_size))
+		else:
+			details.append("ratio 1 : %.1f" % (new_size / old_size))
+
+		return "%s -> %s (%s)" % (self._fsf(old_size), self._fsf(new_size), ", ".join(details))
+
+	def _size_budget_settings(self):
+		"""Returns the image settings that are tried in turn when the output
+		exceeds the size budget, ordered from best to worst quality."""
+		args = self._args
+		jpeg_images = ImageBackend(args.image_backend).jpeg_images_for_jpeg_output
+		settings = [ ]
+		def add(target_dpi, jpeg_quality):
+			candidate = argparse.Namespace(**vars(args))
+			candidate.jpeg_images = jpeg_images
+			candidate.target_dpi = target_dpi
+			candidate.jpeg_quality = jpeg_quality
+			settings.append(candidate)
+
+		if args.jpeg_images != jpeg_images:
+			add(args.target_dpi, args.jpeg_quality)
+		for jpeg_quality in self._SIZE_BUDGET_JPEG_QUALITIES:
+			if jpeg_quality < args.jpeg_quality:
+				add(args.target_dpi, jpeg_quality)
+		jpeg_quality = min(args.jpeg_quality, self._SIZE_BUDGET_JPEG_QUALITIES[-1])
+		for dpi_factor in self._SIZE_BUDGET_DPI_FACTORS:
+			target_dpi = round(args.target_dpi * dpi_factor)
+			if target_dpi < self._SIZE_BUDGET_MIN_DPI:
+				break
+			add(target_dpi, jpeg_quality)
+		return settings
+
+	def _meet_size_budget(self, pdf, outfile, writer, downscale_filter, profiler):
+		"""When the written file exceeds the size budget, only the images are
+		re-encoded with successively lower quality and resolution and the
+		document is written again, until the budget is met."""
+		filesize = writer.outfile.filesize()
+		if filesize <= self._args.max_size:
+			return
+		if (downscale_filter is None) or (not downscale_filter.reencodable):
+			self._log.warning("Output file size %s exceeds budget of %s, but there are no images that could be re-encoded.", self._fsf(filesize), self._fsf(self._args.max_size))
+			return
+
+		for settings in self._size_budget_settings():
+			self._log.debug("Output file size %s exceeds budget of %s, re-encoding images at %d dpi with JPEG quality %d.", self._fsf(filesize), self._fsf(self._args.max_size), settings.target_dpi, settings.jpeg_quality)
+			with profiler.phase("reencode %d dpi, quality %d" % (settings.target_dpi, settings.jpeg_quality), pdf = pdf):
+				downscale_filter.reencode(settings)
+			with profiler.phase("write", pdf = pdf):
+				writer.write(pdf, outfile)
+			filesize = writer.outfile.filesize()
+			if filesize <= self._args.max_size:
+				self._log.info("Met size budget of %s with images at %d dpi and JPEG quality %d: %s.", self._fsf(self._args.max_size), settings.target_dpi, settings.jpeg_quality, self._fsf(filesize))
+				return
+		self._log.warning("Could not meet size budget of %s, smallest output file is %s.", self._fsf(self._args.max_size), self._fsf(filesize))
+
+	def _read(self, infile, outfile):
+		if self._args.lazy_read:
+			if os.path.exists(outfile) and os.path.samefile(infile, outfile):
+				# Overwriting a memory-mapped input file would pull the rug
+				# out from under the lazy reader
+				self._log.warning("Output file %s overwrites input file, not reading it lazily.", outfile)
+			else:
+				return LazyPDFReader().read(infile)
+		return llpdf.PDFReader().read(infile)
+
+	@property
+	def profiling(self):
+		return self._args.profile or (self._args.profile_json is not None)
+
+	def estimate(self, infile):
+		estimate = SavingsEstimator(self._args).estimate(infile)
+		return MinifyResult(infile = infile, outfile = None, old_size = estimate["size"], new_size = estimate["estimated_size"], error = None, profile = None, estimate = estimate)
+
+	def minify(self, infile, outfile):
+		if self._args.dry_run:
+			return self.estimate(infile)
+		old_size = os.stat(infile).st_size
+		profiler = PhaseProfiler(enabled = self.profiling, trace_memory = self._args.profile_memory)
+		profiler.start()
+		try:
+			if self._args.sign_only:
+				IncrementalSigner(self._args).sign(infile, outfile, profiler = profiler)
+			else:
+				pdf = None
+				with profiler.phase("read", pdf = lambda: pdf):
+					pdf = self._read(infile, outfile)
+				try:
+					self._process(pdf, outfile, profiler)
+				finally:
+					if isinstance(pdf, LazyPDFDocument):
+						pdf.close()
+		finally:
+			profiler.stop()
+		new_size = os.stat(outfile).st_size
+		profile = profiler.to_dict() if profiler.enabled else None
+		return MinifyResult(infile = infile, outfile = outfile, old_size = old_size, new_size = new_size, error = None, profile = profile, estimate = None)
+
+	def _process(self, pdf, outfile, profiler):
+		if self._args.dump_xref_table:
+			pdf.xref_table.dump()
+
+		pdf_fixup_classes = [ ]
+		downscale_filter = None
+		filter_groups = self._filter_groups()
+		for (group_no, filter_group) in enumerate(filter_groups, 1):
+			group_name = " + ".join(pdf_filter_class.__name__ for pdf_filter_class in filter_group)
+			self._log.debug("Running filter group %d/%d: %s", group_no, len(filter_groups), group_name)
+			with profiler.phase(group_name, pdf = pdf):
+				pdf_filters = [ pdf_filter_class(pdf, self._args) for pdf_filter_class in filter_group ]
+				if isinstance(pdf_filters[0], pdfminify.filters.VisitorFilter):
+					FusedTraversal(pdf, pdf_filters).run()
+				else:
+					pdf_filters[0].run()
+			for pdf_filter in pdf_filters:
+				if self._args.verbose:
+					self._log.debug("%s saved %s." % (pdf_filter.__class__.__name__, self._fsf(pdf_filter.bytes_saved)))
+				if getattr(pdf_filter, "fixup", None) is not None:
+					pdf_fixup_classes.append(pdf_filter)
+				if isinstance(pdf_filter, pdfminify.filters.DownscaleImageOptimization):
+					downscale_filter = pdf_filter
+
+		writer = self._create_writer()
+		try:
+			with profiler.phase("write", pdf = pdf):
+				writer.write(pdf, outfile)
+			if self._args.max_size is not None:
+				self._meet_size_budget(pdf, outfile, writer, downscale_filter, profiler)
+			for (filter_no, pdf_filter) in enumerate(pdf_fixup_classes, 1):
+				self._log.debug("Running fixup %d/%d: %s", filter_no, len(pdf_fixup_classes), pdf_filter.__class__.__name__)
+				with profiler.phase("fixup %s" % (pdf_filter.__class__.__name__)):
+					pdf_filter.fixup(writer)
+		finally:
+			writer.close()
@@ -0,0 +1,75 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+from pdfminify.PillowImageReformatter import PillowImageReformatter
+
+try:
+	import PIL.Image
+except ImportError:
+	PIL = None
+
+class PerceptualHash(object):
+	"""Computes a 64 bit difference hash ("dHash") of the decoded pixel data
+	of an image. The image is converted to grayscale and reduced to 9x8
+	pixels; every bit of the hash tells whether a pixel is brighter than its
+	right neighbor. The hash therefore does not depend on the resolution,
+	encoding or compression of the image, and visually similar images have
+	hashes that differ in only few bits.
+
+	Since the hash only captures brightness gradients, images that differ
+	in color or overall brightness (e.g., the same shape filled red or
+	blue) have identical hashes. A tiny RGB thumbnail of the image is
+	therefore computed along with the hash to compare colors."""
+	BITS = 64
+	_WIDTH = 9
+	_HEIGHT = 8
+	_THUMBNAIL_SIZE = 4
+
+	@classmethod
+	def available(cls):
+		return PIL is not None
+
+	@classmethod
+	def compute_with_thumbnail(cls, image):
+		"""Returns a tuple of the hash and a 4x4 RGB thumbnail of the
+		image."""
+		reformatter = PillowImageReformatter(lossless = True)
+		pil_image = reformatter.decode(image, min_size = (cls._WIDTH * 8, cls._HEIGHT * 8))
+		pixels = pil_image.convert("L").resize((cls._WIDTH, cls._HEIGHT), resample = PIL.Image.BOX).tobytes()
+		hashval = 0
+		for y in range(cls._HEIGHT):
+			row = pixels[y * cls._WIDTH : (y + 1) * cls._WIDTH]
+			for x in range(cls._WIDTH - 1):
+				hashval = (hashval << 1) | (1 if (row[x] > row[x + 1]) else 0)
+		thumbnail = pil_image.convert("RGB").resize((cls._THUMBNAIL_SIZE, cls._THUMBNAIL_SIZE), resample = PIL.Image.BOX).tobytes()
+		return (hashval, thumbnail)
+
+	@staticmethod
+	def distance(hashval1, hashval2):
+		"""Returns the Hamming distance, i.e., number of differing bits."""
+		return bin(hashval1 ^ hashval2).count("1")
+
+	@staticmethod
+	def thumbnail_difference(thumbnail1, thumbnail2):
+		"""Returns the largest difference of any color channel of any pixel
+		of two thumbnails, from 0 to 255."""
+		return max(abs(value1 - value2) for (value1, value2) in zip(thumbnail1, thumbnail2))
@@ -0,0 +1,75 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import collections
+from pdfminify.PerceptualHash import PerceptualHash
+
+class PerceptualHashIndex(object):
+	"""Finds all previously added perceptual hashes that are within a maximum
+	Hamming distance of a given hash without comparing against every single
+	one of them. The hash bits are split into max_distance + 1 bands; if two
+	hashes differ in at most max_distance bits, at least one of the bands
+	must be identical (pigeonhole principle). Every band is indexed by a
+	dictionary, so that only hashes which share at least one band are
+	compared at all."""
+
+	def __init__(self, max_distance, bits = PerceptualHash.BITS):
+		assert(0 <= max_distance < bits)
+		self._max_distance = max_distance
+		band_count = max_distance + 1
+		self._bands = [ ]
+		offset = 0
+		for band in range(band_count):
+			width = (bits - offset) // (band_count - band)
+			self._bands.append((offset, (1 << width) - 1))
+			offset += width
+		self._tables = [ collections.defaultdict(list) for _ in self._bands ]
+		self._entries = [ ]
+
+	def _band_keys(self, hashval):
+		return [ (hashval >> offset) & mask for (offset, mask) in self._bands ]
+
+	def add(self, hashval, item):
+		entry_id = len(self._entries)
+		self._entries.append((hashval, item))
+		for (table, key) in zip(self._tables, self._band_keys(hashval)):
+			table[key].append(entry_id)
+
+	def query(self, hashval):
+		"""Returns a list of (distance, item) tuples of all added hashes
+		within the maximum distance, ordered by distance first and by the
+		order in which they were added second."""
+		entry_ids = set()
+		for (table, key) in zip(self._tables, self._band_keys(hashval)):
+			entry_ids.update(table.get(key, [ ]))
+
+		matches = [ ]
+		for entry_id in sorted(entry_ids):
+			(entry_hashval, item) = self._entries[entry_id]
+			distance = PerceptualHash.distance(hashval, entry_hashval)
+			if distance <= self._max_distance:
+				matches.append((distance, entry_id, item))
+		matches.sort(key = lambda match: match[ : 2])
+		return [ (distance, item) for (distance, entry_id, item) in matches ]
+
+	def __len__(self):
+		return len(self._entries)
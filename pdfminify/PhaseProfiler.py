@@ -0,0 +1,187 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import sys
+import time
+import json
+import contextlib
+import tracemalloc
+from pdfminify.FilesizeFormatter import FilesizeFormatter
+from pdfminify.LazyPDFReader import LazyPDFDocument
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+class PhaseProfiler(object):
+	"""Records wall time, CPU time, peak memory and object/image counts for
+	the individual phases of minifying one document (reading, every filter,
+	writing and every fixup). When disabled, phases are not measured at
+	all.
+
+	The peak RSS is that of the whole process so far, which in a batch
+	worker includes previously processed documents; the increase of that
+	peak during a phase is recorded as well. The peak of memory allocated
+	by Python objects is only measured when memory tracing is enabled,
+	because tracemalloc considerably slows down everything else and thereby
+	distorts the times that are measured along with it."""
+
+	def __init__(self, enabled = True, trace_memory = False):
+		self._enabled = enabled
+		self._trace_memory = enabled and trace_memory
+		self._phases = [ ]
+		self._started_tracing = False
+
+	@property
+	def enabled(self):
+		return self._enabled
+
+	@property
+	def trace_memory(self):
+		return self._trace_memory
+
+	@property
+	def phases(self):
+		return iter(self._phases)
+
+	@staticmethod
+	def _max_rss():
+		if resource is None:
+			return None
+		maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		if sys.platform == "darwin":
+			return maxrss
+		else:
+			return maxrss * 1024
+
+	@staticmethod
+	def _document_counts(pdf):
+		if pdf is None:
+			return { }
+		if isinstance(pdf, LazyPDFDocument):
+			# Do not force parsing of all objects just for the statistics
+			parsed_objects = list(pdf.objects.parsed_objects)
+			return {
+				"objects":			len(pdf.objects),
+				"parsed_objects":	len(parsed_objects),
+				"images":			sum(1 for obj in parsed_objects if obj.is_image),
+			}
+		else:
+			objects = list(pdf)
+			return {
+				"objects":			len(objects),
+				"images":			sum(1 for obj in objects if obj.is_image),
+			}
+
+	def start(self):
+		if self._trace_memory and (not tracemalloc.is_tracing()):
+			tracemalloc.start()
+			self._started_tracing = True
+
+	def stop(self):
+		if self._started_tracing:
+			tracemalloc.stop()
+			self._started_tracing = False
+
+	@contextlib.contextmanager
+	def phase(self, name, pdf = None):
+		"""Measures the enclosed block. The object and image counts of 'pdf'
+		are taken after the block has finished; 'pdf' may also be a callable
+		that returns the document."""
+		if not self._enabled:
+			yield
+			return
+
+		traced = self._trace_memory and tracemalloc.is_tracing()
+		if traced and hasattr(tracemalloc, "reset_peak"):
+			tracemalloc.reset_peak()
+		rss_before = self._max_rss()
+		t0_wall = time.perf_counter()
+		t0_cpu = time.process_time()
+		try:
+			yield
+		finally:
+			wall_time = time.perf_counter() - t0_wall
+			cpu_time = time.process_time() - t0_cpu
+			rss_after = self._max_rss()
+			record = {
+				"phase":			name,
+				"wall_time_secs":	wall_time,
+				"cpu_time_secs":	cpu_time,
+				"peak_traced_bytes":	tracemalloc.get_traced_memory()[1] if traced else None,
+				"process_peak_rss_bytes":	rss_after,
+				"peak_rss_increase_bytes":	(rss_after - rss_before) if (rss_after is not None) else None,
+			}
+			if callable(pdf):
+				pdf = pdf()
+			record.update(self._document_counts(pdf))
+			self._phases.append(record)
+
+	def to_dict(self):
+		return {
+			"phases":			list(self._phases),
+			"wall_time_secs":	sum(record["wall_time_secs"] for record in self._phases),
+			"cpu_time_secs":	sum(record["cpu_time_secs"] for record in self._phases),
+			"process_peak_rss_bytes":	self._max_rss(),
+			"memory_traced":	self._trace_memory,
+		}
+
+	@staticmethod
+	def format_table(profile):
+		"""Formats a profile as returned by to_dict() as a human-readable
+		table."""
+		fsf = FilesizeFormatter()
+		def fmt_size(value):
+			return "-" if (value is None) else fsf(value)
+		def fmt_count(value):
+			return "-" if (value is None) else str(value)
+
+		rows = [ ("Phase", "Wall", "CPU", "Traced peak", "Process peak RSS", "RSS increase", "Objects", "Images") ]
+		for record in profile["phases"]:
+			rows.append((record["phase"], "%.3fs" % (record["wall_time_secs"]), "%.3fs" % (record["cpu_time_secs"]), fmt_size(record["peak_traced_bytes"]), fmt_size(record["process_peak_rss_bytes"]), fmt_size(record["peak_rss_increase_bytes"]), fmt_count(record.get("objects")), fmt_count(record.get("images"))))
+		rows.append(("Total", "%.3fs" % (profile["wall_time_secs"]), "%.3fs" % (profile["cpu_time_secs"]), "", fmt_size(profile["process_peak_rss_bytes"]), "", "", ""))
+
+		widths = [ max(len(row[i]) for row in rows) for i in range(len(rows[0])) ]
+		lines = [ ]
+		for (rowno, row) in enumerate(rows):
+			if rowno in (1, len(rows) - 1):
+				lines.append("  ".join("-" * width for width in widths))
+			lines.append("  ".join([ row[0].ljust(widths[0]) ] + [ value.rjust(width) for (value, width) in zip(row[1:], widths[1:]) ]))
+		if profile["memory_traced"]:
+			lines.append("Note: times were measured with tracemalloc enabled and are therefore inflated.")
+		return "\n".join(lines)
+
+	@staticmethod
+	def write_json(filename, results):
+		"""Writes the profiles of all successfully minified documents of a
+		run into a JSON file."""
+		data = [ {
+			"infile":	result.infile,
+			"outfile":	result.outfile,
+			"old_size":	result.old_size,
+			"new_size":	result.new_size,
+			"profile":	result.profile,
+		} for result in results if result.profile is not None ]
+		with open(filename, "w") as f:
+			json.dump(data, f, indent = 4, sort_keys = True)
+			f.write("\n")
@@ -0,0 +1,160 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import io
+import logging
+from llpdf.Exceptions import UnsupportedImageException
+from pdfminify.ImageMagickImageReformatter import ImageMagickImageReformatter
+from llpdf.img.PDFImage import PDFImage, PDFImageColorSpace
+from llpdf.EncodeDecode import EncodedObject, Filter
+
+try:
+	import PIL.Image
+	import PIL.ImageOps
+	import PIL.ImageColor
+except ImportError:
+	PIL = None
+
+class PillowImageReformatter(ImageMagickImageReformatter):
+	"""Drop-in replacement for ImageMagickImageReformatter that resamples and
+	encodes images in-process using Pillow instead of calling ImageMagick
+	with temporary files. Images that Pillow cannot handle are passed on to
+	the ImageMagick implementation."""
+	_log = logging.getLogger("llpdf.img.PillowImageReformatter")
+
+	_MODES = {
+		(PDFImageColorSpace.DeviceRGB, 8):		"RGB",
+		(PDFImageColorSpace.DeviceGray, 8):		"L",
+		(PDFImageColorSpace.DeviceGray, 1):		"1",
+	}
+	_REV_MODES = { value: key for (key, value) in _MODES.items() }
+
+	@classmethod
+	def available(cls):
+		return PIL is not None
+
+	def _decode(self, image, min_size = None):
+		if image.imgdata.filtering == Filter.DCTDecode:
+			pil_image = PIL.Image.open(io.BytesIO(image.imgdata.encoded_data))
+			if pil_image.mode not in ("RGB", "L"):
+				raise UnsupportedImageException("Unsupported JPEG image mode %s." % (pil_image.mode))
+			if min_size is not None:
+				pil_image.draft(pil_image.mode, min_size)
+			pil_image.load()
+		elif image.imgdata.lossless:
+			mode = self._MODES.get((image.colorspace, image.bits_per_component))
+			if mode is None:
+				raise UnsupportedImageException("Unsupported ColorSpace/BitsPerComponent combination %s/%d." % (image.colorspace.name, image.bits_per_component))
+			try:
+				pixeldata = image.get_pixeldata()
+			except Exception as e:
+				raise UnsupportedImageException("Cannot decode pixel data of %s: %s" % (image, e))
+			if (mode == "L") and (len(pixeldata) == 2 * image.width * image.height):
+				# Same quirk as in PDFImage.get_pnm(): some LaTeX documents
+				# have alpha channels twice the size that the metadata
+				# indicates.
+				pixeldata = pixeldata[ : len(pixeldata) // 2]
+			pil_image = PIL.Image.frombytes(mode, (image.width, image.height), bytes(pixeldata))
+		else:
+			raise UnsupportedImageException("Unsupported image filter %s." % (image.imgdata.filtering.name))
+
+		if image.inverted:
+			if pil_image.mode == "1":
+				pil_image = pil_image.convert("L")
+			pil_image = PIL.ImageOps.invert(pil_image)
+		return pil_image
+
+	def decode(self, image, min_size = None):
+		"""Decodes the pixel data of an image (without its alpha channel) into
+		a Pillow image. When a minimum size is given, JPEG images may be
+		decoded at a reduced resolution that is at least that large, which is
+		much faster."""
+		return self._decode(image, min_size = min_size)
+
+	def _scale(self, pil_image):
+		if self._scale_factor == 1:
+			return pil_image
+		width = max(1, round(pil_image.width * self._scale_factor))
+		height = max(1, round(pil_image.height * self._scale_factor))
+		if pil_image.mode == "1":
+			pil_image = pil_image.convert("L")
+		return pil_image.resize((width, height), resample = PIL.Image.BOX)
+
+	def _encode(self, pil_image, lossless):
+		if pil_image.mode == "1":
+			# Bilevel images do not benefit from lossy compression
+			lossless = True
+
+		(colorspace, bits_per_component) = self._REV_MODES[pil_image.mode]
+		if lossless:
+			imgdata = EncodedObject.create(pil_image.tobytes())
+		else:
+			jpeg_data = io.BytesIO()
+			pil_image.save(jpeg_data, format = "JPEG", quality = self._jpeg_quality)
+			imgdata = EncodedObject(encoded_data = jpeg_data.getvalue(), filtering = Filter.DCTDecode)
+		return PDFImage(width = pil_image.width, height = pil_image.height, colorspace = colorspace, bits_per_component = bits_per_component, imgdata = imgdata, inverted = False)
+
+	def _reformat_alpha(self, alpha):
+		pil_alpha = self._scale(self._decode(alpha))
+		if self._force_one_bit_alpha:
+			# Threshold instead of dithering, just like ImageMagick does
+			pil_alpha = pil_alpha.convert("L").point(lambda value: 255 if (value >= 128) else 0).convert("1")
+		elif pil_alpha.mode != "L":
+			pil_alpha = pil_alpha.convert("L")
+		return self._encode(pil_alpha, lossless = True)
+
+	def _reformat(self, image):
+		reformatted_image = self._encode(self._scale(self._decode(image)), lossless = self._lossless_output(image))
+		if image.alpha:
+			reformatted_image.set_alpha(self._reformat_alpha(image.alpha))
+		return reformatted_image
+
+	def reformat(self, image):
+		if (image.imgdata.lossless == self._lossless) and (self._scale_factor == 1):
+			return image
+		try:
+			return self._reformat(image)
+		except UnsupportedImageException as e:
+			self._log.debug("Pillow cannot reformat %s, falling back to ImageMagick: %s", image, e)
+			return ImageMagickImageReformatter.reformat(self, image)
+
+	def _flatten(self, image, background_color):
+		pil_image = self._decode(image)
+		if pil_image.mode == "1":
+			pil_image = pil_image.convert("L")
+		pil_alpha = self._decode(image.alpha)
+		if pil_alpha.mode != "L":
+			pil_alpha = pil_alpha.convert("L")
+		if pil_alpha.size != pil_image.size:
+			pil_alpha = pil_alpha.resize(pil_image.size, resample = PIL.Image.BOX)
+		background = PIL.Image.new(pil_image.mode, pil_image.size, PIL.ImageColor.getcolor(background_color, pil_image.mode))
+		flattened_image = PIL.Image.composite(pil_image, background, pil_alpha)
+		return self._encode(flattened_image, lossless = True)
+
+	def flatten(self, image, background_color):
+		if image.alpha is None:
+			return image
+		try:
+			return self._flatten(image, background_color)
+		except (UnsupportedImageException, ValueError) as e:
+			self._log.debug("Pillow cannot flatten %s, falling back to ImageMagick: %s", image, e)
+			return ImageMagickImageReformatter.flatten(self, image, background_color)
@@ -0,0 +1,83 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import collections
+from llpdf.types.PDFXRef import PDFXRef
+
+class ReferenceGraph(object):
+	"""Records which objects reference which other objects. The graph is built
+	once while traversing all objects and then kept up to date by the filters
+	that change references, so that finding the objects referring to a
+	particular object or finding orphaned objects does not require another
+	traversal of the whole document."""
+
+	def __init__(self):
+		self._references = { }
+		self._referrers = collections.defaultdict(set)
+
+	@classmethod
+	def _collect_references(cls, data_structure, references):
+		if isinstance(data_structure, dict):
+			for value in data_structure.values():
+				cls._collect_references(value, references)
+		elif isinstance(data_structure, list):
+			for element in data_structure:
+				cls._collect_references(element, references)
+		elif isinstance(data_structure, PDFXRef):
+			references.add(data_structure)
+		return references
+
+	def _unlink(self, xref):
+		for referenced_xref in self._references.pop(xref, ()):
+			referrers = self._referrers[referenced_xref]
+			referrers.discard(xref)
+			if len(referrers) == 0:
+				del self._referrers[referenced_xref]
+
+	def update(self, obj):
+		"""Adds an object to the graph or, if it is already present, rescans
+		its content for references."""
+		self._unlink(obj.xref)
+		references = self._collect_references(obj.content, set())
+		self._references[obj.xref] = references
+		for referenced_xref in references:
+			self._referrers[referenced_xref].add(obj.xref)
+
+	def remove(self, xref):
+		"""Removes a deleted object from the graph. References to it from other
+		objects are retained."""
+		self._unlink(xref)
+
+	def referrers(self, xref):
+		return set(self._referrers.get(xref, ()))
+
+	def unreferenced(self, trailer):
+		"""Returns all objects which are referenced neither by any object nor
+		by the trailer."""
+		trailer_references = self._collect_references(trailer, set())
+		return sorted(xref for xref in self._references if (xref not in self._referrers) and (xref not in trailer_references))
+
+	def __contains__(self, xref):
+		return xref in self._references
+
+	def __len__(self):
+		return len(self._references)
@@ -0,0 +1,304 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import os
+import re
+import json
+import hashlib
+import logging
+import collections
+from llpdf.Exceptions import UnsupportedImageException
+from llpdf.Measurements import Measurements
+from llpdf.types.PDFName import PDFName
+from llpdf.types.PDFXRef import PDFXRef
+from llpdf.repr import GraphicsParser
+from llpdf.interpreter.GraphicsInterpreter import GraphicsInterpreter
+from pdfminify.LazyPDFReader import LazyPDFReader, LazyPDFDocument
+from pdfminify.ImageBackend import ImageBackend
+
+class SavingsEstimator(object):
+	"""Estimates how much a document would shrink without actually minifying
+	it. The document is read lazily: only the XRef table, the page tree and
+	the dictionaries of images are parsed, which are found by a glance at the
+	unparsed dictionaries of all objects. Image data is neither decoded nor
+	re-encoded, except for the few largest images, which are resampled for
+	real to calibrate the estimate of all others. Images are assumed to
+	cover the whole page they are used on, which gives a lower bound of
+	their resolution; only when exact resolutions are requested, the page
+	content streams are interpreted like the downscaling filter does."""
+	_log = logging.getLogger("llpdf.SavingsEstimator")
+	_SAMPLE_IMAGE_COUNT = 3
+	# An indirect /Subtype cannot be ruled out without parsing the object
+	_IMAGE_SUBTYPE_RE = re.compile(rb"/Subtype\s*(/Image(?![^\s/<>\[\]()%])|\d+\s+\d+\s+R)")
+
+	def __init__(self, args):
+		self._args = args
+
+	def _resolve(self, pdf, value):
+		if isinstance(value, PDFXRef):
+			obj = pdf.lookup(value)
+			return None if (obj is None) else obj.content
+		return value
+
+	def _inherited(self, pdf, page, key):
+		visited = set()
+		node = page
+		while (node is not None) and (node.xref not in visited):
+			visited.add(node.xref)
+			value = node.content.get(key)
+			if value is not None:
+				return self._resolve(pdf, value)
+			parent_xref = node.content.get(PDFName("/Parent"))
+			node = pdf.lookup(parent_xref) if isinstance(parent_xref, PDFXRef) else None
+		return None
+
+	def _page_images(self, pdf, resources, visited):
+		"""Yields the XRefs of all images that are reachable through the
+		/XObject resources of a page, including those of nested forms."""
+		resources = self._resolve(pdf, resources)
+		if not isinstance(resources, dict):
+			return
+		xobjects = self._resolve(pdf, resources.get(PDFName("/XObject")))
+		if not isinstance(xobjects, dict):
+			return
+		for xobject_xref in xobjects.values():
+			if (not isinstance(xobject_xref, PDFXRef)) or (xobject_xref in visited):
+				continue
+			visited.add(xobject_xref)
+			xobject = pdf.lookup(xobject_xref)
+			if xobject is None:
+				continue
+			subtype = xobject.content.get(PDFName("/Subtype"))
+			if subtype == PDFName("/Image"):
+				yield xobject_xref
+			elif subtype == PDFName("/Form"):
+				yield from self._page_images(pdf, xobject.content.get(PDFName("/Resources")), visited)
+
+	def _page_content(self, pdf, page):
+		contents = page.content.get(PDFName("/Contents"))
+		content_xrefs = contents if isinstance(contents, list) else [ contents ]
+		pagedata = b"\n".join(pdf.lookup(content_xref).stream.decode() for content_xref in content_xrefs)
+		return GraphicsParser.parse(pagedata.decode("latin1"))
+
+	def _interpreted_dpis(self, pdf, page, images):
+		"""Yields the resolution of every image drawn on the page by
+		interpreting its content stream."""
+		draw_cmds = [ ]
+		interpreter = GraphicsInterpreter(pdf_lookup = pdf, page_obj = page)
+		interpreter.set_draw_callback(draw_cmds.append)
+		interpreter.run(self._page_content(pdf, page))
+		for draw_cmd in draw_cmds:
+			image = images.get(draw_cmd.image_obj.xref)
+			if image is not None:
+				yield (draw_cmd.image_obj.xref, draw_cmd.native_extents.dpi(image["width"], image["height"]))
+
+	def _page_fill_dpis(self, pdf, page, images):
+		"""Yields the resolution of every image used on the page, assuming
+		that it covers the page entirely. This is a lower bound of the actual
+		resolution."""
+		mediabox = self._inherited(pdf, page, PDFName("/MediaBox"))
+		if (not isinstance(mediabox, list)) or (len(mediabox) != 4):
+			return
+		page_width = Measurements.convert(abs(mediabox[2] - mediabox[0]), "native", "inch")
+		page_height = Measurements.convert(abs(mediabox[3] - mediabox[1]), "native", "inch")
+		if (page_width <= 0) or (page_height <= 0):
+			return
+		for image_xref in self._page_images(pdf, self._inherited(pdf, page, PDFName("/Resources")), set()):
+			image = images.get(image_xref)
+			if image is not None:
+				yield (image_xref, min(image["width"] / page_width, image["height"] / page_height))
+
+	def _image_dpis(self, pdf, pages, images):
+		"""Returns the minimum resolution of every image that is drawn on a
+		page."""
+		dpis = { }
+		for page in pages:
+			if self._args.dry_run_exact_dpi:
+				try:
+					page_dpis = list(self._interpreted_dpis(pdf, page, images))
+				except Exception as e:
+					self._log.debug("Cannot interpret content of page %s, assuming images cover the whole page: %s", page.xref, e)
+					page_dpis = list(self._page_fill_dpis(pdf, page, images))
+			else:
+				page_dpis = list(self._page_fill_dpis(pdf, page, images))
+			for (image_xref, dpi) in page_dpis:
+				if dpi > 0:
+					dpis[image_xref] = min(dpis.get(image_xref, dpi), dpi)
+		return dpis
+
+	def _image_objects(self, pdf):
+		"""Yields all image objects of the document. Of a lazily read document,
+		only objects whose unparsed dictionary might describe an image are
+		parsed; objects within object streams cannot be images at all, as
+		they have no stream."""
+		if not isinstance(pdf, LazyPDFDocument):
+			yield from (obj for obj in pdf if obj.is_image)
+			return
+		for key in pdf.objects:
+			location = pdf.objects.location(key)
+			if isinstance(location, tuple):
+				continue
+			if (location is not None) and (self._IMAGE_SUBTYPE_RE.search(pdf.raw_content_at(location)) is None):
+				continue
+			obj = pdf.objects[key]
+			if obj.is_image:
+				yield obj
+
+	def _find_duplicates(self, pdf, images):
+		"""Returns a dictionary that maps duplicate images to the image they
+		would be relinked to. Only images of identical size and dimensions
+		can be duplicates, so only those are read and hashed."""
+		candidates = collections.defaultdict(list)
+		for (xref, image) in images.items():
+			candidates[(image["size"], image["width"], image["height"])].append(xref)
+
+		duplicates = { }
+		for xrefs in candidates.values():
+			if len(xrefs) < 2:
+				continue
+			objs_by_hash = collections.defaultdict(list)
+			for xref in xrefs:
+				objs_by_hash[hashlib.md5(pdf.lookup(xref).raw_stream).hexdigest()].append(xref)
+			for same_xrefs in objs_by_hash.values():
+				for duplicate_xref in same_xrefs[1:]:
+					duplicates[duplicate_xref] = same_xrefs[0]
+		return duplicates
+
+	def _scale_factor(self, dpi):
+		if self._args.no_downscaling or (dpi is None):
+			return 1
+		return min(self._args.target_dpi / dpi, 1)
+
+	def _sample(self, pdf, xref, scale_factor):
+		"""Resamples an image for real and returns a tuple of its original and
+		its resampled size, or None if the image cannot be handled."""
+		try:
+			image = pdf.get_image(xref)
+		except UnsupportedImageException as e:
+			self._log.debug("Cannot sample unsupported image %s: %s", xref, e)
+			return None
+		lossless = not self._args.jpeg_images
+		reformatter = ImageBackend(self._args.image_backend).create_reformatter(lossless = lossless, scale_factor = scale_factor, jpeg_quality = self._args.jpeg_quality, force_one_bit_alpha = self._args.one_bit_alpha)
+		resampled_image = reformatter.reformat(image)
+		return (image.total_size, resampled_image.total_size)
+
+	def _calibrate(self, pdf, images, resampled):
+		"""Resamples the largest images and returns the ratio between their
+		actual and their geometrically estimated size."""
+		samples = sorted(resampled, key = lambda xref: (-images[xref]["size"], xref))[:self._SAMPLE_IMAGE_COUNT]
+		estimated_total = 0
+		actual_total = 0
+		for xref in samples:
+			scale_factor = images[xref]["scale_factor"]
+			result = self._sample(pdf, xref, scale_factor)
+			if result is None:
+				continue
+			(original_size, resampled_size) = result
+			images[xref]["sampled"] = True
+			estimated_total += original_size * scale_factor * scale_factor
+			actual_total += resampled_size
+		if estimated_total == 0:
+			return (1, 0)
+		sample_count = sum(1 for xref in samples if images[xref]["sampled"])
+		return (actual_total / estimated_total, sample_count)
+
+	def estimate(self, infile):
+		"""Returns a report of the estimated savings for a document as a
+		dictionary that can be serialized to JSON."""
+		filesize = os.stat(infile).st_size
+		pdf = LazyPDFReader().read(infile)
+		try:
+			images = { }
+			object_count = pdf.objcount
+			for obj in self._image_objects(pdf):
+				images[obj.xref] = {
+					"objid":		obj.objid,
+					"width":		obj.content.get(PDFName("/Width"), 0),
+					"height":		obj.content.get(PDFName("/Height"), 0),
+					"size":			len(obj),
+					"dpi":			None,
+					"duplicate_of":	None,
+					"sampled":		False,
+				}
+			pages = list(pdf.pages)
+
+			# Alpha channels are resampled together with the image they belong to
+			dpis = self._image_dpis(pdf, pages, images)
+			for (xref, dpi) in list(dpis.items()):
+				smask_xref = pdf.lookup(xref).content.get(PDFName("/SMask"))
+				if smask_xref in images:
+					dpis[smask_xref] = min(dpis.get(smask_xref, dpi), dpi)
+
+			duplicates = self._find_duplicates(pdf, images)
+			for (xref, image) in images.items():
+				image["dpi"] = dpis.get(xref)
+				image["scale_factor"] = self._scale_factor(image["dpi"])
+				if xref in duplicates:
+					image["duplicate_of"] = duplicates[xref].objid
+
+			# Only images drawn on pages are resampled
+			resampled = [ xref for (xref, image) in images.items() if (image["duplicate_of"] is None) and (image["dpi"] is not None) and (not self._args.no_downscaling) ]
+			(correction, sample_count) = self._calibrate(pdf, images, resampled)
+			for (xref, image) in images.items():
+				if image["duplicate_of"] is not None:
+					image["estimated_size"] = 0
+				elif xref in resampled:
+					image["estimated_size"] = round(image["size"] * image["scale_factor"] * image["scale_factor"] * correction)
+				else:
+					image["estimated_size"] = image["size"]
+		finally:
+			if isinstance(pdf, LazyPDFDocument):
+				pdf.close()
+
+		image_size = sum(image["size"] for image in images.values())
+		dedupe_savings = sum(image["size"] for image in images.values() if image["duplicate_of"] is not None)
+		resample_savings = sum(image["size"] - image["estimated_size"] for image in images.values() if image["duplicate_of"] is None)
+		estimated_size = max(filesize - dedupe_savings - resample_savings, 0)
+		self._log.debug("%s: %d images with %d bytes, estimated savings %d bytes by deduplication and %d bytes by resampling (correction factor %.2f from %d samples)", infile, len(images), image_size, dedupe_savings, resample_savings, correction, sample_count)
+		return {
+			"infile":				infile,
+			"size":					filesize,
+			"objects":				object_count,
+			"pages":				len(pages),
+			"image_count":			len(images),
+			"image_size":			image_size,
+			"duplicate_images":		len(duplicates),
+			"savings": {
+				"dedupe":			dedupe_savings,
+				"resample":			resample_savings,
+			},
+			"sampled_images":		sample_count,
+			"sample_correction":	correction,
+			"estimated_size":		estimated_size,
+			"images": [ {
+				key: value for (key, value) in image.items() if key != "scale_factor"
+			} for (xref, image) in sorted(images.items()) ],
+		}
+
+	@staticmethod
+	def write_json(filename, results):
+		"""Writes the estimates of all successfully analyzed documents of a
+		dry run into a JSON file."""
+		data = [ result.estimate for result in results if result.estimate is not None ]
+		with open(filename, "w") as f:
+			json.dump(data, f, indent = 4, sort_keys = True)
+			f.write("\n")
@@ -0,0 +1,389 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import os
+import zlib
+import logging
+import collections
+from llpdf.repr.PDFSerializer import PDFSerializer
+from llpdf.types.XRefTable import XRefTable, UncompressedXRefEntry, CompressedXRefEntry
+from llpdf.types.PDFObject import PDFObject
+from llpdf.types.PDFName import PDFName
+from llpdf.types.MarkerObject import MarkerObject
+from llpdf.FileRepr import FileWriterDecorator
+from llpdf.EncodeDecode import EncodedObject, Filter
+from pdfminify.WorkerPool import WorkerPool
+
+class ObjectStreamBuilder(object):
+	"""Collects the serialized representation of objects that are compressed
+	into one object stream (/ObjStm). Objects are serialized as soon as they
+	are added, so no reference to the objects themselves is kept."""
+
+	def __init__(self, objid):
+		self._objid = objid
+		self._header = [ ]
+		self._data = bytearray()
+
+	@property
+	def objid(self):
+		return self._objid
+
+	@property
+	def object_count(self):
+		return len(self._header)
+
+	@property
+	def size(self):
+		return len(self._data)
+
+	def add(self, obj, serializer):
+		index = len(self._header)
+		self._header.append((obj.objid, len(self._data)))
+		self._data += serializer.serialize(obj.content) + b"\n"
+		return CompressedXRefEntry(objid = obj.objid, inside_objid = self.objid, index = index)
+
+	def finalize(self, compression_level = 6):
+		header = " ".join("%d %d" % (objid, offset) for (objid, offset) in self._header)
+		header = header.encode("ascii") + b"\n"
+		content = {
+			PDFName("/Type"):	PDFName("/ObjStm"),
+			PDFName("/N"):		self.object_count,
+			PDFName("/First"):	len(header),
+		}
+		stream = EncodedObject(encoded_data = zlib.compress(header + self._data, compression_level), filtering = Filter.FlateDecode)
+		return PDFObject.create(objid = self.objid, gennum = 0, content = content, stream = stream)
+
+class StreamingPDFWriter(object):
+	"""PDF writer that emits every object to the output file as soon as it is
+	handed over, records the XRef offsets on the fly and packs objects
+	without stream data into object streams of bounded size which are
+	flushed as soon as they are full. Memory usage therefore does not depend
+	on the size of the document. Objects can either be fed one by one
+	(begin(), write_object(), finish()) or all at once using write().
+	PDFMinifier uses write() after all filters have finished, since until
+	then any object may still change; the document itself is therefore
+	still held in memory in its entirety.
+
+	Compressing object streams and recompressing Flate streams (if enabled)
+	is done on a pool of 'jobs' threads while further objects are handed
+	over. Objects are nevertheless written in the order in which they were
+	handed over, so the output only depends on the compression level, not
+	on the number of threads.
+
+	After writing, the output file stays open as 'outfile' so that fixups
+	(e.g., the signature filter) can patch it; call close() afterwards."""
+	_log = logging.getLogger("llpdf.StreamingPDFWriter")
+
+	def __init__(self, pretty = False, use_object_streams = True, use_xref_stream = True, compress_object_count = 100, max_container_content_size_bytes = 1024 * 1024, compression_level = 6, recompress_streams = False, jobs = 1):
+		self._pretty = pretty
+		self._use_object_streams = use_object_streams and use_xref_stream
+		self._use_xref_stream = use_xref_stream
+		self._compress_object_count = compress_object_count
+		self._max_container_content_size_bytes = max_container_content_size_bytes
+		self._compression_level = compression_level
+		self._recompress_streams = recompress_streams
+		self._jobs = jobs
+		self._serializer = PDFSerializer(pretty = self._pretty)
+		self._f = None
+		self._pool = None
+		self._pending = collections.deque()
+
+	@property
+	def use_object_streams(self):
+		return self._use_object_streams
+
+	@property
+	def use_xref_stream(self):
+		return self._use_xref_stream
+
+	@property
+	def serializer(self):
+		return self._serializer
+
+	@property
+	def outfile(self):
+		return self._f
+
+	def _write_header(self):
+		if (not self.use_object_streams) and (not self.use_xref_stream):
+			self._f.writeline("%PDF-1.4")
+		else:
+			self._f.writeline("%PDF-1.5")
+		self._f.write(b"%\xb5\xed\xae\xfb\n")
+
+	def _next_free_objid(self):
+		while (self._next_objid_candidate in self._used_objids):
+			self._next_objid_candidate += 1
+		objid = self._next_objid_candidate
+		self._used_objids.add(objid)
+		return objid
+
+	def _write_raw_stream(self, obj):
+		if hasattr(obj, "write_raw_stream"):
+			obj.write_raw_stream(self._f)
+		else:
+			self._f.write(obj.raw_stream)
+
+	def _write_uncompressed_object(self, obj):
+		offset = self._f.tell()
+		self._f.writeline("%d %d obj" % (obj.objid, obj.gennum))
+		self._f.write(self.serializer.serialize(obj.content, start_offset = self._f.tell()))
+		if obj.has_stream:
+			self._f.writeline("stream")
+			self._write_raw_stream(obj)
+			self._f.write(b"\n")
+			self._f.writeline("endstream")
+		self._f.writeline("endobj")
+		self._xref_table.add_entry(UncompressedXRefEntry(objid = obj.objid, gennum = obj.gennum, offset = offset))
+
+	@classmethod
+	def _contains_marker(cls, data_structure):
+		if isinstance(data_structure, MarkerObject):
+			return True
+		elif isinstance(data_structure, dict):
+			return any(cls._contains_marker(value) for value in data_structure.values())
+		elif isinstance(data_structure, list):
+			return any(cls._contains_marker(value) for value in data_structure)
+		else:
+			return False
+
+	def _compressible(self, obj):
+		# Objects containing markers need to be patched in the output file
+		# later on (e.g., signatures), so they cannot be compressed.
+		return self.use_object_streams and (not obj.has_stream) and (obj.gennum == 0) and (not self._contains_marker(obj.content))
+
+	def _recompressible(self, obj):
+		if (not self._recompress_streams) or (not obj.has_stream) or (not isinstance(obj.content, dict)):
+			return False
+		return (obj.content.get(PDFName("/Filter")) in (PDFName("/FlateDecode"), [ PDFName("/FlateDecode") ])) and (not self._contains_marker(obj.content))
+
+	def _recompress_stream(self, obj):
+		"""Runs in a worker thread. Returns a copy of the object with its
+		stream compressed at the configured level if that is smaller,
+		otherwise the object itself. Predictors are applied before the Flate
+		compression and are therefore retained as they are."""
+		raw_stream = obj.raw_stream
+		try:
+			data = zlib.decompress(raw_stream)
+		except zlib.error as e:
+			self._log.debug("Not recompressing stream of %s: %s", obj, e)
+			return obj
+		recompressed = zlib.compress(data, self._compression_level)
+		if len(recompressed) >= len(raw_stream):
+			return obj
+		content = dict(obj.content)
+		content[PDFName("/Length")] = len(recompressed)
+		recompressed_obj = PDFObject.create(objid = obj.objid, gennum = obj.gennum, content = content)
+		recompressed_obj.set_raw_stream(recompressed)
+		return recompressed_obj
+
+	def _write_completed(self, max_pending):
+		# Objects are written strictly in order; the first pending object
+		# is waited for when too many are pending
+		while (len(self._pending) > 0) and ((len(self._pending) > max_pending) or self._pending[0].done()):
+			self._write_uncompressed_object(self._pending.popleft().result())
+
+	def _enqueue(self, function, *args):
+		self._pending.append(self._pool.submit(function, *args))
+		self._write_completed(max_pending = 2 * self._jobs)
+
+	def _enqueue_uncompressed_object(self, obj):
+		if len(self._pending) == 0:
+			self._write_uncompressed_object(obj)
+		else:
+			self._pending.append(WorkerPool.completed(obj))
+			self._write_completed(max_pending = 2 * self._jobs)
+
+	def _flush_object_stream(self):
+		if self._objstrm is None:
+			return
+		self._log.debug("Writing object stream %d with %d objects, %d bytes uncompressed", self._objstrm.objid, self._objstrm.object_count, self._objstrm.size)
+		self._enqueue(self._objstrm.finalize, self._compression_level)
+		self._objstrm = None
+
+	def _compress_object(self, obj):
+		if self._objstrm is None:
+			self._objstrm = ObjectStreamBuilder(self._next_free_objid())
+		self._xref_table.add_entry(self._objstrm.add(obj, self.serializer))
+		if (self._objstrm.object_count >= self._compress_object_count) or (self._objstrm.size >= self._max_container_content_size_bytes):
+			self._flush_object_stream()
+
+	def _open_pool(self):
+		self._pool = WorkerPool(self._jobs)
+		self._pool.__enter__()
+		self._pending.clear()
+
+	def _close_pool(self):
+		if self._pool is not None:
+			self._pool.__exit__(None, None, None)
+			self._pool = None
+		self._pending.clear()
+
+	def begin(self, filename, used_objids):
+		"""Opens the output file. 'used_objids' must contain all object IDs
+		that will be written, so that object streams and the XRef stream can
+		be assigned IDs that do not collide. A file that is still open from
+		a previous write is closed."""
+		self.close()
+		self._f = FileWriterDecorator.wrap(open(filename, "w+b"))
+		self._open_pool()
+		self._xref_table = XRefTable()
+		self._used_objids = set(used_objids)
+		self._next_objid_candidate = 1
+		self._objstrm = None
+		self._previous_xref_offset = None
+		self._write_header()
+
+	def begin_update(self, filename, used_objids, previous_xref_offset, xref_size):
+		"""Opens an existing PDF file to append an incremental update to it.
+		Only the objects that are passed to write_object() afterwards are
+		appended; the XRef section that finish() writes references the
+		previous one at 'previous_xref_offset'. New object IDs are allocated
+		at or above 'xref_size', the /Size of the existing file."""
+		self.close()
+		self._f = FileWriterDecorator.wrap(open(filename, "r+b"))
+		self._f.seek(-1, os.SEEK_END)
+		last_char = self._f.read(1)
+		self._f.seek(0, os.SEEK_END)
+		if last_char not in b"\r\n":
+			self._f.write(b"\n")
+		self._open_pool()
+		self._xref_table = XRefTable()
+		self._used_objids = set(used_objids)
+		self._next_objid_candidate = xref_size
+		self._objstrm = None
+		self._previous_xref_offset = previous_xref_offset
+		self._xref_size = xref_size
+
+	def write_object(self, obj):
+		if self._compressible(obj):
+			self._compress_object(obj)
+		elif self._recompressible(obj):
+			self._enqueue(self._recompress_stream, obj)
+		else:
+			self._enqueue_uncompressed_object(obj)
+
+	@staticmethod
+	def _document_trailer(trailer):
+		# When the input had an XRef stream, its trailer also contains the
+		# XRef stream dictionary entries which must not be carried over.
+		return { key: value for (key, value) in trailer.items() if key in (PDFName("/Root"), PDFName("/Info"), PDFName("/ID"), PDFName("/Encrypt")) }
+
+	def _write_xref_table(self, trailer):
+		max_objid = max(objid for ((objid, gennum), entry) in self._xref_table)
+		self._xref_table.write_xref_table(self._f)
+		trailer = self._document_trailer(trailer)
+		trailer[PDFName("/Size")] = max_objid + 1
+		self._f.writeline("trailer")
+		self._f.write(self.serializer.serialize(trailer, start_offset = self._f.tell()))
+
+	def _write_xref_stream(self, trailer):
+		xref_object = self._xref_table.serialize_xref_object(self._document_trailer(trailer), self._next_free_objid())
+		self._xref_table.xref_offset = self._f.tell()
+		self._write_uncompressed_object(xref_object)
+
+	def _xref_subsections(self):
+		subsections = [ ]
+		for ((objid, gennum), entry) in sorted(self._xref_table):
+			if (len(subsections) > 0) and (subsections[-1][0] + len(subsections[-1][1]) == objid):
+				subsections[-1][1].append(entry)
+			else:
+				subsections.append((objid, [ entry ]))
+		return subsections
+
+	def _update_trailer(self, trailer):
+		trailer = self._document_trailer(trailer)
+		max_objid = max(objid for ((objid, gennum), entry) in self._xref_table)
+		trailer[PDFName("/Size")] = max(self._xref_size, max_objid + 1)
+		trailer[PDFName("/Prev")] = self._previous_xref_offset
+		return trailer
+
+	def _write_update_xref_table(self, trailer):
+		self._xref_table.xref_offset = self._f.tell()
+		self._f.writeline("xref")
+		for (first_objid, entries) in self._xref_subsections():
+			self._f.writeline("%d %d" % (first_objid, len(entries)))
+			for entry in entries:
+				self._f.writeline("%010d %05d n " % (entry.offset, entry.gennum))
+		self._f.writeline("trailer")
+		self._f.write(self.serializer.serialize(self._update_trailer(trailer), start_offset = self._f.tell()))
+
+	def _write_update_xref_stream(self, trailer):
+		# The XRef stream of an update only contains the objects of the update
+		# and also covers itself
+		xref_offset = self._f.tell()
+		xref_objid = self._next_free_objid()
+		self._xref_table.add_entry(UncompressedXRefEntry(objid = xref_objid, gennum = 0, offset = xref_offset))
+		subsections = self._xref_subsections()
+
+		fields = [ ]
+		for (first_objid, entries) in subsections:
+			for entry in entries:
+				if entry.compressed:
+					fields.append((2, entry.inside_objid, entry.index))
+				else:
+					fields.append((1, entry.offset, entry.gennum))
+		widths = [ 1 ] + [ max(1, (max(entry_fields[i] for entry_fields in fields).bit_length() + 7) // 8) for i in (1, 2) ]
+		data = bytearray()
+		for entry_fields in fields:
+			for (value, width) in zip(entry_fields, widths):
+				data += value.to_bytes(length = width, byteorder = "big")
+
+		content = self._update_trailer(trailer)
+		content.update({
+			PDFName("/Type"):	PDFName("/XRef"),
+			PDFName("/Index"):	[ value for (first_objid, entries) in subsections for value in (first_objid, len(entries)) ],
+			PDFName("/W"):		widths,
+		})
+		self._xref_table.xref_offset = xref_offset
+		xref_object = PDFObject.create(objid = xref_objid, gennum = 0, content = content, stream = EncodedObject.create(bytes(data)))
+		self._write_uncompressed_object(xref_object)
+
+	def finish(self, trailer):
+		self._flush_object_stream()
+		self._write_completed(max_pending = 0)
+		self._close_pool()
+		if self._previous_xref_offset is not None:
+			if self.use_xref_stream:
+				self._write_update_xref_stream(trailer)
+			else:
+				self._write_update_xref_table(trailer)
+		elif self.use_xref_stream:
+			self._write_xref_stream(trailer)
+		else:
+			self._write_xref_table(trailer)
+		self._f.writeline("startxref")
+		self._f.writeline(str(self._xref_table.xref_offset))
+		self._f.writeline("%%EOF")
+		self._f.flush()
+
+	def write(self, pdf, filename):
+		self.begin(filename, used_objids = (obj.objid for obj in pdf))
+		for obj in sorted(pdf):
+			self.write_object(obj)
+		self.finish(pdf.trailer)
+
+	def close(self):
+		self._close_pool()
+		if self._f is not None:
+			self._f.close()
+			self._f = None
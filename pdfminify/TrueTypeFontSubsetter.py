@@ -0,0 +1,113 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import io
+import logging
+
+try:
+	import fontTools.ttLib
+	import fontTools.subset
+	import fontTools.agl
+	# fontTools reports every single subsetting step on the info level
+	logging.getLogger("fontTools").setLevel(logging.WARNING)
+except ImportError:
+	fontTools = None
+
+class TrueTypeFontSubsetter(object):
+	"""Reduces an embedded TrueType font program (FontFile2) to the given
+	glyphs using fontTools. Glyph IDs are retained, so that neither the
+	character codes in the content streams nor a /CIDToGIDMap need to be
+	changed; the outlines of all other glyphs are removed."""
+	_log = logging.getLogger("llpdf.TrueTypeFontSubsetter")
+
+	def __init__(self, data):
+		self._font = fontTools.ttLib.TTFont(io.BytesIO(data), recalcTimestamp = False)
+
+	@classmethod
+	def available(cls):
+		return fontTools is not None
+
+	@property
+	def glyph_count(self):
+		return len(self._font.getGlyphOrder())
+
+	def glyphs_for_codes(self, codes, glyph_names):
+		"""Returns the glyph IDs that a simple TrueType font may use to show
+		the given single byte character codes. glyph_names maps character
+		codes to sets of glyph names according to the encoding of the PDF
+		font. Since PDF viewers differ in which cmap subtable they use, the
+		glyphs found by any of them are kept."""
+		glyph_ids = set()
+		reverse_glyph_map = self._font.getReverseGlyphMap()
+		cmap = self._font["cmap"].tables if ("cmap" in self._font) else [ ]
+		for code in codes:
+			names = glyph_names.get(code, set())
+			unicodes = set(fontTools.agl.toUnicode(name) for name in names)
+			unicodes.add(bytes([ code ]).decode("cp1252", errors = "ignore"))
+			found = False
+			for name in names:
+				if name in reverse_glyph_map:
+					glyph_ids.add(reverse_glyph_map[name])
+					found = True
+			for table in cmap:
+				if (table.platformID, table.platEncID) == (3, 0):
+					candidates = [ code, 0xf000 | code, 0xf100 | code, 0xf200 | code ]
+				elif (table.platformID, table.platEncID) == (1, 0):
+					candidates = [ code ]
+				elif table.isUnicode():
+					candidates = [ ord(char) for char in unicodes if len(char) == 1 ]
+				else:
+					continue
+				for candidate in candidates:
+					glyph_name = table.cmap.get(candidate)
+					if glyph_name in reverse_glyph_map:
+						glyph_ids.add(reverse_glyph_map[glyph_name])
+						found = True
+			if not found:
+				# Some viewers then use the character code as glyph ID
+				glyph_ids.add(code)
+		return glyph_ids
+
+	def subset(self, glyph_ids):
+		"""Returns the font program that contains only the given glyphs (and
+		glyph 0, .notdef) or None if no glyph can be removed."""
+		glyph_ids = set(glyph_id for glyph_id in glyph_ids if 0 <= glyph_id < self.glyph_count) | set([ 0 ])
+		if len(glyph_ids) == self.glyph_count:
+			return None
+		options = fontTools.subset.Options()
+		options.retain_gids = True
+		options.notdef_outline = True
+		options.glyph_names = True
+		options.legacy_cmap = True
+		options.symbol_cmap = True
+		options.name_IDs = [ "*" ]
+		options.name_languages = [ "*" ]
+		options.name_legacy = True
+		options.layout_features = [ "*" ]
+		options.ignore_missing_glyphs = True
+		options.recalc_timestamp = False
+		subsetter = fontTools.subset.Subsetter(options = options)
+		subsetter.populate(gids = sorted(glyph_ids))
+		subsetter.subset(self._font)
+		data = io.BytesIO()
+		self._font.save(data)
+		return data.getvalue()
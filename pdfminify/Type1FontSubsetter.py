@@ -0,0 +1,168 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import re
+from llpdf.font.PostScriptEnums import PostScriptStandardCharacterName
+
+class Type1FontSubsetter(object):
+	"""Removes all glyphs but the given ones from the CharStrings dictionary
+	of a Type1 font program as it is embedded in a PDF (i.e., consisting of
+	the clear text, the eexec encrypted and the trailer portion). Subroutines
+	are left untouched. Glyphs that are composed of other glyphs using the
+	seac operator keep their components."""
+	_EEXEC_KEY = 55665
+	_CHARSTRING_KEY = 4330
+	_CHARSTRINGS_RE = re.compile(rb"/CharStrings\s+(?P<count>\d+)\s+dict\s+dup\s+begin")
+	_GLYPH_RE = re.compile(rb"\s*/([^\x00\t\n\x0c\r ()<>\[\]{}/%]+)\s+(\d+)\s+\S+ ")
+	_GLYPH_END_RE = re.compile(rb"\s*(?:ND|\|-|noaccess\s+def|def)")
+	_DICT_END_RE = re.compile(rb"\s*end")
+	_LENIV_RE = re.compile(rb"/lenIV\s+(-?\d+)")
+	_ENCODING_ENTRY_RE = re.compile(rb"dup\s+(\d+)\s*/([^\x00\t\n\x0c\r ()<>\[\]{}/%]+)\s+put")
+	_HEX_DIGITS = set(b"0123456789abcdefABCDEF")
+	_STANDARD_ENCODING = { int(code): code.name for code in PostScriptStandardCharacterName }
+
+	def __init__(self, cleardata, cipherdata, trailerdata):
+		self._cleardata = cleardata
+		self._trailerdata = trailerdata
+		if all(char in self._HEX_DIGITS for char in cipherdata[ : 4]):
+			# Hexadecimal eexec section, is written back in binary
+			hexdigits = re.sub(rb"[^0-9a-fA-F]", b"", cipherdata)
+			cipherdata = bytes.fromhex(hexdigits[ : len(hexdigits) // 2 * 2].decode("ascii"))
+		self._plaindata = self._decrypt(cipherdata, self._EEXEC_KEY)
+		self._glyphs = None
+		self._parse()
+
+	@classmethod
+	def from_fontfile(cls, data, length1, length2):
+		return cls(data[ : length1], data[length1 : length1 + length2], data[length1 + length2 : ])
+
+	@staticmethod
+	def _decrypt(data, key):
+		result = bytearray(len(data))
+		for (index, cipher) in enumerate(data):
+			result[index] = cipher ^ (key >> 8)
+			key = (((cipher + key) * 52845) + 22719) & 0xffff
+		return bytes(result)
+
+	@staticmethod
+	def _encrypt(data, key):
+		result = bytearray(len(data))
+		for (index, plain) in enumerate(data):
+			cipher = plain ^ (key >> 8)
+			result[index] = cipher
+			key = (((cipher + key) * 52845) + 22719) & 0xffff
+		return bytes(result)
+
+	def _parse(self):
+		plaindata = self._plaindata
+		header = self._CHARSTRINGS_RE.search(plaindata)
+		if header is None:
+			raise ValueError("No /CharStrings dictionary found in Type1 font.")
+		self._count_span = header.span("count")
+		self._glyphs = [ ]
+		pos = header.end()
+		while True:
+			glyph = self._GLYPH_RE.match(plaindata, pos)
+			if glyph is None:
+				break
+			charstring_end = glyph.end() + int(glyph.group(2))
+			end = self._GLYPH_END_RE.match(plaindata, charstring_end)
+			if end is None:
+				raise ValueError("Cannot parse definition of glyph %s in Type1 font." % (glyph.group(1).decode("latin1")))
+			self._glyphs.append((glyph.group(1).decode("latin1"), pos, end.end(), plaindata[glyph.end() : charstring_end]))
+			pos = end.end()
+		if (len(self._glyphs) == 0) or (self._DICT_END_RE.match(plaindata, pos) is None):
+			raise ValueError("Cannot parse /CharStrings dictionary of Type1 font.")
+
+		leniv = self._LENIV_RE.search(plaindata)
+		self._leniv = 4 if (leniv is None) else int(leniv.group(1))
+
+	@property
+	def glyph_names(self):
+		return set(name for (name, start, end, charstring) in self._glyphs)
+
+	@property
+	def builtin_encoding(self):
+		"""Returns the encoding of the font program itself as a dictionary of
+		character code to glyph name."""
+		if b"/Encoding StandardEncoding" in self._cleardata:
+			return dict(self._STANDARD_ENCODING)
+		return { int(code): name.decode("latin1") for (code, name) in self._ENCODING_ENTRY_RE.findall(self._cleardata) }
+
+	def _seac_components(self, charstring):
+		if self._leniv >= 0:
+			charstring = self._decrypt(charstring, self._CHARSTRING_KEY)[self._leniv : ]
+		stack = [ ]
+		pos = 0
+		while pos < len(charstring):
+			value = charstring[pos]
+			if value >= 247:
+				if value == 255:
+					stack.append(int.from_bytes(charstring[pos + 1 : pos + 5], byteorder = "big", signed = True))
+					pos += 5
+				elif value >= 251:
+					stack.append(-((value - 251) * 256) - charstring[pos + 1] - 108)
+					pos += 2
+				else:
+					stack.append(((value - 247) * 256) + charstring[pos + 1] + 108)
+					pos += 2
+			elif value >= 32:
+				stack.append(value - 139)
+				pos += 1
+			elif value == 12:
+				if (charstring[pos + 1 : pos + 2] == b"\x06") and (len(stack) >= 5):
+					# seac: asb adx ady bchar achar
+					return [ self._STANDARD_ENCODING.get(stack[-2]), self._STANDARD_ENCODING.get(stack[-1]) ]
+				stack = [ ]
+				pos += 2
+			else:
+				stack = [ ]
+				pos += 1
+		return [ ]
+
+	def subset(self, glyph_names):
+		"""Returns the (cleardata, cipherdata, trailerdata) tuple of the font
+		program that contains only the given glyphs (and .notdef) or None if
+		no glyph can be removed."""
+		charstrings = { name: charstring for (name, start, end, charstring) in self._glyphs }
+		keep = set(name for name in glyph_names if name in charstrings) | set([ ".notdef" ])
+		unresolved = list(keep)
+		while len(unresolved) > 0:
+			name = unresolved.pop()
+			for component in self._seac_components(charstrings[name]):
+				if (component in charstrings) and (component not in keep):
+					keep.add(component)
+					unresolved.append(component)
+		if len(keep & set(charstrings)) == len(charstrings):
+			return None
+
+		plaindata = self._plaindata
+		# The dictionary size is adjusted as well, since some parsers expect it
+		# to match the number of glyphs exactly
+		new_plaindata = bytearray(plaindata[ : self._count_span[0]])
+		new_plaindata += str(len(keep & set(charstrings))).encode("ascii")
+		new_plaindata += plaindata[self._count_span[1] : self._glyphs[0][1]]
+		for (name, start, end, charstring) in self._glyphs:
+			if name in keep:
+				new_plaindata += plaindata[start : end]
+		new_plaindata += plaindata[self._glyphs[-1][2] : ]
+		return (self._cleardata, self._encrypt(bytes(new_plaindata), self._EEXEC_KEY), self._trailerdata)
@@ -0,0 +1,74 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import concurrent.futures
+
+class WorkerPool(object):
+	"""Applies a function to independent work items using a thread pool.
+	Results are always returned in the order of the input items, regardless
+	of the number of threads, so that callers can merge them back
+	deterministically. With a single job, no threads are spawned at all."""
+
+	def __init__(self, jobs = 1):
+		assert(jobs >= 1)
+		self._jobs = jobs
+		self._executor = None
+
+	@property
+	def jobs(self):
+		return self._jobs
+
+	def __enter__(self):
+		if self._jobs > 1:
+			self._executor = concurrent.futures.ThreadPoolExecutor(max_workers = self._jobs)
+		return self
+
+	def __exit__(self, *args):
+		if self._executor is not None:
+			self._executor.shutdown()
+			self._executor = None
+
+	@staticmethod
+	def completed(result):
+		"""Returns a future that already holds the given result."""
+		future = concurrent.futures.Future()
+		future.set_result(result)
+		return future
+
+	def submit(self, function, *args):
+		"""Schedules a single call and returns a future for its result.
+		Without threads, the call is made right away."""
+		if self._executor is None:
+			future = concurrent.futures.Future()
+			try:
+				future.set_result(function(*args))
+			except Exception as e:
+				future.set_exception(e)
+			return future
+		else:
+			return self._executor.submit(function, *args)
+
+	def map(self, function, items):
+		if self._executor is None:
+			return [ function(item) for item in items ]
+		else:
+			return list(self._executor.map(function, items))
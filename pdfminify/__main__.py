@@ -24,50 +24,60 @@ import sys
 import os
 import logging
 import argparse
+import signal
 import llpdf
 import llpdf.tests
 import pdfminify
+import pdfminify.tests
 from pdfminify.FriendlyArgumentParser import FriendlyArgumentParser
+from pdfminify.PDFMinifier import PDFMinifier
+from pdfminify.BatchMinifier import BatchMinifier
+from pdfminify.MinifyServer import MinifyServer, MinifyRequestException
+from pdfminify.ImageBackend import ImageBackend
+from pdfminify.PillowImageReformatter import PillowImageReformatter
 from pdfminify.FilesizeFormatter import FilesizeFormatter
-
-def main():
-	python_version = sys.version_info[:3]
-	min_python_version = (3, 5, 0)
-	if python_version < min_python_version:
-		print("Error: You need at least Python %s to run pdfminify, but you're using Python %s." % ( ".".join(str(x) for x in min_python_version), ".".join(str(x) for x in python_version)), file = sys.stderr)
-		sys.exit(1)
-
-	if (len(sys.argv) >= 2) and (sys.argv[1] == "--test"):
-		llpdf.tests.run(terminate_after = True)
-
-	def _offset(text):
-		text = text.split(",")
-		if len(text) != 2:
-			raise argparse.ArgumentTypeError("expected two comma-separated values, but %d given." % (len(text)))
-		return [ float(value) for value in text ]
-
-	def _cropbox(text):
-		text = text.split(",")
-		if len(text) != 4:
-			raise argparse.ArgumentTypeError("expected four comma-separated values, but %d given." % (len(text)))
-		return [ float(value) for value in text ]
-
-	def _intrange(minvalue, maxvalue):
-		def convert(text):
-			value = int(text)
-			if (minvalue is not None) and (value < minvalue):
-				raise argparse.ArgumentTypeError("value must be at least %d." % (minvalue))
-			if (maxvalue is not None) and (value > maxvalue):
-				raise argparse.ArgumentTypeError("value may be at most %d." % (maxvalue))
-			return value
-		return convert
-
+from pdfminify.PhaseProfiler import PhaseProfiler
+from pdfminify.SavingsEstimator import SavingsEstimator
+
+def _offset(text):
+	text = text.split(",")
+	if len(text) != 2:
+		raise argparse.ArgumentTypeError("expected two comma-separated values, but %d given." % (len(text)))
+	return [ float(value) for value in text ]
+
+def _cropbox(text):
+	text = text.split(",")
+	if len(text) != 4:
+		raise argparse.ArgumentTypeError("expected four comma-separated values, but %d given." % (len(text)))
+	return [ float(value) for value in text ]
+
+def _intrange(minvalue, maxvalue):
+	def convert(text):
+		value = int(text)
+		if (minvalue is not None) and (value < minvalue):
+			raise argparse.ArgumentTypeError("value must be at least %d." % (minvalue))
+		if (maxvalue is not None) and (value > maxvalue):
+			raise argparse.ArgumentTypeError("value may be at most %d." % (maxvalue))
+		return value
+	return convert
+
+def _image_backend(text):
+	if (text == ImageBackend.Pillow.value) and (not PillowImageReformatter.available()):
+		raise argparse.ArgumentTypeError("the %s backend requires the Pillow Python package, which is not installed." % (text))
+	return text
+
+def create_parser():
 	epilog = "pdfminify version %s; llpdf version: %s" % (pdfminify.VERSION, llpdf.VERSION)
 
 	parser = FriendlyArgumentParser(prog = "pdfminify", description = "Minifies PDF files, can crop them, convert them to PDF/A-1b and sign them cryptographically.", epilog = epilog)
 	parser.add_argument("-d", "--target-dpi", metavar = "dpi", type = int, default = 150, help = "Default resoulution to which images will be resampled at. Defaults to %(default)s dots per inch (dpi).")
 	parser.add_argument("-j", "--jpeg-images", action = "store_true", help = "Convert images to JPEG format. This means that lossy compression is used that however often yields a much higher compression ratio.")
 	parser.add_argument("--jpeg-quality", metavar = "percent", type = _intrange(0, 100), default = 85, help = "When converting images to JPEG format, the parameter gives the compression quality. It is an integer from 0-100 (higher is better, but creates also larger output files).")
+	parser.add_argument("--image-backend", type = _image_backend, choices = ImageBackend.names(), default = ImageBackend.default().value, help = "Backend that is used to resample and re-encode images. The pillow backend processes images in-process and is much faster, but requires the Pillow Python package; images that it cannot handle are passed on to ImageMagick. The imagemagick backend calls ImageMagick's convert and identify for every image. Can be any of %(choices)s, defaults to %(default)s.")
+	parser.add_argument("--jobs", metavar = "count", type = _intrange(1, None), default = 1, help = "Number of threads that are used to decode, resample and re-encode the images of a document and to compress streams while writing the output in parallel. The output is identical regardless of this setting. Defaults to %(default)d.")
+	parser.add_argument("--image-cache", metavar = "path", type = str, help = "Directory of a persistent cache for processed images. Images that have already been resampled or flattened with identical settings in a previous run are then taken from the cache instead of being processed again. By default, no cache is used.")
+	parser.add_argument("--image-cache-size", metavar = "size", type = FilesizeFormatter().decode, default = "1G", help = "Maximum size of the image cache directory. When it is exceeded, the least recently used entries are removed. Suffixes k, M, G and T are accepted. Defaults to %(default)s.")
+	parser.add_argument("--max-size", metavar = "size", type = FilesizeFormatter().decode, help = "Size budget for the output file. When the output file is larger, the images are re-encoded as JPEG with successively lower quality and resolution until the output fits, without processing the rest of the document again. Suffixes k, M, G and T are accepted, e.g., \"10M\". By default, there is no size limit.")
 	parser.add_argument("--no-downscaling", action = "store_true", help = "Do not apply downscaling filter on the PDF, take all images as they are.")
 
 	parser.add_argument("--cropbox", metavar = "x,y,w,h", type = _cropbox, help = "Crop pages by additionally adding a /CropBox to all pages of the PDF file. Pages will be cropped at offset (x, y) to a width (w, h). The unit in which offset, width and height are given can be specified using the --unit parameter.")
@@ -77,14 +87,23 @@ def main():
 	parser.add_argument("--remove-alpha", action = "store_true", help = "Entirely remove the alpha channel (i.e., transparency) of all images. The color which with transparent areas are replaced with can be specified using the --background-color command line option.")
 	parser.add_argument("--background-color", metavar = "color", type = str, default = "white", help = "When removing alpha channels, specifies the color that should be used as background. Defaults to %(default)s. Hexadecimal values can be specified as well in the format '#rrggbb'.")
 
+	parser.add_argument("--near-duplicate-images", action = "store_true", help = "Additionally find images that are not byte-identical, but look the same (e.g., the same photo encoded at a different resolution or with different compression settings) and replace them all by the one with the highest resolution. Images are compared by a perceptual hash of their pixel data, which requires the Pillow Python package.")
+	parser.add_argument("--near-duplicate-distance", metavar = "bits", type = _intrange(0, 16), default = 2, help = "Maximum number of bits in which the 64 bit perceptual hashes of two images may differ so that they are considered near-duplicates by --near-duplicate-images. Lower values are stricter; 0 only merges images whose hashes are identical. Ranges from 0 to 16, defaults to %(default)d.")
+
+	parser.add_argument("--subset-fonts", action = "store_true", help = "Reduce embedded Type1 and TrueType fonts to the glyphs that are actually shown in the document, including the font of a digital signature. Fonts that may be used to fill out form fields are left alone. Subsetting TrueType fonts requires the fontTools Python package.")
+	parser.add_argument("--minify-content", action = "store_true", help = "Rewrite the content streams of pages, forms and patterns in their shortest form: remove superfluous whitespace and digits, drop graphics state changes that have no effect and round coordinates to --content-precision. Mostly useful for vector graphics produced by, e.g., Cairo or LaTeX.")
+	parser.add_argument("--content-precision", metavar = "digits", type = _intrange(0, 6), default = 3, help = "Number of decimal places to which coordinates are rounded by --minify-content, relative to the coordinate system in which a content stream starts (i.e., in native PDF units for pages). Colors always keep at least three decimal places. Ranges from 0 to 6, defaults to %(default)d.")
 	parser.add_argument("--strip-metadata", action = "store_true", help = "Strip metadata inside PDF objects that is not strictly required, such as /PTEX.* entries inside object content.")
 
 	parser.add_argument("--saveimgdir", metavar = "path", type = str, help = "When specified, save all handled images as individual files into the specified directory. Useful for image extraction from a PDF as well as debugging.")
 	parser.add_argument("--raw-output", action = "store_true", help = "When saving images externally, save them in exactly the format in which they're also present inside the PDF. Note that this will produce raw image files in some cases which won't have any header (but just contain pixel data). Less useful for image extraction, but can make sense for debugging.")
 	parser.add_argument("--pretty-pdf", action = "store_true", help = "Write pretty PDF files, i.e., format all dictionaries so they're well-readable regarding indentation. Increases required file size a tiny bit and increases generation time of the PDF a little, but produces easily debuggable PDFs.")
 
+	parser.add_argument("--lazy-read", action = "store_true", help = "Memory-map the input file and parse objects only when they are needed, using the XRef table of the input file. Stream data is then only read from the input file when it is actually accessed, which greatly reduces the memory that is required for large input files. Falls back to regular reading if the XRef table of the input file is broken.")
 	parser.add_argument("--no-xref-stream", action = "store_true", help = "Do not write the XRef table as a XRef stream, but instead write a classical PDF XRef table and trailer. This will increase the file size a bit, but might improve compatibility with old PDF readers (XRef streams are supported only starting with PDF 1.5). XRef-streams are a prerequisite to object stream compression, so if XRef-streams are disabled, so will also be object streams (e.g, --no-object-streams is implied).")
 	parser.add_argument("--no-object-streams", action = "store_true", help = "Do not compress objects into object-streams. Object stream compression is introduced with PDF 1.5 and means that multiple simple objects (without any stream data) are concatenated together and compressed together into one large stream object.")
+	parser.add_argument("--compression-level", metavar = "level", type = _intrange(1, 9), default = 6, help = "Level of the Flate compression that is used for object streams and, with --recompress-streams, for all other compressed streams. Ranges from 1 (fastest, e.g., for interactive use) to 9 (smallest output, e.g., for archival). For a given level, the output is always the same. Defaults to %(default)d.")
+	parser.add_argument("--recompress-streams", action = "store_true", help = "Decompress all Flate-compressed streams of the document while writing it and compress them again using --compression-level, keeping whichever is smaller. Mostly useful together with a high compression level.")
 	parser.add_argument("--pdfa-1b", action = "store_true", help = "Try to create a PDF/A-1b compliant PDF document. Implies --no-xref-stream, --no-object-streams, --remove-alpha, removes transpacency groups and adds a PDF/A entry into XMP metadata.")
 	parser.add_argument("--color-profile", metavar = "iccfile", help = "When creating a PDF/A-1b PDF, gives the Internal Color Consortium (ICC) color profile that should be embedded into the PDF as part of the output intent. When omitted, it defaults to the sRGB IEC61966 v2 \"black scaled\" profile which is included within pdfminify.")
 
@@ -96,86 +115,141 @@ def main():
 	parser.add_argument("--sign-contact-info", metavar = "infotext", help = "A contact information field under which the signer can be reached. Usually a phone number of email address.")
 	parser.add_argument("--sign-reason", metavar = "reason", help = "The reason why the document was signed.")
 	parser.add_argument("--sign-page", metavar = "pageno", type = int, default = 1, help = "Page number on which the signature should be displayed. Defaults to %(default)d.")
-	parser.add_argument("--sign-font", metavar = "pfbfile", type = str, help = "To be able to include metadata text in the signature form, a T1 font must be included into the PDF. This gives the filename of the font that is to be used for that purpose. Must be in PFB (PostScript Font Binary) file format and will be included in the result PDF in full (i.e., not reduced to the glyphs that are actually needed). Defaults to the Bitstream Charter Serif font that is included within pdfminify.")
+	parser.add_argument("--sign-font", metavar = "pfbfile", type = str, help = "To be able to include metadata text in the signature form, a T1 font must be included into the PDF. This gives the filename of the font that is to be used for that purpose. Must be in PFB (PostScript Font Binary) file format and will be included in the result PDF in full (i.e., not reduced to the glyphs that are actually needed) unless --subset-fonts is given. Defaults to the Bitstream Charter Serif font that is included within pdfminify.")
 	parser.add_argument("--sign-pos", metavar = "x,y", type = _offset,  help = "Determines where the signature will be placed on the page. Units are determined by the --unit variable and the position is relative to lower left corner.")
 
+	parser.add_argument("--sign-only", action = "store_true", help = "Do not minify the document, but only sign it. The signature is appended to the unmodified input file as an incremental update instead of rewriting the whole document, so that signing is fast and requires little memory even for huge documents. Requires --sign-cert and --sign-key; all other filters are not run.")
 	parser.add_argument("--embed-payload", metavar = "path", type = str, help = "Embed an opaque file as a payload into the PDF as a valid PDF object. This is useful only if you want to place an easter egg inside your PDF file.")
 	parser.add_argument("--no-pdf-tagging", action = "store_true", help = "Omit tagging the PDF file with a reference to pdfminify and the used version.")
 	parser.add_argument("--decompress-data", action = "store_true", help = "Decompress all FlateDecode compressed data in the file. Useful only for debugging.")
 	parser.add_argument("--analyze", action = "store_true", help = "Perform an analysis of the read PDF file and dump out useful information about it.")
+	parser.add_argument("--dry-run", action = "store_true", help = "Do not minify anything, but quickly estimate how much every given input file would shrink. The input is read lazily and only the page tree and the dictionaries of images are parsed; images are assumed to cover the whole page they are used on (see --dry-run-exact-dpi). Image data is not processed except for the largest few images, which are resampled for real to calibrate the estimate. All given files are input files, no output files are written.")
+	parser.add_argument("--dry-run-json", metavar = "filename", type = str, help = "Write the estimates of a dry run, including details about every image, in machine-readable JSON format into the given file. Implies --dry-run.")
+	parser.add_argument("--dry-run-exact-dpi", action = "store_true", help = "During a dry run, determine the effective resolution of images by interpreting the page content streams like minification does. This makes the estimate more accurate for images that do not cover the whole page, but the dry run considerably slower. Implies --dry-run.")
 	parser.add_argument("--dump-xref-table", action = "store_true", help = "Dump out the XRef table that was read from the input PDF file. Mainly useful for debugging.")
 	parser.add_argument("--no-filters", action = "store_true", help = "Do not apply any filters on the source PDF whatsoever, just read it in and write it back out. This is useful to reformat a PDF and/or debug the PDF reader/writer facilities without introducing other sources of malformed PDF generation.")
+	parser.add_argument("--profile", action = "store_true", help = "Measure wall time, CPU time, peak RSS and the number of objects and images for every phase of the minification (reading, each filter, writing and each fixup) and print the results as a table. The peak RSS is that of the whole process so far (in batch mode including previously minified documents); its increase during every phase is shown as well.")
+	parser.add_argument("--profile-json", metavar = "filename", type = str, help = "Measure every phase of the minification like --profile does, but write the results in machine-readable JSON format into the given file. Can be combined with --profile.")
+	parser.add_argument("--profile-memory", action = "store_true", help = "With --profile or --profile-json, additionally trace all memory allocations using tracemalloc to determine the peak memory allocated by Python objects in every phase. This slows down minification considerably, so the measured times are inflated.")
 	parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Show verbose messages during conversation. Can be specified multiple times to increase log level.")
-	parser.add_argument("infile", metavar = "pdf_in", type = str, help = "Input PDF file.")
-	parser.add_argument("outfile", metavar = "pdf_out", type = str, help = "Output PDF file.")
+	parser.add_argument("-o", "--output-dir", metavar = "path", type = str, help = "Batch mode: minify all given PDF files and write the results into this directory, keeping their base file names. When omitted, exactly one input and one output PDF file must be given.")
+	parser.add_argument("--manifest", metavar = "filename", type = str, help = "Batch mode: read the files to minify from this manifest file. Each line contains one input PDF file name, optionally followed by a tab character and the output file name. Input files without an output file name are written into the directory given by --output-dir.")
+	parser.add_argument("--processes", metavar = "count", type = _intrange(1, None), help = "In batch mode, the number of worker processes that the documents are distributed across. Defaults to the number of available CPU cores.")
+	parser.add_argument("files", metavar = "pdf", type = str, nargs = "*", help = "Input PDF file followed by output PDF file. In batch mode or for a dry run, all given files are input PDF files.")
+	return parser
+
+def serve(argv):
+	parser = FriendlyArgumentParser(prog = "pdfminify serve", description = "Run pdfminify as a long-running service that accepts minification jobs over HTTP on a loopback TCP port or a UNIX socket. All arguments that are not recognized as server options are used as default pdfminify options for every job.")
+	parser.add_argument("-l", "--listen", metavar = "address", type = str, default = "127.0.0.1:8417", help = "Address to listen on. Either host:port or unix:/path/to/socket. Defaults to %(default)s.")
+	parser.add_argument("-w", "--workers", metavar = "count", type = _intrange(1, None), default = BatchMinifier.available_cores(), help = "Number of worker processes that minify documents in parallel. Defaults to the number of available CPU cores, i.e., %(default)d.")
+	parser.add_argument("-q", "--queue-limit", metavar = "count", type = _intrange(0, None), help = "Number of jobs that may wait for a free worker. When all workers are busy and the queue is full, requests are rejected with HTTP status 503. Defaults to twice the number of workers.")
+	parser.add_argument("--max-request-size", metavar = "size", type = FilesizeFormatter().decode, default = "1G", help = "Maximum size of a PDF file that is accepted in a request body. Defaults to %(default)s.")
+	parser.add_argument("--file-root", metavar = "path", type = str, help = "Allow clients to name input and output files on the server instead of transferring the PDF in the request and response body. File names are relative to this directory and cannot point outside of it. By default, clients cannot access files on the server.")
+	parser.add_argument("--allow-remote", action = "store_true", help = "Allow listening on a TCP address that is not a loopback address. The server does not authenticate clients in any way, so this makes it usable by anyone who can reach that address.")
+	(server_args, default_options) = parser.parse_known_args(argv)
+
+	minify_parser = create_parser()
+	default_args = minify_parser.parse_args(default_options + [ "input.pdf", "output.pdf" ])
+	llpdf.configure_logging(default_args.verbose)
+
+	try:
+		server = MinifyServer(minify_parser, default_options = default_options, workers = server_args.workers, queue_limit = server_args.queue_limit, max_request_size = server_args.max_request_size, file_root = server_args.file_root, allow_remote = server_args.allow_remote)
+	except MinifyRequestException as e:
+		print("Error: %s" % (str(e)), file = sys.stderr)
+		sys.exit(1)
+	def _terminate(signum, frame):
+		raise KeyboardInterrupt()
+	signal.signal(signal.SIGTERM, _terminate)
+	try:
+		server.serve_forever(server_args.listen)
+	except KeyboardInterrupt:
+		pass
+	except ValueError as e:
+		print("Error: %s" % (str(e)), file = sys.stderr)
+		sys.exit(1)
+
+def main():
+	python_version = sys.version_info[:3]
+	min_python_version = (3, 5, 0)
+	if python_version < min_python_version:
+		print("Error: You need at least Python %s to run pdfminify, but you're using Python %s." % ( ".".join(str(x) for x in min_python_version), ".".join(str(x) for x in python_version)), file = sys.stderr)
+		sys.exit(1)
+
+	if (len(sys.argv) >= 2) and (sys.argv[1] == "--test"):
+		success = llpdf.tests.run()
+		success = pdfminify.tests.run() and success
+		sys.exit(0 if success else 1)
+
+	if (len(sys.argv) >= 2) and (sys.argv[1] == "serve"):
+		serve(sys.argv[2:])
+		return
+
+	parser = create_parser()
 	args = parser.parse_args(sys.argv[1:])
 
+	if (args.dry_run_json is not None) or args.dry_run_exact_dpi:
+		args.dry_run = True
+	if args.dry_run:
+		if (len(args.files) == 0) and (args.manifest is None):
+			parser.error("expected at least one input PDF file for a dry run.")
+		llpdf.configure_logging(args.verbose)
+		batch = BatchMinifier(args, processes = args.processes)
+		for infile in args.files:
+			batch.add_job(infile, None)
+		if args.manifest is not None:
+			batch.add_manifest_jobs(args.manifest, dry_run = True)
+		results = batch.run()
+		if args.dry_run_json is not None:
+			SavingsEstimator.write_json(args.dry_run_json, results)
+		if any(result.error is not None for result in results):
+			sys.exit(1)
+		return
+
+	batch_mode = (args.output_dir is not None) or (args.manifest is not None)
+	if (not batch_mode) and (len(args.files) != 2):
+		parser.error("expected exactly one input and one output PDF file, but %d files given." % (len(args.files)))
+	if batch_mode and (len(args.files) > 0) and (args.output_dir is None):
+		parser.error("input files given on the command line require --output-dir in batch mode.")
+
 	if (args.sign_cert is None) ^ (args.sign_key is None):
 		print("Specifying only a key or only a certificate does not make sense; you need to specify either both or none.", file = sys.stderr)
 		sys.exit(1)
+	if args.sign_only and (args.sign_cert is None):
+		print("Signing only requires a certificate and key to sign with.", file = sys.stderr)
+		sys.exit(1)
 
 	llpdf.configure_logging(args.verbose)
 	llpdf.Measurements.set_default_unit(args.unit)
 
-	pdf_filter_classes = [ filter_class for filter_class in [
-		llpdf.filters.AnalyzeFilter if args.analyze else None,
-		llpdf.filters.RemoveDuplicateImageOptimization if (not args.no_filters) else None,
-		llpdf.filters.RemoveMetadataFilter if (args.strip_metadata and (not args.no_filters)) else None,
-		llpdf.filters.FlattenImageOptimization if ((args.remove_alpha or args.pdfa_1b) and (not args.no_filters)) else None,
-		llpdf.filters.DownscaleImageOptimization if ((args.saveimgdir is not None) or ((not args.no_downscaling) and (not args.no_filters))) else None,
-		llpdf.filters.AddCropBoxFilter if (args.cropbox and (not args.no_filters)) else None,
-		llpdf.filters.ExplicitLengthFilter if (not args.no_filters) else None,
-		llpdf.filters.DeleteOrphanedObjectsFilter if (not args.no_filters) else None,
-		llpdf.filters.TagFilter if (not (args.no_filters or args.no_pdf_tagging)) else None,
-		llpdf.filters.EmbedPayloadFilter if (args.embed_payload is not None) else None,
-		llpdf.filters.PDFAFilter if (args.pdfa_1b and (not args.no_filters)) else None,
-		llpdf.filters.DecompressFilter if args.decompress_data else None,
-		llpdf.filters.SignFilter if args.sign_cert else None,
-	] if filter_class is not None ]
-	log = logging.getLogger("llpdf")
-
-	fsf = FilesizeFormatter()
-	old_size = os.stat(args.infile).st_size
-	pdf = llpdf.PDFReader().read(args.infile)
-
-	if args.dump_xref_table:
-		pdf.xref_table.dump()
-
-	pdf_fixup_classes = [ ]
-	for (filter_no, pdf_filter_class) in enumerate(pdf_filter_classes, 1):
-		log.debug("Running filter %d/%d: %s", filter_no, len(pdf_filter_classes), pdf_filter_class.__name__)
-		pdf_filter = pdf_filter_class(pdf, args)
-		pdf_filter.run()
+	if batch_mode:
+		batch = BatchMinifier(args, processes = args.processes)
+		if len(args.files) > 0:
+			batch.add_output_dir_jobs(args.files, args.output_dir)
+		try:
+			if args.manifest is not None:
+				batch.add_manifest_jobs(args.manifest, args.output_dir)
+			batch.check_jobs()
+		except ValueError as e:
+			print("Error: %s" % (str(e)), file = sys.stderr)
+			sys.exit(1)
+		if args.output_dir is not None:
+			os.makedirs(args.output_dir, exist_ok = True)
+		results = batch.run()
+		if args.profile_json is not None:
+			PhaseProfiler.write_json(args.profile_json, results)
+		if any(result.error is not None for result in results):
+			sys.exit(1)
+	else:
+		(infile, outfile) = args.files
+		minifier = PDFMinifier(args)
+		result = minifier.minify(infile, outfile)
 		if args.verbose:
-			log.debug("%s saved %s." % (pdf_filter_class.__name__, fsf(pdf_filter.bytes_saved)))
-		if getattr(pdf_filter, "fixup", None) is not None:
-			pdf_fixup_classes.append(pdf_filter)
-
-	use_xref_stream = not (args.no_xref_stream or args.pdfa_1b)
-	use_object_streams = not (args.no_object_streams or args.pdfa_1b)
-	writer = llpdf.PDFWriter(pretty = args.pretty_pdf, use_xref_stream = use_xref_stream, use_object_streams = use_object_streams)
-	writer.write(pdf, args.outfile)
-
-	if len(pdf_fixup_classes) > 0:
-		for (filter_no, pdf_filter) in enumerate(pdf_fixup_classes, 1):
-			log.debug("Running fixup %d/%d: %s", filter_no, len(pdf_fixup_classes), pdf_filter.__class__.__name__)
-			pdf_filter.fixup(writer)
-
-	new_size = os.stat(args.outfile).st_size
-	if args.verbose:
-		percent = 100 * new_size / old_size
-		saved = old_size - new_size
-
-		details = [ ]
-		details.append("%.0f%% of original" % (percent))
-		if saved > 0:
-			details.append("%s saved" % (fsf(saved)))
-		else:
-			details.append("%s growth" % (fsf(-saved)))
-
-		if saved > 0:
-			details.append("ratio %.1f : 1" % (old_size / new_size))
-		else:
-			details.append("ratio 1 : %.1f" % (new_size / old_size))
-
-		log.info("File size %s -> %s (%s)" % (fsf(old_size), fsf(new_size), ", ".join(details)))
+			log = logging.getLogger("llpdf")
+			log.info("File size %s" % (minifier.format_size_change(result.old_size, result.new_size)))
+		if args.profile:
+			print(PhaseProfiler.format_table(result.profile))
+		if args.profile_json is not None:
+			PhaseProfiler.write_json(args.profile_json, [ result ])
+
+if __name__ == "__main__":
+	main()
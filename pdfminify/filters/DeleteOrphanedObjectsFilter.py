@@ -0,0 +1,35 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import llpdf.filters
+from .VisitorFilter import VisitorFilter
+
+class DeleteOrphanedObjectsFilter(VisitorFilter, llpdf.filters.DeleteOrphanedObjectsFilter):
+	needs_reference_graph = True
+
+	def finish(self):
+		unused_objects = self._reference_graph.unreferenced(self._pdf.trailer)
+		self._log.debug("%d objects total, %d referenced (i.e., %d objects unused): %s", len(self._reference_graph), len(self._reference_graph) - len(unused_objects), len(unused_objects), unused_objects)
+		for obj_xref in unused_objects:
+			self._optimized(len(self._pdf.lookup(obj_xref)), 0)
+			self._pdf.delete_object(obj_xref.objid, obj_xref.gennum)
+			self._reference_graph.remove(obj_xref)
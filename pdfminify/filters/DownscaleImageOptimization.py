@@ -0,0 +1,117 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import collections
+import llpdf.filters
+from llpdf.Exceptions import UnsupportedImageException
+from llpdf.interpreter.GraphicsInterpreter import GraphicsInterpreter
+from pdfminify.ImageBackend import ImageBackend
+from pdfminify.WorkerPool import WorkerPool
+from pdfminify.ImageCache import ImageCache
+
+class DownscaleImageOptimization(llpdf.filters.DownscaleImageOptimization):
+	def _rescale_image(self, image, scale_factor):
+		lossless = not self._args.jpeg_images
+		self._log.debug("Resampling %s (%d bytes) to lossless = %s with scale factor %.3f using %s backend", image, image.total_size, lossless, scale_factor, self._args.image_backend)
+		reformatter = ImageBackend(self._args.image_backend).create_reformatter(lossless = lossless, scale_factor = scale_factor, jpeg_quality = self._args.jpeg_quality, force_one_bit_alpha = self._args.one_bit_alpha)
+		return reformatter.reformat(image)
+
+	def _cached_rescale_image(self, image, scale_factor):
+		if self._image_cache is None:
+			return self._rescale_image(image, scale_factor)
+		return self._image_cache.cached("rescale", image, lambda image: self._rescale_image(image, scale_factor), backend = self._args.image_backend, lossless = not self._args.jpeg_images, scale_factor = scale_factor, jpeg_quality = self._args.jpeg_quality, one_bit_alpha = self._args.one_bit_alpha)
+
+	def _collect_draw_commands(self):
+		self._draw_cmds = collections.defaultdict(list)
+		for (page_obj, page_content) in self._pdf.parsed_pages:
+			interpreter = GraphicsInterpreter(pdf_lookup = self._pdf, page_obj = page_obj)
+			interpreter.set_draw_callback(self._draw_callback)
+			interpreter.run(page_content)
+
+	def _process_image(self, work_item):
+		"""Runs in a worker thread. Must not modify the PDF, but only return
+		the original image, its current resolution and the resampled image
+		(or None if the image is left untouched)."""
+		(img_xref, img_draw_cmds) = work_item
+		try:
+			image = self._pdf.get_image(img_xref)
+		except UnsupportedImageException as e:
+			self._log.warning("Ignoring unsupported image %s: %s", img_xref, e)
+			return None
+		self._save_image(image, img_xref, "original")
+
+		if self._args.no_downscaling:
+			# We arrive here if we're just trying to save exported images.
+			return None
+
+		current_dpi = min(draw_cmd.native_extents.dpi(image.width, image.height) for draw_cmd in img_draw_cmds)
+		resampled_image = self._resample_image(img_xref, image, current_dpi)
+		return (image, current_dpi, resampled_image)
+
+	def _resample_image(self, img_xref, image, current_dpi):
+		scale_factor = min(self._args.target_dpi / current_dpi, 1)
+		self._log.debug("Estimated image %s to have minimum resulution of %d dpi: scale factor = %.3f", img_xref, current_dpi, scale_factor)
+
+		resampled_image = self._cached_rescale_image(image, scale_factor)
+		self._save_image(resampled_image, img_xref, "resampled")
+		self._log.debug("Resulting image after resampling: %s (%d bytes, i.e., %+d bytes)", resampled_image, resampled_image.total_size, resampled_image.total_size - image.total_size)
+		return resampled_image
+
+	def run(self):
+		self._image_cache = ImageCache.from_args(self._args)
+
+		# Run through pages first to determine image extents
+		self._collect_draw_commands()
+
+		# Then resample all images independently of each other and merge the
+		# results back into the PDF in a fixed order
+		work_items = sorted(self._draw_cmds.items())
+		with WorkerPool(self._args.jobs) as pool:
+			results = pool.map(self._process_image, work_items)
+
+		# When a size budget is given, the original images are kept so that
+		# they can be re-encoded with different settings later on
+		self._originals = [ ] if (self._args.max_size is not None) else None
+		for ((img_xref, img_draw_cmds), result) in zip(work_items, results):
+			if result is None:
+				continue
+			(image, current_dpi, resampled_image) = result
+			self._optimized(image.total_size, resampled_image.total_size)
+			self._replace_image(img_xref, resampled_image)
+			if self._originals is not None:
+				self._originals.append((img_xref, image, current_dpi))
+
+	@property
+	def reencodable(self):
+		return (self._originals is not None) and (len(self._originals) > 0)
+
+	def reencode(self, args):
+		"""Resamples the original images once more using the resolution and
+		compression settings of 'args' and replaces them in the PDF. Nothing
+		else of the document is touched. Only possible after run() has been
+		called with a size budget (--max-size) set."""
+		assert(self._originals is not None)
+		self._args = args
+		with WorkerPool(self._args.jobs) as pool:
+			results = pool.map(lambda item: self._resample_image(*item), self._originals)
+		for ((img_xref, image, current_dpi), resampled_image) in zip(self._originals, results):
+			self._replace_image(img_xref, resampled_image)
@@ -0,0 +1,46 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import llpdf.filters
+from llpdf.types.PDFObject import PDFObject
+from llpdf.types.PDFName import PDFName
+from pdfminify.ImageBackend import ImageBackend
+from pdfminify.WorkerPool import WorkerPool
+from pdfminify.ImageCache import ImageCache
+
+class FlattenImageOptimization(llpdf.filters.FlattenImageOptimization):
+	def _flatten_image(self, image_obj):
+		current_image = self._pdf.get_image(image_obj.xref)
+		if self._image_cache is None:
+			return self._reformatter.flatten(current_image, background_color = self._args.background_color)
+		return self._image_cache.cached("flatten", current_image, lambda image: self._reformatter.flatten(image, background_color = self._args.background_color), backend = self._args.image_backend, background_color = self._args.background_color)
+
+	def run(self):
+		self._image_cache = ImageCache.from_args(self._args)
+		self._reformatter = ImageBackend(self._args.image_backend).create_reformatter(lossless = True, scale_factor = 1)
+		image_objs = sorted(image_obj for image_obj in self._pdf.image_objects if (PDFName("/SMask") in image_obj.content))
+		with WorkerPool(self._args.jobs) as pool:
+			flattened_images = pool.map(self._flatten_image, image_objs)
+
+		for (image_obj, flattened_image) in zip(image_objs, flattened_images):
+			flattened_image_obj = PDFObject.create_image(image_obj.xref.objid, image_obj.xref.gennum, flattened_image)
+			self._pdf.replace_object(flattened_image_obj)
@@ -0,0 +1,104 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import zlib
+from llpdf.types.PDFName import PDFName
+from llpdf.types.PDFXRef import PDFXRef
+from llpdf.EncodeDecode import EncodedObject, Filter
+from pdfminify.ContentStreamTokenizer import ContentStreamTokenizer
+from pdfminify.ContentStreamMinifier import ContentStreamMinifier
+from .VisitorFilter import VisitorFilter
+
+class MinifyContentOptimization(VisitorFilter):
+	"""Rewrites the content streams of pages, form XObjects and tiling
+	patterns with ContentStreamMinifier. Streams are decompressed, tokenized,
+	minified and compressed again chunk by chunk, so that the decoded content
+	is never held in memory as a whole. A stream is only replaced when it
+	becomes smaller. Coordinates of forms and patterns are rounded relative to
+	the coordinate system their /Matrix maps to."""
+	_CHUNK_SIZE = 64 * 1024
+
+	def __init__(self, pdf, args):
+		super().__init__(pdf, args)
+		self._streams = { }
+
+	def visit(self, obj):
+		content = obj.content
+		if not isinstance(content, dict):
+			return
+		if content.get(PDFName("/Type")) == PDFName("/Page"):
+			contents = content.get(PDFName("/Contents"))
+			for xref in (contents if isinstance(contents, list) else [ contents ]):
+				if isinstance(xref, PDFXRef):
+					self._streams.setdefault(xref, None)
+		elif obj.has_stream and ((content.get(PDFName("/Subtype")) == PDFName("/Form")) or (content.get(PDFName("/PatternType")) == 1)):
+			self._streams[obj.xref] = content.get(PDFName("/Matrix"))
+
+	def _decoded_chunks(self, raw_stream, compressed):
+		if not compressed:
+			for offset in range(0, len(raw_stream), self._CHUNK_SIZE):
+				yield raw_stream[offset : offset + self._CHUNK_SIZE]
+			return
+		decompressor = zlib.decompressobj()
+		for offset in range(0, len(raw_stream), self._CHUNK_SIZE):
+			data = raw_stream[offset : offset + self._CHUNK_SIZE]
+			while len(data) > 0:
+				yield decompressor.decompress(data, self._CHUNK_SIZE)
+				data = decompressor.unconsumed_tail
+			if decompressor.eof:
+				break
+		yield decompressor.flush()
+
+	def _minify(self, obj, matrix):
+		"""Returns the minified and compressed stream data of the object or
+		None if its content stream cannot be minified."""
+		stream_filter = obj.content.get(PDFName("/Filter"))
+		if isinstance(stream_filter, list) and (len(stream_filter) == 1):
+			stream_filter = stream_filter[0]
+		if (stream_filter not in (None, PDFName("/FlateDecode"))) or (obj.content.get(PDFName("/DecodeParms")) is not None):
+			self._log.debug("Not minifying content stream %s with filter %s.", obj.xref, stream_filter)
+			return None
+
+		chunks = self._decoded_chunks(obj.raw_stream, compressed = stream_filter is not None)
+		operations = ContentStreamTokenizer(chunks).operations()
+		minifier = ContentStreamMinifier(precision = self._args.content_precision, matrix = matrix)
+		compressor = zlib.compressobj(self._args.compression_level)
+		try:
+			compressed = [ compressor.compress(chunk) for chunk in minifier.minify(operations) ]
+		except (ValueError, zlib.error) as e:
+			self._log.warning("Not minifying content stream %s: %s", obj.xref, e)
+			return None
+		compressed.append(compressor.flush())
+		return b"".join(compressed)
+
+	def finish(self):
+		for (xref, matrix) in sorted(self._streams.items()):
+			obj = self._pdf.lookup(xref)
+			if (obj is None) or (not obj.has_stream) or (not isinstance(obj.content, dict)):
+				continue
+			minified = self._minify(obj, matrix)
+			if (minified is None) or (len(minified) >= len(obj.raw_stream)):
+				continue
+			self._log.debug("Minified content stream %s from %d to %d bytes", xref, len(obj.raw_stream), len(minified))
+			self._optimized(len(obj.raw_stream), len(minified))
+			obj.set_stream(EncodedObject(minified, Filter.FlateDecode))
+			self._update_reference_graph(obj)
@@ -0,0 +1,107 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+from llpdf.Exceptions import UnsupportedImageException
+from llpdf.types.PDFName import PDFName
+from llpdf.types.PDFXRef import PDFXRef
+from pdfminify.PerceptualHash import PerceptualHash
+from pdfminify.PerceptualHashIndex import PerceptualHashIndex
+from pdfminify.WorkerPool import WorkerPool
+from .VisitorFilter import VisitorFilter
+from .Relinker import Relinker
+
+class NearDuplicateImageOptimization(VisitorFilter):
+	"""Finds images that look the same, but are not byte-identical (e.g.,
+	the same photo that was encoded at a different resolution or with
+	different compression settings) by comparing perceptual hashes of their
+	decoded pixel data and, since the hash disregards color and brightness,
+	small color thumbnails. All references to such near-duplicates are
+	relinked to the image with the highest resolution among them. Images with an
+	alpha channel or color key mask, alpha channels themselves and stencil
+	masks are left alone."""
+	needs_reference_graph = True
+	_ASPECT_RATIO_TOLERANCE = 0.02
+	_COLOR_TOLERANCE = 24
+
+	def __init__(self, pdf, args):
+		super().__init__(pdf, args)
+		self._candidates = [ ]
+		self._mask_xrefs = set()
+
+	def visit(self, obj):
+		if not obj.is_image:
+			return
+		content = obj.content
+		for key in [ PDFName("/SMask"), PDFName("/Mask") ]:
+			if isinstance(content.get(key), PDFXRef):
+				self._mask_xrefs.add(content[key])
+		if (PDFName("/SMask") in content) or (PDFName("/Mask") in content) or content.get(PDFName("/ImageMask")):
+			return
+		self._candidates.append((obj.xref, content.get(PDFName("/Width")), content.get(PDFName("/Height")), content.get(PDFName("/ColorSpace"))))
+
+	def _hash_image(self, xref):
+		"""Runs in a worker thread and must not modify the PDF."""
+		try:
+			return PerceptualHash.compute_with_thumbnail(self._pdf.get_image(xref))
+		except (UnsupportedImageException, OSError, ValueError) as e:
+			self._log.debug("Cannot compute perceptual hash of %s, ignoring it: %s", xref, e)
+			return None
+
+	def _similar_shape(self, image1, image2):
+		(xref1, width1, height1, colorspace1) = image1
+		(xref2, width2, height2, colorspace2) = image2
+		if colorspace1 != colorspace2:
+			return False
+		return abs((width1 * height2) - (width2 * height1)) <= self._ASPECT_RATIO_TOLERANCE * (width1 * height2)
+
+	def finish(self):
+		if not PerceptualHash.available():
+			raise Exception("Near-duplicate image detection was requested, but the Pillow Python package is not installed.")
+
+		# Exact duplicates and alpha channels may already have been relinked or
+		# deleted by filters that ran before in the same traversal.
+		candidates = [ image for image in self._candidates if (image[0] not in self._mask_xrefs) and (self._pdf.lookup(image[0]) is not None) ]
+		candidates = [ image for image in candidates if isinstance(image[1], int) and isinstance(image[2], int) and (image[1] > 0) and (image[2] > 0) ]
+		with WorkerPool(self._args.jobs) as pool:
+			fingerprints = pool.map(self._hash_image, [ image[0] for image in candidates ])
+		sizes = { image[0]: len(self._pdf.lookup(image[0])) for image in candidates }
+
+		# Visit the images in order of descending resolution, so that the
+		# first image of every cluster is the one that all others are relinked
+		# to. Ties are broken deterministically.
+		hashed_images = [ (image, fingerprint) for (image, fingerprint) in zip(candidates, fingerprints) if fingerprint is not None ]
+		hashed_images.sort(key = lambda entry: (-entry[0][1] * entry[0][2], -sizes[entry[0][0]], entry[0][0].objid, entry[0][0].gennum))
+
+		index = PerceptualHashIndex(self._args.near_duplicate_distance)
+		relinker = Relinker(self._pdf, reference_graph = self._reference_graph)
+		for (image, (hashval, thumbnail)) in hashed_images:
+			xref = image[0]
+			for (distance, (representative, representative_thumbnail)) in index.query(hashval):
+				if self._similar_shape(representative, image) and (PerceptualHash.thumbnail_difference(representative_thumbnail, thumbnail) <= self._COLOR_TOLERANCE):
+					self._log.debug("Relinking %s (%dx%d, %d bytes) to near-duplicate %s (%dx%d) with perceptual hash distance %d", xref, image[1], image[2], sizes[xref], representative[0], representative[1], representative[2], distance)
+					relinker.relink(xref, representative[0])
+					self._optimized(sizes[xref], 0)
+					break
+			else:
+				index.add(hashval, (image, thumbnail))
+		self._log.debug("Found %d distinct images among %d candidates for near-duplicate detection.", len(index), len(candidates))
+		relinker.run()
@@ -0,0 +1,75 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import llpdf.filters.Relinker
+from llpdf.types.PDFXRef import PDFXRef
+
+class Relinker(llpdf.filters.Relinker.Relinker):
+	"""Relinker that only touches objects which actually reference one of the
+	relinked objects. All other objects (and their stream data, which might
+	not even have been read yet) are left alone. When given a reference graph,
+	the referring objects are taken from it instead of looking at all objects
+	and the graph is updated accordingly."""
+
+	def _references_relinked(self, data_structure):
+		if isinstance(data_structure, dict):
+			return any(self._references_relinked(value) for value in data_structure.values())
+		elif isinstance(data_structure, list):
+			return any(self._references_relinked(value) for value in data_structure)
+		elif isinstance(data_structure, PDFXRef):
+			return data_structure in self._old_to_new
+		else:
+			return False
+
+	def __init__(self, pdf, reference_graph = None):
+		super().__init__(pdf)
+		self._reference_graph = reference_graph
+
+	def _candidate_objects(self):
+		if self._reference_graph is None:
+			return list(self._pdf)
+
+		# Only the objects that the reference graph knows to refer to relinked
+		# objects need to be looked at
+		candidate_xrefs = set()
+		for old_xref in self._old_to_new:
+			candidate_xrefs |= self._reference_graph.referrers(old_xref)
+		candidates = (self._pdf.lookup(xref) for xref in sorted(candidate_xrefs))
+		return [ obj for obj in candidates if obj is not None ]
+
+	def run(self):
+		if len(self._old_to_new) == 0:
+			return
+
+		for delete_obj_xref in self._old_to_new:
+			self._pdf.delete_object(delete_obj_xref.objid, delete_obj_xref.gennum)
+			if self._reference_graph is not None:
+				self._reference_graph.remove(delete_obj_xref)
+
+		for obj in self._candidate_objects():
+			if self._references_relinked(obj.content):
+				obj.set_content(self._relink(obj.content))
+				if self._reference_graph is not None:
+					self._reference_graph.update(obj)
+
+		if self._references_relinked(self._pdf.trailer):
+			self._pdf.trailer = self._relink(self._pdf.trailer)
@@ -0,0 +1,70 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import hashlib
+import collections
+from llpdf.types.PDFName import PDFName
+from llpdf.types.PDFXRef import PDFXRef
+from .VisitorFilter import VisitorFilter
+from .Relinker import Relinker
+
+class RemoveDuplicateFontOptimization(VisitorFilter):
+	"""Relinks identical embedded font programs (/FontFile, /FontFile2 and
+	/FontFile3 streams), as they are typically found in documents that were
+	concatenated from several others, so that only one copy remains."""
+	needs_reference_graph = True
+	_FONT_FILE_KEYS = [ PDFName("/FontFile"), PDFName("/FontFile2"), PDFName("/FontFile3") ]
+	_PROGRAM_KEYS = [ PDFName("/Subtype"), PDFName("/Length1"), PDFName("/Length2"), PDFName("/Length3"), PDFName("/Filter"), PDFName("/DecodeParms") ]
+
+	def __init__(self, pdf, args):
+		super().__init__(pdf, args)
+		self._programs = set()
+
+	def visit(self, obj):
+		if isinstance(obj.content, dict) and (obj.content.get(PDFName("/Type")) == PDFName("/FontDescriptor")):
+			for key in self._FONT_FILE_KEYS:
+				if isinstance(obj.content.get(key), PDFXRef):
+					self._programs.add(obj.content[key])
+
+	def _program_key(self, obj):
+		# Besides the stream data, all entries that are needed to interpret it
+		# must match as well
+		return (hashlib.md5(obj.raw_stream).hexdigest(), ) + tuple(repr(obj.content.get(key)) for key in self._PROGRAM_KEYS)
+
+	def finish(self):
+		objs_by_key = collections.defaultdict(list)
+		for xref in sorted(self._programs):
+			obj = self._pdf.lookup(xref)
+			if (obj is not None) and obj.has_stream:
+				objs_by_key[self._program_key(obj)].append(xref)
+
+		relinker = Relinker(self._pdf, reference_graph = self._reference_graph)
+		for objects in objs_by_key.values():
+			if len(objects) == 1:
+				continue
+			(reference_object, delete_objects) = (objects[0], objects[1:])
+			object_size = len(self._pdf.lookup(reference_object))
+			self._log.debug("Relinking %d duplicate font programs with %d bytes each %s to %s", len(delete_objects), object_size, delete_objects, reference_object)
+			for delete_object in delete_objects:
+				relinker.relink(delete_object, reference_object)
+			self._optimized(len(objects) * object_size, object_size)
+		relinker.run()
@@ -0,0 +1,35 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import llpdf.filters
+from pdfminify.FontUsage import FontUsage
+from pdfminify.FontSubsetter import FontSubsetter
+
+class SignFilter(llpdf.filters.SignFilter):
+	def _generate_form(self):
+		form_xref = super()._generate_form()
+		if self._args.subset_fonts:
+			# The signature form is the only user of the signature font
+			usage = FontUsage(self._pdf).scan([ self._pdf.lookup(form_xref) ])
+			for (program_xref, old_size, new_size) in FontSubsetter(self._pdf, usage).run():
+				self._optimized(old_size, new_size)
+		return form_xref
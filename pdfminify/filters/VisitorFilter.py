@@ -0,0 +1,52 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+from llpdf.filters.PDFFilter import PDFFilter
+from pdfminify.FusedTraversal import FusedTraversal
+
+class VisitorFilter(PDFFilter):
+	"""Filter that processes the document one object at a time. Adjacent
+	visitor filters in the pipeline are fused into a single traversal of all
+	objects. The reference graph is only complete once finish() is called; a
+	filter that changes references of an object during visit() or finish()
+	must update the graph by calling _update_reference_graph()."""
+	needs_reference_graph = False
+
+	def __init__(self, pdf, args):
+		super().__init__(pdf, args)
+		self._reference_graph = None
+
+	def set_reference_graph(self, reference_graph):
+		self._reference_graph = reference_graph
+
+	def _update_reference_graph(self, obj):
+		if self._reference_graph is not None:
+			self._reference_graph.update(obj)
+
+	def visit(self, obj):
+		pass
+
+	def finish(self):
+		pass
+
+	def run(self):
+		FusedTraversal(self._pdf, [ self ]).run()
@@ -0,0 +1,34 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+from .VisitorFilter import VisitorFilter
+from .RemoveDuplicateImageOptimization import RemoveDuplicateImageOptimization
+from .NearDuplicateImageOptimization import NearDuplicateImageOptimization
+from .RemoveDuplicateFontOptimization import RemoveDuplicateFontOptimization
+from .SubsetFontOptimization import SubsetFontOptimization
+from .DownscaleImageOptimization import DownscaleImageOptimization
+from .FlattenImageOptimization import FlattenImageOptimization
+from .RemoveMetadataFilter import RemoveMetadataFilter
+from .MinifyContentOptimization import MinifyContentOptimization
+from .ExplicitLengthFilter import ExplicitLengthFilter
+from .DeleteOrphanedObjectsFilter import DeleteOrphanedObjectsFilter
+from .SignFilter import SignFilter
@@ -0,0 +1,42 @@
+#	pdfminify - Tool to minify PDF files.
+#	Copyright (C) 2016-2024 Johannes Bauer
+#
+#	This file is part of pdfminify.
+#
+#	pdfminify is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pdfminify is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pdfminify; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+#
+
+import unittest
+from pdfminify.ContentStreamTokenizer import ContentStreamTokenizer
+from pdfminify.ContentStreamMinifier import ContentStreamMinifier
+
+class ContentStreamMinifierTest(unittest.TestCase):
+	def _minify(self, data, precision = 3):
+		return b"".join(ContentStreamMinifier(precision = precision).minify(ContentStreamTokenizer(data).operations()))
+
+	def test_identity_cm_dropped(self):
+		self.assertEqual(self._minify(b"q 1 0 0 1 0 0 cm 0 0 10 10 re f Q"), b"q\n0 0 10 10 re\nf\nQ")
+
+	def test_translation_cm_kept(self):
+		self.assertEqual(self._minify(b"q 1 0 0 1 100 200 cm 0 0 10 10 re f Q"), b"q\n1 0 0 1 100 200 cm\n0 0 10 10 re\nf\nQ")
+
+	def test_tj_offsets_rounded_with_known_font_size(self):
+		self.assertEqual(self._minify(b"BT /F1 10 Tf [(a) -123.456789 (b)] TJ ET", precision = 2), b"BT/F1 10 Tf[(a)-123(b)]TJ\nET")
+
+	def test_tj_offsets_exact_with_unknown_font_size(self):
+		self.assertEqual(self._minify(b"BT [(a) -123.456789 (b)] TJ ET", precision = 2), b"BT[(a)-123.456789(b)]TJ\nET")
+		self.assertEqual(self._minify(b"BT /F1 10 Tf /GS1 gs [(a) -123.456789 (b)] TJ ET", precision = 2), b"BT/F1 10 Tf/GS1 gs[(a)-123.456789(b)]TJ\nET")
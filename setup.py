@@ -19,6 +19,10 @@ setuptools.setup(
 	install_requires = [
 		"llpdf>=0.0.4",
 	],
+	extras_require = {
+		"pillow": [ "Pillow" ],
+		"fonttools": [ "fonttools" ],
+	},
 	entry_points = {
 		"console_scripts": [
 			"pdfminify = pdfminify.__main__:main"